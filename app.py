@@ -1,140 +1,632 @@
 import streamlit as st
 import os
-from PIL import Image
 import io
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 import base64
+import uuid
+import hashlib
+import time
+from PIL import Image
+from catalog import apply_preferences, create_catalog, item_description
+from preprocessing import PreparedImage, preprocess_room_image
+from output_encoding import create_output_encoder
+from session_store import SessionImageStore
+from warmup import shared_client
+from singleflight import SingleFlight
+from rate_limiter import QueueFullError
+from furnish_chain import FurnishChain
+from jobs import CANCELLED, DONE, FINISHED, QUEUED, create_job_queue
+from history import create_history, create_user_tokens
+from model_router import DRAFT, ModelUnavailableError, create_model_router
+from preflight import PreflightError, create_preflight
+from visualizer import (
+    FurnitureVisualizer,
+    MissingApiKeyError,
+    create_admission_controller,
+    create_backend,
+    create_chain_checkpoints,
+    create_file_handles,
+    create_hedge_policy,
+    create_metrics,
+    create_result_cache,
+    create_retry_policy,
+    create_room_index
+)
 
 # Load environment variables
 load_dotenv()
 
-# Furniture catalog with categories and styles
-FURNITURE_CATALOG = {
-    "Seating": {
-        "Modern Sofa": "a modern minimalist sofa with clean lines and neutral fabric",
-        "Leather Recliner": "a brown leather recliner chair with ottoman",
-        "Accent Chair": "a colorful accent chair with geometric patterns",
-        "Sectional Sofa": "a large L-shaped sectional sofa in gray fabric",
-        "Bean Bag": "a large comfortable bean bag chair",
-        "Dining Chairs": "a set of 4 modern dining chairs with wooden legs"
-    },
-    "Tables": {
-        "Coffee Table": "a glass-top coffee table with metal legs",
-        "Wooden Coffee Table": "a rustic wooden coffee table with storage",
-        "Dining Table": "a modern dining table for 6 people with wooden top",
-        "Side Table": "a small round side table with lamp",
-        "Console Table": "a long console table against the wall",
-        "End Table": "a wooden end table with drawer"
-    },
-    "Storage": {
-        "Bookshelf": "a tall wooden bookshelf filled with books",
-        "TV Unit": "a modern TV entertainment unit with storage",
-        "Wardrobe": "a large wardrobe with sliding doors",
-        "Storage Ottoman": "a fabric storage ottoman that doubles as seating",
-        "Floating Shelves": "modern floating wall shelves",
-        "Cabinet": "a wooden storage cabinet with doors"
-    },
-    "Lighting": {
-        "Floor Lamp": "a modern arc floor lamp with fabric shade",
-        "Table Lamp": "a contemporary table lamp with ceramic base",
-        "Pendant Light": "a hanging pendant light over dining area",
-        "Chandelier": "an elegant crystal chandelier",
-        "LED Strip": "ambient LED strip lighting behind TV",
-        "Standing Light": "a minimalist standing light fixture"
-    },
-    "Bedroom": {
-        "Queen Bed": "a modern queen-size bed with upholstered headboard",
-        "Nightstand": "a matching wooden nightstand with drawer",
-        "Dresser": "a large dresser with mirror",
-        "Bench": "a bedroom bench at the foot of the bed",
-        "Armoire": "a traditional wooden armoire",
-        "Vanity": "a modern vanity table with mirror and lights"
-    },
-    "Decor": {
-        "Area Rug": "a large colorful area rug that defines the seating area",
-        "Plant": "a large indoor plant in a decorative pot",
-        "Wall Art": "modern abstract wall art in frames",
-        "Curtains": "elegant floor-to-ceiling curtains",
-        "Mirror": "a large decorative wall mirror",
-        "Throw Pillows": "decorative throw pillows on the sofa"
-    }
-}
-
-class FurnitureVisualizer:
-    def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
-            st.error("Please set your GEMINI_API_KEY in the .env file")
-            st.stop()
-        
-        self.client = genai.Client(api_key=self.api_key)
-        self.model_id = "gemini-2.5-flash-image-preview"
+# Multi-item comparison limits
+MAX_COMPARE_ITEMS = 10
+CATALOG_PAGE_SIZE = 25
+ALL_CATEGORIES = "All categories"
+DEFAULT_CONCURRENCY = min(int(os.getenv('MAX_CONCURRENT_RENDERS', '4')), MAX_COMPARE_ITEMS)
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '1'))
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '12'))
+HISTORY_COLUMNS = 4
+
+@st.cache_resource
+def get_shared_client():
+    """Pooled Gemini client shared by all sessions; already warm when started through serve.py"""
+    return shared_client()
+
+@st.cache_resource
+def get_catalog():
+    """Furniture catalog shared by all sessions, indexed in the background"""
+    return create_catalog()
+
+@st.cache_resource
+def get_file_handles():
+    """Uploaded room images shared by all sessions, or None when rooms are sent inline"""
+    return create_file_handles(create_backend(get_shared_client()))
+
+def get_session_file_handles():
+    """Room upload handles owned by the current session"""
+    handles = get_file_handles()
+    return handles.for_owner(get_session_id()) if handles is not None else None
+
+@st.cache_resource
+def get_quick_preview():
+    """Local sprite compositor shared by all sessions"""
+    from quick_preview import create_quick_preview
+    return create_quick_preview()
+
+@st.cache_resource
+def get_room_index():
+    """Perceptual fingerprints of past room uploads and their renders"""
+    return create_room_index()
+
+@st.cache_resource
+def get_job_queue():
+    """Render job queue and worker pool shared by all sessions"""
+    visualizer = FurnitureVisualizer(
+        cache=get_result_cache(),
+        client=get_shared_client(),
+        flight=get_single_flight(),
+        limiter=get_admission_controller(),
+        retry=get_retry_policy(),
+        hedge=get_hedge_policy(),
+        metrics=get_metrics(),
+        file_handles=get_file_handles(),
+        rooms=get_room_index(),
+        router=get_model_router(),
+        preflight=get_preflight()
+    )
+    return create_job_queue(visualizer, metrics=get_metrics(), history=get_history())
+
+@st.cache_resource
+def get_history():
+    """Append-only store of every user's generated images"""
+    return create_history(get_output_encoder())
+
+@st.cache_resource
+def get_user_tokens():
+    """Signer of the user tokens kept in the page URL"""
+    return create_user_tokens()
+
+@st.cache_resource
+def get_output_encoder():
+    """Encoder for display and thumbnail renditions of generated images"""
+    return create_output_encoder()
+
+def encode_renditions(image_data, *names):
+    """Encode page renditions of a generated image, timed as the encode stage"""
+    with get_metrics().stage('encode'):
+        return get_output_encoder().encode(image_data, names)
+
+@st.cache_resource
+def get_single_flight():
+    """In-flight request table shared by all sessions in this process"""
+    return SingleFlight()
+
+@st.cache_resource
+def get_admission_controller():
+    """Rate limiter and admission queue shared by all model calls in this process"""
+    return create_admission_controller()
+
+@st.cache_resource
+def get_retry_policy():
+    """Retry policy for transient model errors"""
+    return create_retry_policy()
+
+@st.cache_resource
+def get_hedge_policy():
+    """Optional hedging of slow calls, shared so latency samples are process-wide"""
+    return create_hedge_policy()
+
+@st.cache_resource
+def get_model_router():
+    """Model health and draft/final routing, shared so every session sees a failing model"""
+    return create_model_router()
+
+@st.cache_resource
+def get_preflight():
+    """Room image pre-flight checks, or None when disabled"""
+    return create_preflight()
+
+@st.cache_resource
+def get_chain_checkpoints():
+    """Intermediate renders of room plans, keyed by chain prefix"""
+    return create_chain_checkpoints()
+
+@st.cache_resource
+def get_result_cache():
+    """Result cache shared by all sessions in this process"""
+    return create_result_cache()
+
+@st.cache_resource
+def get_metrics():
+    """Stage latency metrics shared by all sessions, with the optional /metrics endpoint"""
+    return create_metrics()
+
+@st.cache_resource
+def get_session_store():
+    """Image store shared by all sessions, bounded by a global memory budget"""
+    return SessionImageStore(
+        os.getenv('SESSION_SPILL_DIR', '.cache/sessions'),
+        max_memory_bytes=int(os.getenv('SESSION_MEMORY_MB', '256')) * 1024 * 1024,
+        max_disk_bytes=int(os.getenv('SESSION_SPILL_MAX_MB', '1024')) * 1024 * 1024
+    )
+
+def get_session_id():
+    """Stable id for the current browser session"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def get_user_id():
+    """Id of the person using the app
     
-    def generate_furniture_visualization(self, room_image, furniture_description, placement_instruction):
-        """Generate a visualization of furniture placed in the room"""
-        
-        prompt = f"""
-        Take this room image and add {furniture_description} to it. 
-        
-        Placement instruction: {placement_instruction}
-        
-        Requirements:
-        - Make the furniture look realistic and properly scaled for the room
-        - Ensure proper lighting and shadows that match the room's lighting
-        - The furniture should blend naturally with the existing room decor
-        - Maintain the original room's perspective and style
-        - Make it look like a professional interior design visualization
-        - Keep the original room elements intact, only add the new furniture
-        
-        Generate a photorealistic image showing how this furniture would look in the room.
-        """
-        
-        try:
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=[prompt, room_image],
-                config=types.GenerateContentConfig(
-                    response_modalities=['Image']
-                )
-            )
-            
-            # Extract image from response
-            for part in response.parts:
-                # Try inline_data first (most reliable)
-                if hasattr(part, 'inline_data') and part.inline_data and hasattr(part.inline_data, 'data'):
-                    try:
-                        image_data = part.inline_data.data
-                        pil_image = Image.open(io.BytesIO(image_data))
-                        return pil_image
-                    except Exception:
-                        continue
-                
-                # Fallback to as_image method
-                if hasattr(part, 'as_image'):
-                    try:
-                        genai_image = part.as_image()
-                        if genai_image is not None:
-                            # Try to get the image data directly
-                            if hasattr(genai_image, 'data'):
-                                pil_image = Image.open(io.BytesIO(genai_image.data))
-                                return pil_image
-                    except Exception:
-                        continue
-            
+    The URL keeps a token signed by the server so history survives new sessions;
+    a missing or forged token starts a new user rather than naming one.
+    """
+    if 'user_id' not in st.session_state:
+        tokens = get_user_tokens()
+        user_id = tokens.verify(st.query_params.get('user'))
+        if user_id is None:
+            user_id, token = tokens.issue()
+            st.query_params['user'] = token
+        st.session_state.user_id = user_id
+    return st.session_state.user_id
+
+def load_room_image():
+    """Return the session's prepared room image from the image store, or None"""
+    stored = get_session_store().get(get_session_id(), 'room')
+    if stored is None:
+        return None
+    data, metadata = stored
+    return PreparedImage(data, **metadata)
+
+def prepare_room_upload(uploaded_file):
+    """Check and preprocess an upload once per file id and keep it in the session image store
+    
+    Returns None for an upload that failed its pre-flight checks. The reasons, or
+    the warnings of an accepted upload, are kept in st.session_state.room_preflight.
+    """
+    room_image = load_room_image()
+    if st.session_state.get('room_file_id') == uploaded_file.file_id:
+        if room_image is not None or st.session_state.room_preflight['problems']:
+            return room_image
+    
+    # The previous room's upload is no longer needed by this session
+    file_handles = get_session_file_handles()
+    if file_handles is not None:
+        file_handles.release()
+    get_session_store().discard(get_session_id(), 'room')
+    st.session_state.room_file_id = uploaded_file.file_id
+    st.session_state.room_preflight = {'problems': [], 'warnings': []}
+    
+    # Only the header is read here, so oversized or unsupported files are never decoded
+    preflight = get_preflight()
+    if preflight is not None:
+        with get_metrics().stage('preflight'):
+            report = preflight.check(uploaded_file, pixels=False)
+        if not report.ok:
+            st.session_state.room_preflight['problems'] = report.problems
             return None
-            
-        except Exception as e:
-            st.error(f"Error generating visualization: {str(e)}")
+    
+    # Orient, downsize and re-encode the photo before it goes to the model
+    with get_metrics().stage('preprocess'):
+        room_image = preprocess_room_image(uploaded_file)
+        # Fingerprint the room so re-uploads of it can reuse earlier renders
+        if get_room_index() is not None:
+            from perceptual_hash import room_key
+            get_room_index().add_room(room_key(room_image.data), lambda: room_image.image, get_user_id())
+    
+    # Blur and exposure are measured on the small re-encoded copy
+    if preflight is not None:
+        with get_metrics().stage('preflight'):
+            report = preflight.check(room_image)
+        st.session_state.room_preflight = {'problems': report.problems, 'warnings': report.warnings}
+        if not report.ok:
             return None
     
-    def save_image(self, image, filename):
-        """Save image to local storage"""
-        if image:
-            image.save(filename)
-            return filename
-        return None
+    # Keep only the encoded bytes in the shared session image store
+    get_session_store().put(
+        get_session_id(),
+        'room',
+        room_image.data,
+        mime_type=room_image.mime_type,
+        size=room_image.size,
+        original_bytes=room_image.original_bytes,
+        original_size=room_image.original_size
+    )
+    return room_image
+
+@st.fragment
+def show_result_panel():
+    """Show the latest visualization with its download and feedback buttons
+    
+    Runs as a fragment, so the feedback buttons rerun only this panel.
+    """
+    with get_metrics().stage('download'):
+        stored = get_session_store().get(get_session_id(), 'result')
+        display = get_session_store().get(get_session_id(), 'result_display')
+    if stored is None:
+        return
+    result_data, metadata = stored
+    result_format = metadata.get('format', 'PNG')
+    item_slug = metadata.get('item', 'furniture').lower().replace(' ', '_')
+    
+    # The page shows the display-size rendition; the download keeps full quality
+    st.image(display[0] if display is not None else result_data, caption="Furniture Visualization", width="stretch")
+    
+    # Download the bytes the model returned instead of re-encoding them
+    st.download_button(
+        label="📥 Download Visualization",
+        data=result_data,
+        file_name=f"furniture_visualization_{item_slug}.{result_format.lower()}",
+        mime=Image.MIME.get(result_format, 'image/png'),
+        on_click="ignore"
+    )
+    
+    # Feedback section
+    st.subheader("💭 How does it look?")
+    col_a, col_b, col_c = st.columns(3)
+    
+    with col_a:
+        if st.button("😍 Love it!"):
+            st.balloons()
+            st.write("Great choice! This furniture suits your room well.")
+    
+    with col_b:
+        if st.button("🤔 Not sure"):
+            st.write("Try adjusting the placement or choosing a different style.")
+    
+    with col_c:
+        if st.button("❌ Don't like it"):
+            st.write("No problem! Try a different furniture piece or color.")
+
+def turn_history_page(step):
+    st.session_state.history_page = st.session_state.get('history_page', 0) + step
+
+def describe_history_entry(entry):
+    """Caption of a gallery thumbnail: item, chosen color and material, and when"""
+    details = [entry.item] + [choice for choice in (entry.color, entry.material) if choice and choice != "Keep original"]
+    return f"{', '.join(details)} · {time.strftime('%b %d, %H:%M', time.localtime(entry.timestamp))}"
+
+@st.fragment
+def show_history():
+    """Gallery of the user's earlier renders, loading one page of thumbnails at a time
+    
+    Runs as a fragment, so paging reruns only the gallery.
+    """
+    history = get_history()
+    if history is None:
+        return
+    st.header("🕘 Your Earlier Renders")
+    user_id = get_user_id()
+    total = history.count(user_id)
+    if not total:
+        st.info("Every visualization you generate is kept here, so you can come back to it without rendering it again.")
+        return
+    
+    pages = -(-total // HISTORY_PAGE_SIZE)
+    page = min(st.session_state.get('history_page', 0), pages - 1)
+    st.session_state.history_page = page
+    col_newer, col_page, col_older = st.columns([1, 3, 1])
+    col_newer.button("⬅️ Newer", disabled=page == 0, on_click=turn_history_page, args=(-1,))
+    col_page.caption(f"Page {page + 1} of {pages} · {total} renders")
+    col_older.button("Older ➡️", disabled=page >= pages - 1, on_click=turn_history_page, args=(1,))
+    
+    with get_metrics().stage('history'):
+        entries = history.page(user_id, page, HISTORY_PAGE_SIZE)
+        thumbnails = [history.thumbnail(entry) for entry in entries]
+    columns = st.columns(HISTORY_COLUMNS)
+    for index, (entry, thumbnail) in enumerate(zip(entries, thumbnails)):
+        with columns[index % HISTORY_COLUMNS]:
+            st.image(thumbnail, caption=describe_history_entry(entry), width="stretch")
+            if st.button("🔍 Open", key=f"history_open_{entry.number}", help="Show it in the result panel"):
+                # Loaded from the pack only when opened; the whole page reruns to show it
+                store_result(history.image(entry), entry.item)
+                st.rerun()
+
+@st.fragment
+def show_quick_preview(catalog_item, color_preference):
+    """Place the item's sprite on the room locally, without a model call
+    
+    Runs as a fragment, so moving the sliders reruns only this panel.
+    """
+    if not st.toggle("⚡ Quick preview", help="Try positions and sizes instantly before generating"):
+        return
+    from quick_preview import describe_position
+    room_image = load_room_image()
+    if room_image is None:
+        st.info("Upload a room image to preview the placement.")
+        return
+    
+    col_x, col_y, col_size = st.columns(3)
+    x = col_x.slider("Left → right", 0, 100, 50, format="%d%%")
+    y = col_y.slider("Back → front", 0, 100, 85, format="%d%%")
+    scale = col_size.slider("Size", 5, 100, 35, format="%d%%")
+    
+    with get_metrics().stage('quick_preview'):
+        preview = get_quick_preview().compose(
+            room_image.data,
+            catalog_item,
+            x=x / 100,
+            y=y / 100,
+            scale=scale / 100,
+            color=None if color_preference == "Keep original" else color_preference
+        )
+    st.image(preview, caption="Quick preview (rough placement)", width="stretch", output_format="JPEG")
+    st.caption(f"📝 Suggested placement: {describe_position(x / 100, y / 100, scale / 100)}")
+
+def search_catalog():
+    """Category filter, search box and paging for the catalog; returns the current page"""
+    catalog = get_catalog()
+    category = st.selectbox(
+        "Select Furniture Category:",
+        [ALL_CATEGORIES] + catalog.categories()
+    )
+    query = st.text_input(
+        "Search Furniture:",
+        placeholder="e.g. walnut coffee table",
+        help="Matches names, styles, colors and materials, and tolerates typos"
+    )
+    
+    # Start from the first page whenever the search changes
+    search = (category, query)
+    if st.session_state.get('catalog_search') != search:
+        st.session_state.catalog_search = search
+        st.session_state.catalog_page = 1
+    page = st.session_state.get('catalog_page', 1)
+    
+    total, items = catalog.search(
+        query,
+        None if category == ALL_CATEGORIES else category,
+        offset=(page - 1) * CATALOG_PAGE_SIZE,
+        limit=CATALOG_PAGE_SIZE
+    )
+    pages = max(1, -(-total // CATALOG_PAGE_SIZE))
+    if pages > 1:
+        st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, key='catalog_page')
+    if catalog.ready:
+        status = ""
+    elif catalog.error is not None:
+        status = " (search index unavailable, using basic search)"
+    else:
+        status = " (search index still building)"
+    st.caption(f"🔎 {total} matching items{status}")
+    return items
+
+def store_result(result_data, furniture_item):
+    """Keep a visualization in the session image store for the result panel"""
+    result_format = Image.open(io.BytesIO(result_data)).format or 'PNG'
+    display = encode_renditions(result_data, 'display')['display']
+    get_session_store().put(
+        get_session_id(),
+        'result',
+        result_data,
+        item=furniture_item,
+        format=result_format
+    )
+    get_session_store().put(get_session_id(), 'result_display', display.data, format=display.image_format)
+
+def offer_similar_render(furniture_item, description, placement):
+    """Offer an earlier render of this request made for a near-duplicate room upload"""
+    room_image = load_room_image()
+    if room_image is None or not placement:
+        return
+    earlier = st.session_state.visualizer.find_similar_render(room_image, description, placement, owner=get_user_id())
+    if earlier is None:
+        return
+    st.info("♻️ This item was already rendered with the same placement for a matching photo of this room.")
+    if st.button("♻️ Use Earlier Render"):
+        store_result(earlier, furniture_item)
+        st.success("✅ Reused the earlier visualization!")
+
+def submit_render_job(room_image, furniture_item, description, placement, color, material):
+    """Queue a render on the worker pool and remember the job in the session and URL"""
+    job_id = get_job_queue().submit(
+        get_user_id(),
+        room_image,
+        session=get_session_id(),
+        item=furniture_item,
+        description=description,
+        placement=placement,
+        color=color,
+        material=material
+    )
+    st.session_state.job_id = job_id
+    # The job id in the URL lets a reloaded or reconnected page pick the result up again
+    st.query_params['job'] = job_id
+
+def cancel_render_job(job_id):
+    """Stop a queued or running render, freeing its worker and model capacity"""
+    get_job_queue().cancel(job_id)
+
+def show_job_progress(job_id):
+    """Status of a queued or running job and the model's text so far; polled until the job finishes"""
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None or job['status'] in FINISHED:
+        # Rerun the whole page so the result panel picks the result up
+        st.rerun()
+    if job['status'] == QUEUED:
+        st.info(f"⏳ Waiting for a render worker ({queue.position(job)} jobs ahead)...")
+    else:
+        st.info(f"🎨 {job['message'] or 'Generating your furniture visualization...'}")
+    if job['text']:
+        st.caption(f"💬 {job['text']}")
+    st.button("✖️ Cancel", key=f"cancel_{job_id}", on_click=cancel_render_job, args=(job_id,))
+
+def follow_render_job():
+    """Show progress of the session's render job, or collect its result once finished"""
+    job_id = st.session_state.get('job_id') or st.query_params.get('job')
+    if job_id is None:
+        return
+    st.session_state.job_id = job_id
+    job = get_job_queue().get(job_id)
+    if job is None or job['owner'] != get_user_id():
+        # Purged, from another server, or someone else's job
+        st.session_state.job_id = None
+        if st.query_params.get('job') == job_id:
+            del st.query_params['job']
+        return
+    
+    if job['status'] not in FINISHED:
+        st.fragment(show_job_progress, run_every=JOB_POLL_SECONDS)(job_id)
+        return
+    if st.session_state.get('job_collected') == job_id:
+        return
+    st.session_state.job_collected = job_id
+    
+    if job['status'] == DONE:
+        result_data, _result_format = get_job_queue().result(job_id)
+        # Save to the session image store; the result panel shows it
+        store_result(result_data, job['params']['item'])
+        st.success("✅ Visualization generated successfully!")
+    elif job['status'] == CANCELLED:
+        st.info("✖️ Render cancelled.")
+    elif job['error_type'] in ('QueueFullError', 'ModelUnavailableError'):
+        st.warning(f"🚦 {job['error']}")
+    elif job['error_type'] == 'PreflightError':
+        st.error(f"🖼️ {job['error']}")
+    else:
+        st.error(f"Error generating visualization: {job['error']}")
+
+def show_generation_error(error):
+    """Report a failed generation in the page"""
+    if isinstance(error, (QueueFullError, ModelUnavailableError)):
+        st.warning(f"🚦 {str(error)}")
+    elif isinstance(error, PreflightError):
+        st.error(f"🖼️ {str(error)}")
+    else:
+        st.error(f"Error generating visualization: {str(error)}")
+
+def render_comparison(compare_items, placement, color_preference, material_preference, max_concurrency):
+    """Render several furniture items concurrently and fill a grid as results arrive"""
+    if not st.button("🚀 Generate All Visualizations", type="primary"):
+        return
+    room_image = load_room_image()
+    if room_image is None:
+        st.error("Please upload a room image first!")
+        return
+    if not compare_items:
+        st.error("Please select at least one furniture item to compare!")
+        return
+    if not placement:
+        st.error("Please provide placement instructions!")
+        return
+    
+    # One placeholder per item, laid out in a two-column grid
+    grid = st.columns(2)
+    slots = {}
+    items = []
+    for index, catalog_item in enumerate(compare_items):
+        item = catalog_item['name']
+        slot = grid[index % 2].empty()
+        slot.info(f"⏳ Rendering {item}...")
+        slots[item] = slot
+        description = apply_preferences(item_description(catalog_item), color_preference, material_preference)
+        items.append((item, description, placement))
+    
+    def show_wait(item, position, estimated_wait):
+        slots[item].info(f"⏳ {item}: #{position} in the queue (about {estimated_wait:.0f}s wait)...")
+    
+    progress = st.progress(0.0, text="Rendering furniture...")
+    # Comparisons are a quick look, so they go to the fastest healthy model
+    results = st.session_state.visualizer.render_many(
+        room_image,
+        items,
+        max_concurrency=max_concurrency,
+        tier=DRAFT,
+        on_wait=show_wait
+    )
+    history = get_history()
+    room = hashlib.sha256(room_image.data).hexdigest()
+    for done, (item, image_data, error) in enumerate(results, start=1):
+        if image_data is not None:
+            slots[item].image(encode_renditions(image_data, 'display')['display'].data, caption=item, width="stretch")
+            if history is not None:
+                history.add(get_user_id(), image_data, room=room, item=item,
+                            color=color_preference, material=material_preference)
+        elif error is not None:
+            slots[item].error(f"{item}: {str(error)}")
+        else:
+            slots[item].error(f"{item}: no image returned. Please try again.")
+        progress.progress(done / len(items), text=f"Rendered {done} of {len(items)}")
+    
+    progress.empty()
+
+def render_room_plan(current_step):
+    """Show the room plan and render it step by step, reusing checkpointed prefixes"""
+    st.header("🪄 Furnish the Room Step by Step")
+    steps = st.session_state.setdefault('chain_steps', [])
+    
+    if not steps:
+        st.info("Pick an item and placement in the sidebar, then click \"➕ Add to Room Plan\" to build the room one piece at a time.")
+        return
+    
+    for index, step in enumerate(steps):
+        col_step, col_up, col_swap, col_remove = st.columns([8, 1, 1, 1])
+        col_step.markdown(f"**{index + 1}. {step['item']}** — {step['placement']}")
+        if col_up.button("⬆️", key=f"chain_up_{index}", disabled=index == 0, help="Move up"):
+            steps[index - 1], steps[index] = steps[index], steps[index - 1]
+            st.rerun()
+        if col_swap.button("🔄", key=f"chain_swap_{index}", disabled=current_step is None,
+                           help="Replace with the current sidebar selection"):
+            steps[index] = current_step
+            st.rerun()
+        if col_remove.button("🗑️", key=f"chain_remove_{index}", help="Remove"):
+            steps.pop(index)
+            st.rerun()
+    
+    if not st.button("🪄 Furnish Room", type="primary"):
+        return
+    room_image = load_room_image()
+    if room_image is None:
+        st.error("Please upload a room image first!")
+        return
+    
+    chain = FurnishChain(st.session_state.visualizer, get_chain_checkpoints())
+    step_columns = st.columns(min(len(steps), 4))
+    final_slot = st.empty()
+    
+    def show_step(index, image_data, from_checkpoint):
+        label = f"Step {index + 1}: {steps[index]['item']}"
+        if from_checkpoint:
+            label += " (reused)"
+        renditions = encode_renditions(image_data, 'thumbnail', 'display')
+        step_columns[index % len(step_columns)].image(renditions['thumbnail'].data, caption=label, width="stretch")
+        final_slot.image(renditions['display'].data, caption="Furnished Room", width="stretch")
+    
+    def show_wait(index, position, estimated_wait):
+        final_slot.info(f"⏳ Step {index + 1}: #{position} in the queue (about {estimated_wait:.0f}s wait)...")
+    
+    with st.spinner("Furnishing your room..."):
+        results = chain.render(
+            room_image,
+            [(step['description'], step['placement']) for step in steps],
+            on_step=show_step,
+            on_wait=show_wait
+        )
+    
+    if len(results) == len(steps):
+        st.success(f"✅ Room furnished with {len(steps)} items!")
+    else:
+        st.error(f"Stopped at step {len(results) + 1}. Please try again.")
 
 def main():
     st.set_page_config(
@@ -143,34 +635,82 @@ def main():
         layout="wide"
     )
     
+    # Build and warm the shared client before the page renders
+    shared_client = get_shared_client()
+    
     st.title("🏠 AI Furniture Visualizer")
     st.subheader("See how furniture will look in your room before you buy!")
     
     # Initialize the visualizer
     if 'visualizer' not in st.session_state:
-        st.session_state.visualizer = FurnitureVisualizer()
+        try:
+            st.session_state.visualizer = FurnitureVisualizer(
+                cache=get_result_cache(),
+                client=shared_client,
+                flight=get_single_flight(),
+                limiter=get_admission_controller(),
+                retry=get_retry_policy(),
+                hedge=get_hedge_policy(),
+                on_error=show_generation_error,
+                metrics=get_metrics(),
+                file_handles=get_session_file_handles(),
+                rooms=get_room_index(),
+                router=get_model_router(),
+                preflight=get_preflight()
+            )
+        except MissingApiKeyError as e:
+            st.error(str(e))
+            st.stop()
     
     # Sidebar for furniture selection
     with st.sidebar:
         st.header("🛋️ Furniture Selection")
         
-        # Category selection
-        category = st.selectbox(
-            "Select Furniture Category:",
-            list(FURNITURE_CATALOG.keys())
+        compare_mode = st.toggle(
+            "Compare multiple items",
+            help="Render several pieces for the same room in parallel, as drafts on the fastest healthy model"
         )
         
-        # Furniture item selection
-        furniture_item = st.selectbox(
-            "Select Furniture:",
-            list(FURNITURE_CATALOG[category].keys())
-        )
+        page_items = search_catalog()
         
-        # Get furniture description
-        furniture_description = FURNITURE_CATALOG[category][furniture_item]
-        
-        st.write(f"**Selected:** {furniture_item}")
-        st.write(f"*{furniture_description}*")
+        if compare_mode:
+            # Keep earlier picks selectable while the search moves to other pages
+            selected_items = {item['sku']: item for item in st.session_state.get('compare_selection', [])}
+            page_lookup = {item['sku']: item for item in page_items}
+            options = list(selected_items) + [sku for sku in page_lookup if sku not in selected_items]
+            compare_skus = st.multiselect(
+                "Select Furniture to Compare:",
+                options,
+                default=list(selected_items),
+                format_func=lambda sku: f"{(selected_items.get(sku) or page_lookup[sku])['name']} "
+                                        f"({(selected_items.get(sku) or page_lookup[sku])['category']})",
+                max_selections=MAX_COMPARE_ITEMS
+            )
+            compare_items = [selected_items.get(sku) or page_lookup[sku] for sku in compare_skus]
+            st.session_state.compare_selection = compare_items
+            max_concurrency = st.slider(
+                "Parallel renders:",
+                min_value=1,
+                max_value=MAX_COMPARE_ITEMS,
+                value=DEFAULT_CONCURRENCY
+            )
+        elif not page_items:
+            st.info("No furniture matches your search.")
+            furniture_item = None
+        else:
+            # Furniture item selection from the current page of results
+            selected_item = st.selectbox(
+                "Select Furniture:",
+                page_items,
+                format_func=lambda item: f"{item['name']} ({item['category']})"
+            )
+            furniture_item = selected_item['name']
+            
+            # Get furniture description
+            furniture_description = item_description(selected_item)
+            
+            st.write(f"**Selected:** {furniture_item}")
+            st.write(f"*{furniture_description}*")
         
         # Placement instruction
         placement = st.text_area(
@@ -195,6 +735,63 @@ def main():
             "Preferred Material:",
             ["Keep original", "Leather", "Fabric", "Wood", "Metal", "Glass", "Plastic"]
         )
+        
+        # Room plan for step-by-step furnishing
+        current_step = None
+        if not compare_mode and furniture_item and placement:
+            current_step = {
+                'item': furniture_item,
+                'description': apply_preferences(furniture_description, color_preference, material_preference),
+                'placement': placement
+            }
+        if st.button("➕ Add to Room Plan", disabled=current_step is None,
+                     help="Add the current item and placement as the next step of the room plan"):
+            st.session_state.setdefault('chain_steps', []).append(current_step)
+        
+        # Result cache statistics
+        cache_stats = get_result_cache().stats()
+        st.caption(
+            f"♻️ Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['bytes'] / (1024 * 1024):.1f} MB on disk)"
+        )
+        flight_stats = get_single_flight().stats()
+        st.caption(
+            f"🔗 Coalesced: {flight_stats['coalesced']} calls saved "
+            f"({flight_stats['in_flight']} in flight)"
+        )
+        queue_stats = get_admission_controller().stats()
+        st.caption(
+            f"🚦 Queue: {queue_stats['queued']} waiting, "
+            f"{queue_stats['rejected']} turned away"
+        )
+        job_stats = get_job_queue().stats()
+        st.caption(
+            f"🧵 Jobs: {job_stats['queued']} queued, {job_stats['running']} running "
+            f"on {job_stats['workers']} workers"
+        )
+        router_stats = get_model_router().stats()
+        st.caption("🧭 Models: " + ", ".join(
+            f"{model} {'✅' if health['state'] == 'closed' else '⛔'}"
+            + (f" {health['p50']:.1f}s" if health['p50'] is not None else "")
+            for model, health in router_stats['models'].items()
+        ) + (f" ({router_stats['failovers']} failovers)" if router_stats['failovers'] else ""))
+        render_stats = get_metrics().snapshot().get('render_total')
+        if render_stats:
+            st.caption(
+                f"⏱️ Renders: p50 {render_stats['p50']:.1f}s / p95 {render_stats['p95']:.1f}s "
+                f"over {render_stats['count']} requests"
+            )
+        if get_file_handles() is not None:
+            handle_stats = get_file_handles().stats()
+            st.caption(
+                f"📤 Room uploads: {handle_stats['uploads']} uploaded, "
+                f"{handle_stats['reuses']} reused"
+            )
+        store_stats = get_session_store().stats()
+        st.caption(
+            f"🧠 Session images: {store_stats['resident_bytes'] / (1024 * 1024):.1f} MB in memory, "
+            f"{store_stats['spilled_bytes'] / (1024 * 1024):.1f} MB on disk"
+        )
     
     # Main content area
     col1, col2 = st.columns([1, 1])
@@ -204,88 +801,60 @@ def main():
         
         uploaded_file = st.file_uploader(
             "Choose a room image...",
-            type=['png', 'jpg', 'jpeg'],
+            type=['png', 'jpg', 'jpeg', 'webp'],
             help="Upload a clear photo of your room where you want to place furniture"
         )
         
         if uploaded_file is not None:
-            # Display uploaded image
-            room_image = Image.open(uploaded_file)
-            st.image(room_image, caption="Your Room", width="stretch")
-            
-            # Store in session state
-            st.session_state.room_image = room_image
+            room_image = prepare_room_upload(uploaded_file)
+            for problem in st.session_state.room_preflight['problems']:
+                st.error(f"🖼️ {problem}")
+            if room_image is not None:
+                st.image(room_image.data, caption="Your Room", width="stretch")
+                st.caption(f"📦 Optimized for upload: {room_image.describe()}")
+                for warning in st.session_state.room_preflight['warnings']:
+                    st.warning(f"🖼️ {warning}")
     
     with col2:
         st.header("🎯 Generated Visualization")
         
-        if st.button("🚀 Generate Furniture Visualization", type="primary"):
-            if 'room_image' not in st.session_state:
+        if not compare_mode and furniture_item is not None:
+            show_quick_preview(selected_item, color_preference)
+            offer_similar_render(
+                furniture_item,
+                apply_preferences(furniture_description, color_preference, material_preference),
+                placement
+            )
+        
+        if compare_mode:
+            render_comparison(compare_items, placement, color_preference, material_preference, max_concurrency)
+        elif st.button("🚀 Generate Furniture Visualization", type="primary"):
+            room_image = load_room_image()
+            if furniture_item is None:
+                st.error("Please select a furniture item first!")
+            elif room_image is None:
                 st.error("Please upload a room image first!")
             elif not placement:
                 st.error("Please provide placement instructions!")
             else:
-                with st.spinner("Generating your furniture visualization..."):
-                    # Modify furniture description based on preferences
-                    modified_description = furniture_description
-                    
-                    if color_preference != "Keep original":
-                        modified_description += f" in {color_preference} color"
-                    
-                    if material_preference != "Keep original":
-                        modified_description += f" made of {material_preference.lower()}"
-                    
-                    # Generate visualization
-                    result_image = st.session_state.visualizer.generate_furniture_visualization(
-                        st.session_state.room_image,
-                        modified_description,
-                        placement
-                    )
-                    
-                    if result_image:
-                        st.image(result_image, caption="Furniture Visualization", width="stretch")
-                        
-                        # Save to session state
-                        st.session_state.result_image = result_image
-                        
-                        # Download button
-                        img_buffer = io.BytesIO()
-                        result_image.save(img_buffer, format='PNG')
-                        img_buffer.seek(0)
-                        
-                        st.download_button(
-                            label="📥 Download Visualization",
-                            data=img_buffer.getvalue(),
-                            file_name=f"furniture_visualization_{furniture_item.lower().replace(' ', '_')}.png",
-                            mime="image/png"
-                        )
-                        
-                        # Success message
-                        st.success("✅ Visualization generated successfully!")
-                        
-                        # Feedback section
-                        st.subheader("💭 How does it look?")
-                        col_a, col_b, col_c = st.columns(3)
-                        
-                        with col_a:
-                            if st.button("😍 Love it!"):
-                                st.balloons()
-                                st.write("Great choice! This furniture suits your room well.")
-                        
-                        with col_b:
-                            if st.button("🤔 Not sure"):
-                                st.write("Try adjusting the placement or choosing a different style.")
-                        
-                        with col_c:
-                            if st.button("❌ Don't like it"):
-                                st.write("No problem! Try a different furniture piece or color.")
-                    
-                    else:
-                        st.error("Failed to generate visualization. Please try again.")
+                # Modify furniture description based on preferences
+                modified_description = apply_preferences(furniture_description, color_preference, material_preference)
+                
+                # The worker pool renders it; the script thread is free right away
+                submit_render_job(
+                    room_image, furniture_item, modified_description, placement,
+                    color_preference, material_preference
+                )
         
-        # Show previous result if available
-        if 'result_image' in st.session_state and not st.button:
-            st.image(st.session_state.result_image, caption="Previous Visualization", width="stretch")
+        if not compare_mode:
+            follow_render_job()
+            show_result_panel()
+    
+    st.markdown("---")
+    show_history()
+    
+    st.markdown("---")
+    render_room_plan(current_step)
     
     # Tips section
     st.markdown("---")
@@ -0,0 +1,27 @@
+"""
+Shared background event loop for async model calls
+Streamlit runs every script on its own thread, so coroutines are scheduled on one
+long-lived loop instead of creating a new loop (and connection pool) per rerun
+"""
+
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the process-wide event loop, starting it on first use"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name='genai-async-loop', daemon=True)
+            thread.start()
+        return _loop
+
+
+def submit(coro):
+    """Schedule a coroutine on the shared loop and return a concurrent future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
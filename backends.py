@@ -0,0 +1,329 @@
+"""
+Image generation backends for the Furniture Visualizer
+The visualizer talks to a backend instead of the Gemini client directly, so calls
+can be recorded to a cassette store and replayed later without network or quota
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from PIL import Image
+from metrics import timed
+from result_cache import image_cache_bytes
+from retry import NoImageError
+
+
+@lru_cache(maxsize=None)
+def image_config():
+    """Generation config asking for an image response"""
+    from google.genai import types
+    return types.GenerateContentConfig(response_modalities=['Image'])
+
+
+@lru_cache(maxsize=None)
+def stream_config():
+    """Generation config for streamed requests, whose image may come with text"""
+    from google.genai import types
+    return types.GenerateContentConfig(response_modalities=['Text', 'Image'])
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when no recording exists for a request"""
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        super().__init__(f"No recorded response for request {fingerprint[:12]}")
+
+
+def part_image_bytes(part):
+    """Return the encoded image bytes of one response part, or None"""
+    # Try inline_data first (most reliable)
+    if hasattr(part, 'inline_data') and part.inline_data and hasattr(part.inline_data, 'data'):
+        try:
+            image_data = part.inline_data.data
+            Image.open(io.BytesIO(image_data))
+            return image_data
+        except Exception:
+            pass
+
+    # Fallback to as_image method
+    if hasattr(part, 'as_image'):
+        try:
+            genai_image = part.as_image()
+            if genai_image is not None:
+                # Try to get the image data directly
+                if hasattr(genai_image, 'data'):
+                    image_data = genai_image.data
+                    Image.open(io.BytesIO(image_data))
+                    return image_data
+        except Exception:
+            pass
+
+    return None
+
+
+def extract_image_bytes(response):
+    """Extract the encoded image bytes from a model response"""
+    for part in response.parts or []:
+        image_data = part_image_bytes(part)
+        if image_data is not None:
+            return image_data
+    return None
+
+
+def _reason_name(reason):
+    return getattr(reason, 'value', reason) if reason is not None else None
+
+
+def no_image_error(response, text=None):
+    """NoImageError for a response without an image, with its finish reason and any text"""
+    candidates = getattr(response, 'candidates', None) or []
+    reason = _reason_name(candidates[0].finish_reason) if candidates else None
+    feedback = getattr(response, 'prompt_feedback', None)
+    if reason is None and feedback is not None:
+        reason = _reason_name(feedback.block_reason)
+    if text is None:
+        text = ''.join(part.text for part in response.parts or [] if part.text and not part.thought)
+    return NoImageError(reason, text)
+
+
+def _content_chunks(content):
+    """Yield the byte strings that identify one request content item"""
+    from google.genai import types
+    
+    if isinstance(content, str):
+        yield b'text'
+        yield content.encode('utf-8')
+    elif isinstance(content, types.Part) and content.inline_data is not None:
+        yield (content.inline_data.mime_type or '').encode('utf-8')
+        yield content.inline_data.data
+    elif isinstance(content, types.Part) and content.file_data is not None:
+        yield b'file'
+        yield (content.file_data.file_uri or '').encode('utf-8')
+    elif isinstance(content, types.Part) and content.text is not None:
+        yield b'text'
+        yield content.text.encode('utf-8')
+    elif isinstance(content, (Image.Image, bytes, bytearray)):
+        yield b'image'
+        yield image_cache_bytes(content)
+    else:
+        raise TypeError(f"Cannot fingerprint request content of type {type(content).__name__}")
+
+
+def request_fingerprint(model_id, contents):
+    """Hash a generation request so identical requests map to one recording"""
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    digest = hashlib.sha256()
+    chunks = [model_id.encode('utf-8')]
+    for content in contents:
+        chunks.extend(_content_chunks(content))
+    for chunk in chunks:
+        digest.update(len(chunk).to_bytes(8, 'big'))
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GeminiBackend:
+    """Live backend that calls the Gemini API"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def generate(self, model_id, contents):
+        """Send one generation request and return the image bytes"""
+        with timed('model'):
+            response = self.client.models.generate_content(
+                model=model_id,
+                contents=contents,
+                config=image_config()
+            )
+        with timed('parse'):
+            image_data = extract_image_bytes(response)
+        if image_data is None:
+            raise no_image_error(response)
+        return image_data
+
+    async def agenerate(self, model_id, contents):
+        """Async variant of generate"""
+        with timed('model'):
+            response = await self.client.aio.models.generate_content(
+                model=model_id,
+                contents=contents,
+                config=image_config()
+            )
+        with timed('parse'):
+            image_data = extract_image_bytes(response)
+        if image_data is None:
+            raise no_image_error(response)
+        return image_data
+
+    async def astream(self, model_id, contents, on_text=None):
+        """Streamed variant of agenerate; on_text(text) receives the text so far as it arrives
+
+        The image is returned as soon as its part is complete, and closing the
+        stream drops the rest of the response. Cancelling the awaiting task tears
+        the request down mid-response.
+        """
+        text = ''
+        chunk = None
+        with timed('model'):
+            stream = await self.client.aio.models.generate_content_stream(
+                model=model_id,
+                contents=contents,
+                config=stream_config()
+            )
+            async with contextlib.aclosing(stream):
+                async for chunk in stream:
+                    for part in chunk.parts or []:
+                        if part.text and not part.thought:
+                            text += part.text
+                            if on_text is not None:
+                                on_text(text)
+                        image_data = part_image_bytes(part)
+                        if image_data is not None:
+                            return image_data
+        if chunk is None:
+            raise NoImageError()
+        raise no_image_error(chunk, text)
+
+
+class CassetteStore:
+    """Directory of recorded responses keyed by request fingerprint
+
+    Layout: index.jsonl with one metadata line per recording, and the
+    response image bytes in blobs/<fingerprint>.bin.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.jsonl')
+        self._entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._entries[entry['fingerprint']] = entry
+
+    def _blob_path(self, fingerprint):
+        return os.path.join(self.directory, 'blobs', f"{fingerprint}.bin")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, fingerprint):
+        """Return (image bytes, metadata) for a recording, or None"""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+        if entry is None:
+            return None
+        try:
+            with open(self._blob_path(fingerprint), 'rb') as f:
+                return f.read(), entry
+        except OSError:
+            return None
+
+    def put(self, fingerprint, model_id, image_data, latency):
+        """Record a response for a request fingerprint"""
+        path = self._blob_path(fingerprint)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_data)
+        os.replace(tmp_path, path)
+
+        entry = {
+            'fingerprint': fingerprint,
+            'model': model_id,
+            'bytes': len(image_data),
+            'latency': round(latency, 3),
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with self._lock:
+            self._entries[fingerprint] = entry
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+class RecordingBackend:
+    """Pass requests to another backend and record every successful response"""
+
+    def __init__(self, inner, cassette):
+        self.inner = inner
+        self.cassette = cassette
+
+    def generate(self, model_id, contents):
+        fingerprint = request_fingerprint(model_id, contents)
+        started = time.monotonic()
+        image_data = self.inner.generate(model_id, contents)
+        with timed('record'):
+            self.cassette.put(fingerprint, model_id, image_data, time.monotonic() - started)
+        return image_data
+
+    async def agenerate(self, model_id, contents):
+        fingerprint = request_fingerprint(model_id, contents)
+        started = time.monotonic()
+        image_data = await self.inner.agenerate(model_id, contents)
+        with timed('record'):
+            self.cassette.put(fingerprint, model_id, image_data, time.monotonic() - started)
+        return image_data
+
+    async def astream(self, model_id, contents, on_text=None):
+        fingerprint = request_fingerprint(model_id, contents)
+        started = time.monotonic()
+        if hasattr(self.inner, 'astream'):
+            image_data = await self.inner.astream(model_id, contents, on_text)
+        else:
+            image_data = await self.inner.agenerate(model_id, contents)
+        with timed('record'):
+            self.cassette.put(fingerprint, model_id, image_data, time.monotonic() - started)
+        return image_data
+
+
+class ReplayBackend:
+    """Serve recorded responses from a cassette store without any network calls
+
+    latency is the simulated delay in seconds; None replays the latency that was
+    measured when the response was recorded. jitter adds a random extra delay.
+    """
+
+    def __init__(self, cassette, latency=0.0, jitter=0.0):
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+
+    def _lookup(self, model_id, contents):
+        fingerprint = request_fingerprint(model_id, contents)
+        recording = self.cassette.get(fingerprint)
+        if recording is None:
+            raise CassetteMissError(fingerprint)
+        image_data, entry = recording
+        latency = entry.get('latency', 0.0) if self.latency is None else self.latency
+        return image_data, latency + random.uniform(0, self.jitter)
+
+    def generate(self, model_id, contents):
+        with timed('model'):
+            image_data, delay = self._lookup(model_id, contents)
+            time.sleep(delay)
+        return image_data
+
+    async def agenerate(self, model_id, contents):
+        with timed('model'):
+            image_data, delay = self._lookup(model_id, contents)
+            await asyncio.sleep(delay)
+        return image_data
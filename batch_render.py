@@ -0,0 +1,267 @@
+"""
+Headless batch rendering for the Furniture Visualizer
+Renders every combination of room photo × catalog item × color × material through a
+bounded worker pool, writes the images to an output directory and records each
+result in a JSONL manifest. Interrupted runs can be resumed: entries already
+completed in the manifest are skipped.
+
+Example:
+    python batch_render.py --rooms rooms/ --output renders/ --categories Seating Tables --colors Gray Navy
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from PIL import Image
+from dotenv import load_dotenv
+from catalog import apply_preferences, create_catalog_store, item_description, slugify
+from model_router import DRAFT, FINAL, create_model_router
+from preflight import create_preflight
+from preprocessing import preprocess_room_image
+from singleflight import SingleFlight
+from visualizer import (
+    FurnitureVisualizer,
+    MissingApiKeyError,
+    create_admission_controller,
+    create_backend,
+    create_file_handles,
+    create_hedge_policy,
+    create_metrics,
+    create_result_cache,
+    create_retry_policy,
+    create_room_index
+)
+
+ROOM_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+DEFAULT_PLACEMENT = "Place it where it fits naturally in the room"
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+def find_rooms(rooms_dir):
+    """Return the room photos in a directory, sorted by name"""
+    return sorted(
+        os.path.join(rooms_dir, name)
+        for name in os.listdir(rooms_dir)
+        if name.lower().endswith(ROOM_EXTENSIONS)
+    )
+
+
+def job_id(room_path, sku, color, material, placement):
+    """Stable identifier for one render, used to resume interrupted runs"""
+    key = json.dumps([os.path.basename(room_path), sku, color, material, placement])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def plan_jobs(rooms, items, colors, materials, placement):
+    """Expand rooms × items × colors × materials into job dicts, room by room"""
+    jobs = []
+    for room_path in rooms:
+        for item in items:
+            for color in colors:
+                for material in materials:
+                    jobs.append({
+                        'id': job_id(room_path, item['sku'], color, material, placement),
+                        'room': room_path,
+                        'sku': item['sku'],
+                        'category': item['category'],
+                        'item': item['name'],
+                        'description': item_description(item),
+                        'color': color,
+                        'material': material,
+                        'placement': placement,
+                    })
+    return jobs
+
+
+def load_completed(manifest_path):
+    """Return the ids of jobs finished successfully in a previous run"""
+    completed = set()
+    if not os.path.exists(manifest_path):
+        return completed
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a truncated last line behind
+                continue
+            if entry.get('status') == 'ok' and os.path.exists(entry.get('output', '')):
+                completed.add(entry['id'])
+    return completed
+
+
+class BatchRenderer:
+    """Run render jobs on a bounded worker pool and append results to a manifest"""
+
+    def __init__(self, visualizer, output_dir, workers=4, tier=FINAL):
+        self.visualizer = visualizer
+        self.output_dir = output_dir
+        self.workers = workers
+        self.tier = tier
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._manifest_lock = threading.Lock()
+        # Keep a few prepared rooms around; jobs are ordered room by room
+        self._prepare_room = functools.lru_cache(maxsize=workers * 2)(self._load_room)
+
+    def _load_room(self, path):
+        """Preprocess a room photo whose header passed the pre-flight checks"""
+        if self.visualizer.preflight is not None:
+            self.visualizer.preflight.enforce(path, pixels=False)
+        return preprocess_room_image(path)
+
+    def _write_output(self, job, image_data):
+        image_format = (Image.open(io.BytesIO(image_data)).format or 'PNG').lower()
+        room_name = os.path.splitext(os.path.basename(job['room']))[0]
+        filename = f"{job['id']}_{slugify(job['item'])}.{image_format}"
+        path = os.path.join(self.output_dir, slugify(room_name), filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_data)
+        os.replace(tmp_path, path)
+        return path
+
+    def _record(self, entry):
+        with self._manifest_lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def run_job(self, job):
+        """Render one job and return its manifest entry"""
+        started = time.monotonic()
+        entry = dict(job)
+        try:
+            room_image = self._prepare_room(job['room'])
+            description = apply_preferences(job['description'], job['color'], job['material'])
+            image_data = self.visualizer.render_image_bytes(room_image, description, job['placement'], tier=self.tier)
+            entry['output'] = self._write_output(job, image_data)
+            entry['bytes'] = len(image_data)
+            entry['status'] = 'ok'
+        except Exception as e:
+            entry['status'] = 'error'
+            entry['error'] = str(e)
+
+        entry['seconds'] = round(time.monotonic() - started, 3)
+        entry['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self._record(entry)
+        return entry
+
+    def run(self, jobs, on_result=None):
+        """Run jobs with at most `workers` renders in flight; returns (ok, failed)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Bound queued work too, so huge batches never pile up as futures
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        counts = {'ok': 0, 'error': 0}
+        counts_lock = threading.Lock()
+
+        def finished(future):
+            slots.release()
+            entry = future.result()
+            with counts_lock:
+                counts[entry['status']] += 1
+            if on_result is not None:
+                on_result(entry)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for job in jobs:
+                slots.acquire()
+                executor.submit(self.run_job, job).add_done_callback(finished)
+
+        return counts['ok'], counts['error']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch render furniture visualizations for a directory of rooms")
+    parser.add_argument('--rooms', required=True, help="Directory of room photos")
+    parser.add_argument('--output', default='batch_output', help="Directory for renders and the manifest")
+    parser.add_argument('--categories', nargs='*', help="Catalog categories to render (default: all)")
+    parser.add_argument('--items', nargs='*', help="Catalog item names to render (default: all in the categories)")
+    parser.add_argument('--colors', nargs='*', default=["Keep original"], help="Color preferences to render")
+    parser.add_argument('--materials', nargs='*', default=["Keep original"], help="Material preferences to render")
+    parser.add_argument('--placement', default=DEFAULT_PLACEMENT, help="Placement instruction for every render")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', '4')),
+                        help="Number of renders in flight at once")
+    parser.add_argument('--tier', choices=[FINAL, DRAFT], default=FINAL,
+                        help="final renders on the best healthy model, draft on the fastest one")
+    parser.add_argument('--dry-run', action='store_true', help="Only print how many renders would run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+
+    rooms = find_rooms(args.rooms)
+    items = create_catalog_store().iter_items(categories=args.categories, names=args.items)
+    jobs = plan_jobs(rooms, items, args.colors, args.materials, args.placement)
+
+    completed = load_completed(os.path.join(args.output, MANIFEST_NAME))
+    pending = [job for job in jobs if job['id'] not in completed]
+
+    print("🏭 Furniture Visualizer Batch Render")
+    print("=" * 40)
+    print(f"🏠 {len(rooms)} rooms × 🛋️ {len(items)} items × {len(args.colors)} colors × {len(args.materials)} materials")
+    print(f"📋 {len(jobs)} renders planned, {len(jobs) - len(pending)} already done, {len(pending)} to go")
+
+    if args.dry_run or not pending:
+        return
+
+    try:
+        backend = create_backend()
+        visualizer = FurnitureVisualizer(
+            backend=backend,
+            file_handles=create_file_handles(backend),
+            cache=create_result_cache(),
+            flight=SingleFlight(),
+            limiter=create_admission_controller(),
+            retry=create_retry_policy(),
+            hedge=create_hedge_policy(),
+            metrics=create_metrics(),
+            rooms=create_room_index(),
+            router=create_model_router(),
+            preflight=create_preflight()
+        )
+    except MissingApiKeyError as e:
+        print(f"❌ {str(e)}")
+        return
+    renderer = BatchRenderer(visualizer, args.output, workers=args.workers, tier=args.tier)
+    progress = {'done': 0}
+    progress_lock = threading.Lock()
+
+    def report(entry):
+        with progress_lock:
+            progress['done'] += 1
+            done = progress['done']
+        label = f"{os.path.basename(entry['room'])} · {entry['item']} · {entry['color']} · {entry['material']}"
+        if entry['status'] == 'ok':
+            print(f"✅ [{done}/{len(pending)}] {label} ({entry['seconds']:.1f}s)")
+        else:
+            print(f"❌ [{done}/{len(pending)}] {label}: {entry['error']}")
+
+    started = time.monotonic()
+    ok, failed = renderer.run(pending, on_result=report)
+    if visualizer.file_handles is not None:
+        visualizer.file_handles.clear()
+    print(f"\n🎉 Finished in {time.monotonic() - started:.0f}s: {ok} rendered, {failed} failed")
+    print(f"📄 Manifest: {renderer.manifest_path}")
+    for stage, stats in visualizer.metrics.snapshot().items():
+        print(f"⏱️ {stage}: p50 {stats['p50'] * 1000:.0f} ms, p95 {stats['p95'] * 1000:.0f} ms, "
+              f"p99 {stats['p99'] * 1000:.0f} ms ({stats['count']} samples)")
+    for model, health in visualizer.router.stats()['models'].items():
+        print(f"🧭 {model}: {health['state']}, {health['error_rate']:.0%} errors in recent calls")
+    if failed:
+        print("Run the same command again to retry the failed renders.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Catalog search benchmark
+Generates a synthetic catalog of realistic size (80k SKUs by default), imports it
+into a temporary SQLite store, times the background index build and measures search
+latency for exact, prefix, fuzzy, multi-token and category-filtered queries,
+including fetching the page of items from the store. Finally it checks on the
+built-in catalog that items named after a query rank above items that only
+mention it in their description.
+
+Example:
+    python benchmarks/catalog_benchmark.py --skus 80000 --queries 500
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import Catalog, CatalogStore, builtin_items
+from catalog_index import tokenize
+
+TYPES = {
+    "Seating": ["Sofa", "Sectional", "Loveseat", "Armchair", "Recliner", "Accent Chair", "Dining Chair", "Bench", "Stool"],
+    "Tables": ["Coffee Table", "Side Table", "Dining Table", "Console Table", "End Table", "Desk"],
+    "Storage": ["Bookshelf", "TV Unit", "Wardrobe", "Cabinet", "Dresser", "Sideboard", "Shelf"],
+    "Lighting": ["Floor Lamp", "Table Lamp", "Pendant Light", "Chandelier", "Wall Sconce"],
+    "Bedroom": ["Bed", "Nightstand", "Headboard", "Vanity", "Armoire"],
+    "Decor": ["Rug", "Mirror", "Planter", "Wall Art", "Curtains", "Cushion"],
+}
+STYLES = ["Modern", "Mid-Century", "Scandinavian", "Industrial", "Rustic", "Coastal", "Traditional", "Bohemian",
+          "Minimalist", "Farmhouse", "Art Deco", "Contemporary"]
+COLORS = ["Black", "White", "Gray", "Charcoal", "Navy", "Beige", "Cream", "Walnut", "Oak", "Olive", "Terracotta",
+          "Blush", "Mustard", "Teal", "Ivory"]
+MATERIALS = ["Leather", "Velvet", "Linen", "Boucle", "Oak", "Walnut", "Teak", "Marble", "Glass", "Steel", "Brass",
+             "Rattan", "Cotton", "Wool"]
+COLLECTIONS = ["Aster", "Belmont", "Cassia", "Dalton", "Elowen", "Fairfax", "Grove", "Harbor", "Isla", "Juniper",
+               "Kestrel", "Linden", "Marlow", "Nordic", "Orchard", "Pascal", "Quinn", "Rowan", "Sable", "Tamsin"]
+
+QUERIES = ["sofa", "velvet sofa", "walnut coffee table", "scandinavian", "lea", "mid century armchair",
+           "chandeleir", "bookshlef", "boucle", "brass floor lamp", "grey rug", "marlow", "oak", "teal velvet",
+           "industrial desk", "ratan", "so", "modern", "linen bed", "navy sectional"]
+RANKING_QUERIES = ["sofa", "chair", "table", "lamp", "pillows", "mirror"]
+
+
+def generate_items(count, seed=1):
+    rng = random.Random(seed)
+    categories = list(TYPES)
+    items = []
+    for index in range(count):
+        category = rng.choice(categories)
+        kind = rng.choice(TYPES[category])
+        style, color, material = rng.choice(STYLES), rng.choice(COLORS), rng.choice(MATERIALS)
+        items.append({
+            'sku': f"SKU{index:06d}",
+            'name': f"{rng.choice(COLLECTIONS)} {style} {kind}",
+            'category': category,
+            'style': style,
+            'color': color,
+            'material': material,
+            'dimensions': {'width': rng.randint(30, 300), 'depth': rng.randint(30, 120), 'height': rng.randint(20, 220)},
+        })
+    return items
+
+
+def check_ranking(scratch):
+    """Print whether name matches rank first for each ranking query; returns the failures"""
+    store = CatalogStore(os.path.join(scratch, 'ranking.sqlite'))
+    store.replace_items(builtin_items())
+    catalog = Catalog(store, background=False)
+    failures = 0
+    for query in RANKING_QUERIES:
+        _, items = catalog.search(query, limit=len(store))
+        tokens = tokenize(query)
+        # Prefixes count, so "chair" names "Dining Chairs"
+        named = [any(word.startswith(token) for token in tokens for word in tokenize(item['name'])) for item in items]
+        # Every item named after the query comes before every item that is not
+        ok = named == sorted(named, reverse=True)
+        failures += not ok
+        print(f"   {'✅' if ok else '❌'} '{query}': {', '.join(item['name'] for item in items[:4])}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark catalog import, index build and search latency")
+    parser.add_argument('--skus', type=int, default=80000, help="Synthetic catalog size")
+    parser.add_argument('--queries', type=int, default=500, help="Searches to time")
+    parser.add_argument('--page-size', type=int, default=20, help="Items fetched per search")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scratch = tempfile.mkdtemp(prefix='catalog_benchmark_')
+    source = os.path.join(scratch, 'catalog.json')
+    with open(source, 'w', encoding='utf-8') as f:
+        json.dump(generate_items(args.skus), f)
+
+    print("🔎 Furniture Visualizer Catalog Benchmark")
+    print("=" * 40)
+    started = time.perf_counter()
+    store = CatalogStore(os.path.join(scratch, 'catalog.sqlite'))
+    store.import_json(source)
+    print(f"📥 Imported {len(store)} SKUs in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    catalog = Catalog(store)
+    print(f"🚀 Catalog usable after {(time.perf_counter() - started) * 1000:.1f} ms (index building in background)")
+    total, _ = catalog.search("velvet sofa")
+    print(f"   Fallback search before the index is ready: {total} matches")
+    if not catalog.wait_ready():
+        print(f"❌ Index build failed: {catalog.error}")
+        return
+    print(f"🏗️ Index ready after {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(2)
+    categories = catalog.categories()
+    timings = []
+    for _ in range(args.queries):
+        query = rng.choice(QUERIES)
+        category = rng.choice(categories) if rng.random() < 0.3 else None
+        offset = rng.choice([0, 0, 0, args.page_size, args.page_size * 5])
+        started = time.perf_counter()
+        catalog.search(query, category, offset=offset, limit=args.page_size)
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    for label, quantile in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        print(f"⏱️ search {label}: {timings[min(len(timings) - 1, int(quantile * len(timings)))] * 1000:.2f} ms")
+    print(f"⏱️ search max: {timings[-1] * 1000:.2f} ms")
+
+    for query in ("chandeleir", "bookshlef", "lea"):
+        total, items = catalog.search(query, limit=3)
+        print(f"   '{query}': {total} matches, e.g. {', '.join(item['name'] for item in items)}")
+
+    print("🏅 Ranking on the built-in catalog")
+    failures = check_ranking(scratch)
+    print(f"   {len(RANKING_QUERIES) - failures} of {len(RANKING_QUERIES)} queries rank name matches first")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Cold start benchmark for the Streamlit app
+Starts a fresh Python process per run, as a newly scaled instance would, and drives
+the app headlessly with streamlit's AppTest against an in-process fake backend.
+Reports, from process launch, when the server is ready to accept sessions, when the
+first page has rendered and when the first generated image is on the page.
+
+"cold" starts the app the way `streamlit run app.py` does; "warm" runs serve.py's
+warm-up first, so its cost moves before the server reports ready. A GEMINI_API_KEY
+is set when none is configured, so the shared client is built as in production;
+its model warm-up then fails fast against the real endpoint and is not retried.
+
+Example:
+    python benchmarks/cold_start_benchmark.py --runs 5
+    python benchmarks/cold_start_benchmark.py --compare benchmarks/results/cold-start-before.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ('cold', 'warm')
+MILESTONES = ('ready', 'first_render', 'first_generation')
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def child(mode, app_path, timeout):
+    """Run one start in this process and print wall-clock milestones as JSON"""
+    marks = {}
+    from streamlit.testing.v1 import AppTest
+    if mode == 'warm':
+        from warmup import warm_start
+        warm_start()
+    marks['ready'] = time.time()
+
+    import io
+    import visualizer
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (512, 512), (180, 150, 120)).save(buffer, format='PNG')
+    response_image = buffer.getvalue()
+
+    def create_fake_backend(client=None):
+        # Imported on first use like the real backend's SDK, so the cold path pays for it once
+        from fake_backend import FakeBackend
+        return FakeBackend(image_data=response_image)
+
+    visualizer.create_backend = create_fake_backend
+
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    at.run()
+    marks['first_render'] = time.time()
+
+    from fake_backend import make_room_photo
+    at.file_uploader[0].upload('room.jpg', make_room_photo(1280, 960), 'image/jpeg')
+    at.run()
+    at.text_area[0].input("Against the far wall, facing the window")
+    next(button for button in at.button if 'Generate Furniture' in button.label).click()
+    at.run()
+    deadline = time.monotonic() + timeout
+    while not at.get('download_button') and time.monotonic() < deadline:
+        time.sleep(0.02)
+        at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    if not at.get('download_button'):
+        raise RuntimeError("No generated image within the timeout")
+    marks['first_generation'] = time.time()
+    print(json.dumps(marks))
+
+
+def run_start(mode, app_path, timeout, scratch):
+    """Launch one fresh process and return its milestones in seconds since launch"""
+    env = dict(os.environ)
+    env.setdefault('GEMINI_API_KEY', 'cold-start-benchmark')
+    env.update({
+        'FURNITURE_BACKEND': 'live',
+        'WARMUP_TIMEOUT_SECONDS': '10',
+        'RESULT_CACHE_DIR': os.path.join(scratch, 'results'),
+        'CHAIN_CHECKPOINT_DIR': os.path.join(scratch, 'checkpoints'),
+        'SESSION_SPILL_DIR': os.path.join(scratch, 'sessions'),
+        'ROOM_INDEX_PATH': os.path.join(scratch, 'rooms.jsonl'),
+        'JOB_DB': os.path.join(scratch, 'jobs.sqlite'),
+        'HISTORY_DIR': os.path.join(scratch, 'history'),
+        'CATALOG_DB': os.path.join(scratch, 'catalog.sqlite'),
+    })
+    launched = time.time()
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode, '--app', app_path, '--timeout', str(timeout)],
+        cwd=scratch, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{mode} start failed:\n{completed.stderr[-2000:]}")
+    marks = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {milestone: marks[milestone] - launched for milestone in MILESTONES}
+
+
+def summarize(samples):
+    return {
+        milestone: {
+            'median_s': round(statistics.median(sample[milestone] for sample in samples), 3),
+            'max_s': round(max(sample[milestone] for sample in samples), 3),
+        }
+        for milestone in MILESTONES
+    }
+
+
+def print_comparison(previous, current):
+    """Print median changes for modes present in both runs"""
+    print(f"\n📊 Compared with {previous.get('revision') or 'previous run'} ({previous.get('timestamp')})")
+    for mode, summary in current['modes'].items():
+        before = previous['modes'].get(mode)
+        if before is None:
+            continue
+        changes = "  ".join(
+            f"{milestone} {summary[milestone]['median_s'] - before[milestone]['median_s']:+.2f}s"
+            for milestone in MILESTONES
+        )
+        print(f"  {mode:>5}: {changes}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure time to ready, first render and first generation")
+    parser.add_argument('--app', default=os.path.join(ROOT, 'app.py'), help="App script to benchmark")
+    parser.add_argument('--modes', nargs='*', choices=MODES, default=list(MODES), help="Start modes to measure")
+    parser.add_argument('--runs', type=int, default=3, help="Fresh processes per mode")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds to wait for each milestone")
+    parser.add_argument('--output', help="JSON results path (default: benchmarks/results/cold-start-<time>.json)")
+    parser.add_argument('--compare', help="Previous JSON results to compare against")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    app_path = os.path.abspath(args.app)
+    if args.child:
+        child(args.child, app_path, args.timeout)
+        return
+
+    print("🧊 Furniture Visualizer Cold Start Benchmark")
+    print("=" * 40)
+    print(f"📄 App: {app_path}")
+
+    modes = {}
+    for mode in args.modes:
+        samples = []
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory(prefix='cold_start_benchmark_') as scratch:
+                samples.append(run_start(mode, app_path, args.timeout, scratch))
+        modes[mode] = summarize(samples)
+        print(f"  {mode:>5}: " + "  ".join(
+            f"{milestone} {modes[mode][milestone]['median_s']:.2f}s" for milestone in MILESTONES
+        ) + f"  (median of {len(samples)})")
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items() if key != 'child'},
+        'modes': modes,
+    }
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"cold-start-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Local stand-in for the image generation API used by the benchmarks
+Responds after a configurable latency, fails a configurable share of calls with
+retryable 503 errors, and counts the bytes a real request and response would put
+on the wire (JSON bodies with base64 encoded image data). Given a LocalFileService,
+it also resolves uploaded file references and rejects unknown ones with a 404.
+Streamed calls send text_chunks spread over the first part of the latency.
+"""
+
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import random
+import threading
+import time
+from PIL import Image
+from google.genai import errors, types
+from metrics import timed
+
+
+def make_response_image(width=1024, height=1024, image_format='PNG'):
+    """Encode a noisy image of about the size a model returns"""
+    noise = Image.effect_noise((width, height), 48).convert('RGB')
+    buffer = io.BytesIO()
+    noise.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def make_room_photo(width, height, quality=92):
+    """Encode a synthetic room photo with camera-like detail as JPEG"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 24)
+    photo = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    buffer = io.BytesIO()
+    photo.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def wire_size(contents):
+    """Bytes of the JSON request body the SDK would send for these contents"""
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    parts = []
+    for content in contents:
+        if isinstance(content, str):
+            parts.append({'text': content})
+        elif isinstance(content, types.Part) and content.inline_data is not None:
+            parts.append({'inlineData': {
+                'mimeType': content.inline_data.mime_type,
+                'data': base64.b64encode(content.inline_data.data).decode('ascii'),
+            }})
+        elif isinstance(content, types.Part) and content.file_data is not None:
+            parts.append({'fileData': {'fileUri': content.file_data.file_uri}})
+        elif isinstance(content, types.Part) and content.text is not None:
+            parts.append({'text': content.text})
+    return len(json.dumps({'contents': [{'role': 'user', 'parts': parts}]}))
+
+
+class FakeBackend:
+    """Backend with simulated latency and failures, safe to share across threads"""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, image_data=None, seed=None, file_service=None,
+                 text_chunks=(), text_share=0.3):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.file_service = file_service
+        self.text_chunks = list(text_chunks)
+        self.text_share = text_share
+        self.image_data = image_data if image_data is not None else make_response_image()
+        # A successful response carries the image base64 encoded inside JSON
+        self.response_size = len(base64.b64encode(self.image_data)) + 200
+        self.calls = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.in_flight = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _check_files(self, contents):
+        for content in contents if isinstance(contents, (list, tuple)) else [contents]:
+            if isinstance(content, types.Part) and content.file_data is not None:
+                if self.file_service is None or not self.file_service.exists(content.file_data.file_uri):
+                    raise errors.ClientError(404, {'error': {'code': 404, 'message': 'File not found', 'status': 'NOT_FOUND'}})
+
+    def _begin(self, contents):
+        """Count the request and decide its delay and outcome"""
+        self._check_files(contents)
+        with self._lock:
+            self.calls += 1
+            self.bytes_sent += wire_size(contents)
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.failure_rate
+        return delay, failed
+
+    def _finish(self, failed):
+        with self._lock:
+            if failed:
+                self.failures += 1
+                self.bytes_received += 200
+            else:
+                self.bytes_received += self.response_size
+        if failed:
+            raise errors.ServerError(503, {'error': {'code': 503, 'message': 'Simulated overload', 'status': 'UNAVAILABLE'}})
+        return self.image_data
+
+    def generate(self, model_id, contents):
+        delay, failed = self._begin(contents)
+        with timed('model'):
+            time.sleep(delay)
+        return self._finish(failed)
+
+    async def agenerate(self, model_id, contents):
+        delay, failed = self._begin(contents)
+        with timed('model'), self._open_request():
+            await asyncio.sleep(delay)
+        return self._finish(failed)
+
+    async def astream(self, model_id, contents, on_text=None):
+        delay, failed = self._begin(contents)
+        text = ''
+        with timed('model'), self._open_request():
+            for chunk in self.text_chunks:
+                await asyncio.sleep(delay * self.text_share / len(self.text_chunks))
+                text += chunk
+                if on_text is not None:
+                    on_text(text)
+            await asyncio.sleep(delay * (1 - self.text_share) if self.text_chunks else delay)
+        return self._finish(failed)
+
+    @contextlib.contextmanager
+    def _open_request(self):
+        """Count an async request while it is open, and those torn down by cancellation"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        except asyncio.CancelledError:
+            with self._lock:
+                self.cancelled += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'failures': self.failures,
+                'cancelled': self.cancelled,
+                'in_flight': self.in_flight,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+            }
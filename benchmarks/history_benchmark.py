@@ -0,0 +1,83 @@
+"""
+Generation history benchmark
+Fills a history in a scratch directory with tens of thousands of entries spread
+over several users, then reports the append rate, the time to reopen the store
+after a restart, and the latency of loading a gallery page (index records plus
+thumbnails) at the newest, middle and oldest page of one user's history.
+
+Example:
+    python benchmarks/history_benchmark.py --entries 50000 --users 20
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from history import GenerationHistory
+
+
+def percentile(timings, quantile):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(quantile * len(timings)))]
+
+
+def load_page(history, owner, page, page_size):
+    entries = history.page(owner, page, page_size)
+    return [history.thumbnail(entry) for entry in entries]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the append-only generation history")
+    parser.add_argument('--entries', type=int, default=30000, help="Generations to append")
+    parser.add_argument('--users', type=int, default=10, help="Users the generations are spread over")
+    parser.add_argument('--image-kb', type=int, default=24, help="Size of each stored image")
+    parser.add_argument('--thumbnail-kb', type=int, default=6, help="Size of each stored thumbnail")
+    parser.add_argument('--page-size', type=int, default=12, help="Thumbnails per gallery page")
+    parser.add_argument('--samples', type=int, default=200, help="Page loads timed per position")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(1)
+    image = os.urandom(args.image_kb * 1024)
+    thumbnail = os.urandom(args.thumbnail_kb * 1024)
+    owners = [f"user-{index}" for index in range(args.users)]
+
+    print("🕘 Furniture Visualizer History Benchmark")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory(prefix='history_benchmark_') as scratch:
+        history = GenerationHistory(scratch, thumbnails=lambda data: thumbnail)
+        started = time.perf_counter()
+        for index in range(args.entries):
+            history.add(owners[index % args.users], image, room=f"{rng.getrandbits(128):032x}",
+                        item="Modern Sofa", color="Navy", material="Fabric")
+        elapsed = time.perf_counter() - started
+        print(f"✍️ Appended {args.entries} entries in {elapsed:.2f}s ({args.entries / elapsed:,.0f}/s), "
+              f"{history.stats()['bytes'] / (1024 * 1024):.0f} MB packed")
+
+        started = time.perf_counter()
+        history = GenerationHistory(scratch)
+        print(f"📂 Reopened in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        owner = owners[0]
+        pages = -(-history.count(owner) // args.page_size)
+        for label, page in (("newest page", 0), ("middle page", pages // 2), ("oldest page", pages - 1)):
+            timings = []
+            for _ in range(args.samples):
+                started = time.perf_counter()
+                load_page(history, owner, page, args.page_size)
+                timings.append(time.perf_counter() - started)
+            print(f"⏱️ {label} ({page + 1} of {pages}): p50 {percentile(timings, 0.5) * 1000:.2f} ms, "
+                  f"p95 {percentile(timings, 0.95) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
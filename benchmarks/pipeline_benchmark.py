@@ -0,0 +1,265 @@
+"""
+End-to-end benchmark for the visualization pipeline
+Runs FurnitureVisualizer (preprocessing, request coalescing, retries and the async
+comparison path) against a local fake backend with configurable latency and failure
+rate. Every combination of room image size × concurrency × number of catalog items
+is one scenario; each reports throughput, latency percentiles, peak RSS and bytes on
+the wire. Results are written as JSON so runs of different versions can be diffed
+with --compare.
+
+Example:
+    python benchmarks/pipeline_benchmark.py --sizes 1280x960 4000x3000 --concurrency 1 4 16 --items 4 12
+    python benchmarks/pipeline_benchmark.py --compare benchmarks/results/before.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import builtin_items, item_description
+from file_handles import FileHandleCache, LocalFileService
+from fake_backend import FakeBackend, make_response_image, make_room_photo
+from metrics import Metrics
+from preprocessing import preprocess_room_image
+from result_cache import ResultCache
+from retry import RetryPolicy
+from singleflight import SingleFlight
+from visualizer import FurnitureVisualizer
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where unavailable"""
+    try:
+        # Optional; the only way to sample RSS on Windows and macOS
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def max_rss():
+    """Process-wide RSS high-water mark in bytes, or None where unavailable"""
+    try:
+        # Unix only
+        import resource
+    except ImportError:
+        return None
+    # KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRssSampler:
+    """Sample RSS on a background thread and keep the peak, or None if it cannot be measured"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = current_rss() or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak:
+            # No psutil or /proc: fall back to the process-wide high-water mark
+            self.peak = max_rss()
+
+
+def format_rss(megabytes):
+    return f"{megabytes:6.1f} MB" if megabytes is not None else "   n/a   "
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def run_scenario(room_data, size, concurrency, items, args, response_image):
+    """Render every item with the given concurrency and return the scenario results"""
+    file_service = LocalFileService() if args.file_handles else None
+    backend = FakeBackend(
+        file_service=file_service,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate,
+        image_data=response_image,
+        seed=args.seed
+    )
+    metrics = Metrics()
+    cache = ResultCache(tempfile.mkdtemp(prefix='pipeline_benchmark_')) if args.cache else None
+    visualizer = FurnitureVisualizer(
+        backend=backend,
+        cache=cache,
+        flight=SingleFlight(),
+        retry=RetryPolicy(max_attempts=args.max_attempts, base_delay=0.05, max_delay=0.5, deadline=60),
+        metrics=metrics,
+        file_handles=FileHandleCache(file_service) if file_service is not None else None
+    )
+
+    with PeakRssSampler() as rss:
+        started = time.perf_counter()
+        with metrics.stage('preprocess'):
+            room_image = preprocess_room_image(room_data)
+        requests = [
+            (f"{item['name']} #{round_index}", item_description(item), f"Placement variant {round_index}")
+            for round_index in range(args.rounds)
+            for item in items
+        ]
+        results = list(visualizer.render_many(room_image, requests, max_concurrency=concurrency))
+        elapsed = time.perf_counter() - started
+
+    succeeded = sum(1 for _, image_data, _ in results if image_data is not None)
+    latency = metrics.histogram('render_total').snapshot()
+    wire = backend.stats()
+    if file_service is not None:
+        # Room uploads through the Files API go over the wire too
+        wire['bytes_sent'] += file_service.bytes_uploaded
+    stages = {
+        stage: {key: round(snapshot[key] * 1000, 2) for key in ('p50', 'p95', 'p99')}
+        for stage, snapshot in metrics.snapshot().items()
+        if snapshot['count']
+    }
+    return {
+        'size': f"{size[0]}x{size[1]}",
+        'concurrency': concurrency,
+        'items': len(items),
+        'requests': len(requests),
+        'succeeded': succeeded,
+        'failed': len(requests) - succeeded,
+        'seconds': round(elapsed, 3),
+        'throughput_per_second': round(succeeded / elapsed, 3) if elapsed else None,
+        'latency_ms': {
+            'p50': round(latency['p50'] * 1000, 2),
+            'p95': round(latency['p95'] * 1000, 2),
+            'p99': round(latency['p99'] * 1000, 2),
+            'mean': round(latency['sum'] / latency['count'] * 1000, 2),
+        },
+        'stages_ms': stages,
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1) if rss.peak else None,
+        'upload_bytes': len(room_data),
+        'request_payload_bytes': len(room_image.data),
+        'backend_calls': wire['calls'],
+        'backend_failures': wire['failures'],
+        'bytes_sent': wire['bytes_sent'],
+        'bytes_received': wire['bytes_received'],
+    }
+
+
+def scenario_key(scenario):
+    return (scenario['size'], scenario['concurrency'], scenario['items'])
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(previous, current):
+    """Print throughput and p95 changes for scenarios present in both runs"""
+    baseline = {scenario_key(scenario): scenario for scenario in previous['scenarios']}
+    print(f"\n📊 Compared with {previous.get('revision') or 'previous run'} ({previous.get('timestamp')})")
+    for scenario in current['scenarios']:
+        before = baseline.get(scenario_key(scenario))
+        if before is None or not before['throughput_per_second']:
+            continue
+        throughput = scenario['throughput_per_second'] / before['throughput_per_second'] - 1
+        p95 = scenario['latency_ms']['p95'] / before['latency_ms']['p95'] - 1
+        if scenario['peak_rss_mb'] is not None and before['peak_rss_mb'] is not None:
+            rss = f"{scenario['peak_rss_mb'] - before['peak_rss_mb']:+.1f} MB"
+        else:
+            rss = "n/a"
+        print(f"  {scenario['size']:>10} c={scenario['concurrency']:<3} items={scenario['items']:<3} "
+              f"throughput {throughput:+.1%}  p95 {p95:+.1%}  peak RSS {rss}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the visualization pipeline against a fake backend")
+    parser.add_argument('--sizes', nargs='*', default=['1280x960', '4000x3000'], help="Room photo sizes (WxH)")
+    parser.add_argument('--concurrency', nargs='*', type=int, default=[1, 4, 16], help="Concurrency levels")
+    parser.add_argument('--items', nargs='*', type=int, default=[4, 12], help="Numbers of catalog items to render")
+    parser.add_argument('--rounds', type=int, default=2, help="Placement variants rendered for every item")
+    parser.add_argument('--latency-ms', type=float, default=200, help="Fake backend base latency")
+    parser.add_argument('--jitter-ms', type=float, default=100, help="Random extra latency per call")
+    parser.add_argument('--failure-rate', type=float, default=0.05, help="Share of calls failing with a retryable 503")
+    parser.add_argument('--max-attempts', type=int, default=4, help="Retry attempts per render")
+    parser.add_argument('--cache', action='store_true', help="Enable the result cache")
+    parser.add_argument('--file-handles', action='store_true',
+                        help="Upload each room once to a local file service and reference it by handle")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for latency and failure simulation")
+    parser.add_argument('--output', help="JSON results path (default: benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument('--compare', help="Previous JSON results to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    catalog_items = builtin_items()
+    response_image = make_response_image()
+
+    print("🏁 Furniture Visualizer Pipeline Benchmark")
+    print("=" * 40)
+    print(f"🧪 Fake backend: {args.latency_ms:.0f} ms + up to {args.jitter_ms:.0f} ms jitter, "
+          f"{args.failure_rate:.0%} failures")
+
+    scenarios = []
+    for size_text in args.sizes:
+        size = parse_size(size_text)
+        room_data = make_room_photo(*size)
+        for item_count in args.items:
+            items = catalog_items[:item_count]
+            for concurrency in args.concurrency:
+                scenario = run_scenario(room_data, size, concurrency, items, args, response_image)
+                scenarios.append(scenario)
+                print(f"  {scenario['size']:>10} c={concurrency:<3} items={len(items):<3} "
+                      f"{scenario['throughput_per_second']:6.2f}/s  "
+                      f"p50 {scenario['latency_ms']['p50']:7.1f} ms  p95 {scenario['latency_ms']['p95']:7.1f} ms  "
+                      f"RSS {format_rss(scenario['peak_rss_mb'])}  "
+                      f"sent {scenario['bytes_sent'] / (1024 * 1024):6.1f} MB  "
+                      f"failed {scenario['failed']}")
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': vars(args),
+        'scenarios': scenarios,
+    }
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Pre-flight check benchmark
+Derives room photos that should pass, warn or be rejected from one room photo:
+sharp, blurred, dark, black, flat, tiny, in an unsupported format, and PNG
+headers claiming far more pixels than the file holds. Each one is checked the
+way the app does it, first the upload's header and then the prepared image, and
+the verdict, blur score and time of both checks are reported.
+
+Example:
+    python benchmarks/preflight_benchmark.py --size 4000x3000 --repeats 20
+"""
+
+import argparse
+import io
+import os
+import struct
+import sys
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageEnhance, ImageFilter
+from preflight import Preflight
+from preprocessing import preprocess_room_image
+
+
+def encode(image, image_format='JPEG'):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def png_header_only(width, height):
+    """A small PNG whose header claims width×height grayscale pixels"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    rows = zlib.compress(b'\0' * (width + 1) * 16)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', rows) + chunk(b'IEND', b''))
+
+
+def make_cases(room_path, width, height):
+    room = Image.open(room_path).convert('RGB').resize((width, height), Image.LANCZOS)
+    # Blur radii are relative to the photo, so the cases mean the same at any size
+    radius = max(width, height) / 500
+    return [
+        ("sharp", encode(room)),
+        ("slightly blurred", encode(room.filter(ImageFilter.GaussianBlur(radius)))),
+        ("heavily blurred", encode(room.filter(ImageFilter.GaussianBlur(radius * 4)))),
+        ("dark", encode(ImageEnhance.Brightness(room).enhance(0.2))),
+        ("black frame", encode(Image.new('RGB', room.size, (4, 4, 4)))),
+        ("flat gray", encode(Image.new('RGB', room.size, (128, 128, 128)))),
+        ("tiny", encode(room.resize((200, 150)))),
+        ("GIF", encode(room.resize((800, 600)), 'GIF')),
+        ("80 MP header", png_header_only(10000, 8000)),
+        ("1.6 GP header", png_header_only(40000, 40000)),
+    ]
+
+
+def best_time(fn, repeats):
+    """Fastest of several runs and the last result"""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the local pre-flight checks of room photos")
+    parser.add_argument('--room', default=os.path.join(ROOT, 'demo_room.png'), help="Room photo the cases are made from")
+    parser.add_argument('--size', default='4000x3000', help="Size (WxH) the room photo is scaled to")
+    parser.add_argument('--repeats', type=int, default=10, help="Timed runs per check; the fastest is reported")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    width, height = (int(side) for side in args.size.lower().split('x'))
+    preflight = Preflight()
+    # The first check pays for importing numpy
+    preflight.check(encode(Image.new('RGB', (512, 512), (128, 128, 128))))
+
+    print("🖼️ Furniture Visualizer Pre-flight Benchmark")
+    print("=" * 40)
+    print(f"🧪 Cases built from {os.path.basename(args.room)} at {width}×{height}, best of {args.repeats} runs")
+    rejected = 0
+    cases = make_cases(args.room, width, height)
+    for label, data in cases:
+        header_time, report = best_time(lambda: preflight.check(data, pixels=False), args.repeats)
+        pixels_time = None
+        if report.ok:
+            room_image = preprocess_room_image(data)
+            pixels_time, report = best_time(lambda: preflight.check(room_image), args.repeats)
+        if report.problems:
+            rejected += 1
+            verdict = "❌ " + " ".join(report.problems)
+        elif report.warnings:
+            verdict = "⚠️ " + " ".join(report.warnings)
+        else:
+            verdict = "✅ ok"
+        blur = f"{report.metrics['blur']:7.1f}" if 'blur' in report.metrics else "      -"
+        pixels = f"{pixels_time * 1000:5.1f} ms" if pixels_time is not None else "      -"
+        print(f"  {label:>16}: header {header_time * 1000:5.2f} ms  pixels {pixels}  blur {blur}  {verdict}")
+    print(f"\n🚫 {rejected} of {len(cases)} photos rejected before any model call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Quick preview compositing benchmark
+Places every built-in catalog item on a preprocessed room photo at random positions
+and sizes, and reports the latency of the first placement (sprite drawing, room
+decode and layer scaling) and of later moves, which only repeat the alpha blend.
+
+Example:
+    python benchmarks/quick_preview_benchmark.py --size 4000x3000 --moves 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import builtin_items
+from fake_backend import make_room_photo
+from preprocessing import preprocess_room_image
+from quick_preview import QuickPreview, SpriteLibrary
+
+
+def percentile(timings, quantile):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(quantile * len(timings)))]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark local sprite compositing for quick previews")
+    parser.add_argument('--size', default='4000x3000', help="Room photo size (WxH) before preprocessing")
+    parser.add_argument('--moves', type=int, default=50, help="Placements timed per item after the first")
+    parser.add_argument('--sprite-dir', help="Directory of <sku>.png cutouts (default: drawn sprites)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    width, height = (int(side) for side in args.size.lower().split('x'))
+    room = preprocess_room_image(make_room_photo(width, height))
+    preview = QuickPreview(SpriteLibrary(args.sprite_dir))
+    rng = random.Random(1)
+
+    print("⚡ Furniture Visualizer Quick Preview Benchmark")
+    print("=" * 40)
+    print(f"🖼️ Room {room.size[0]}×{room.size[1]} after preprocessing")
+
+    first, moves = [], []
+    for item in builtin_items():
+        # Sizes come from the sliders in whole percent, so layers repeat
+        scale = rng.randint(20, 60) / 100
+        started = time.perf_counter()
+        preview.compose(room.data, item, 0.5, 0.85, scale)
+        first.append(time.perf_counter() - started)
+        for _ in range(args.moves):
+            started = time.perf_counter()
+            preview.compose(room.data, item, rng.random(), rng.uniform(0.5, 1.0), scale)
+            moves.append(time.perf_counter() - started)
+
+    for label, timings in (("first placement", first), ("move", moves)):
+        print(f"⏱️ {label}: p50 {percentile(timings, 0.5) * 1000:.1f} ms, "
+              f"p95 {percentile(timings, 0.95) * 1000:.1f} ms over {len(timings)} composites")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Rerun benchmark for the Streamlit app
+Drives the app headlessly with streamlit's AppTest: uploads a room photo, generates
+one visualization with an in-process fake backend, then changes sidebar widgets the
+way a user would and measures how long each rerun takes and how many bytes it
+sends to the browser.
+
+Bytes sent are the serialized forward messages of a rerun plus media files the
+browser has not fetched before; media already served under the same URL is cached
+by the browser, and download button files are only fetched when clicked.
+
+Example:
+    python benchmarks/rerun_benchmark.py --reruns 20
+    git show HEAD~1:app.py > /tmp/app_before.py && python benchmarks/rerun_benchmark.py --app /tmp/app_before.py
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+from streamlit.runtime.media_file_storage import MediaFileKind
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+import visualizer
+from fake_backend import FakeBackend, make_room_photo
+
+COLORS = ["Black", "White", "Brown", "Gray", "Navy", "Beige"]
+
+
+class TrafficMeter:
+    """Count bytes the server would send to the browser"""
+
+    def __init__(self):
+        self.bytes = 0
+        self._seen_media = set()
+
+    def install(self):
+        meter = self
+        enqueue = ForwardMsgQueue.enqueue
+        load_and_get_id = MemoryMediaFileStorage.load_and_get_id
+
+        def counting_enqueue(queue, msg):
+            meter.bytes += msg.ByteSize()
+            return enqueue(queue, msg)
+
+        def counting_load(storage, path_or_data, mimetype, kind, filename=None):
+            file_id = load_and_get_id(storage, path_or_data, mimetype, kind, filename)
+            # Download button files are only fetched when the user clicks them
+            downloadable = kind == MediaFileKind.DOWNLOADABLE
+            if file_id not in meter._seen_media and isinstance(path_or_data, bytes) and not downloadable:
+                meter._seen_media.add(file_id)
+                meter.bytes += len(path_or_data)
+            return file_id
+
+        ForwardMsgQueue.enqueue = counting_enqueue
+        MemoryMediaFileStorage.load_and_get_id = counting_load
+
+    def take(self):
+        sent, self.bytes = self.bytes, 0
+        return sent
+
+
+def make_result_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1024, 1024), (180, 150, 120)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def timed_run(at, meter, timeout):
+    started = time.perf_counter()
+    at.run(timeout=timeout)
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return elapsed, meter.take()
+
+
+def run_until_result(at, meter, timeout):
+    """Rerun until the result's download button appears, as the page's polling would"""
+    seconds, sent = timed_run(at, meter, timeout)
+    deadline = time.monotonic() + timeout
+    while not at.get('download_button') and time.monotonic() < deadline:
+        time.sleep(0.05)
+        elapsed, rerun_bytes = timed_run(at, meter, timeout)
+        seconds += elapsed
+        sent += rerun_bytes
+    return seconds, sent
+
+
+def run_benchmark(app_path, room_data, reruns, timeout=60):
+    """Return per-phase rerun timings and bytes for one app script"""
+    meter = TrafficMeter()
+    meter.install()
+    image_data = make_result_image()
+    visualizer.create_backend = lambda client=None: FakeBackend(image_data=image_data)
+
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    first_seconds, first_bytes = timed_run(at, meter, timeout)
+
+    at.file_uploader[0].upload('room.jpg', room_data, 'image/jpeg')
+    upload_seconds, upload_bytes = timed_run(at, meter, timeout)
+
+    at.text_area[0].input("Against the far wall, facing the window")
+    next(button for button in at.button if 'Generate Furniture' in button.label).click()
+    generate_seconds, generate_bytes = run_until_result(at, meter, timeout)
+
+    color_select = next(select for select in at.selectbox if select.label == "Preferred Color:")
+    samples = []
+    for index in range(reruns):
+        color_select.select(COLORS[index % len(COLORS)])
+        samples.append(timed_run(at, meter, timeout))
+        color_select = next(select for select in at.selectbox if select.label == "Preferred Color:")
+
+    seconds = [sample[0] for sample in samples]
+    sent = [sample[1] for sample in samples]
+    return {
+        'app': app_path,
+        'first_run': {'ms': round(first_seconds * 1000, 1), 'bytes': first_bytes},
+        'upload': {'ms': round(upload_seconds * 1000, 1), 'bytes': upload_bytes},
+        'generate': {'ms': round(generate_seconds * 1000, 1), 'bytes': generate_bytes},
+        'rerun': {
+            'count': reruns,
+            'median_ms': round(statistics.median(seconds) * 1000, 1),
+            'mean_ms': round(statistics.mean(seconds) * 1000, 1),
+            'max_ms': round(max(seconds) * 1000, 1),
+            'mean_bytes': round(statistics.mean(sent)),
+            'total_bytes': sum(sent),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Streamlit rerun time and bytes sent to the browser")
+    parser.add_argument('--app', default=os.path.join(ROOT, 'app.py'), help="App script to benchmark")
+    parser.add_argument('--image', help="Room photo to upload (default: synthetic 12 MP JPEG)")
+    parser.add_argument('--reruns', type=int, default=10, help="Sidebar changes to measure after generating")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Keep caches and spilled images out of the working tree, and never touch the network
+    scratch = tempfile.mkdtemp(prefix='rerun_benchmark_')
+    os.environ['FURNITURE_BACKEND'] = 'replay'
+    os.environ['RESULT_CACHE_DIR'] = os.path.join(scratch, 'results')
+    os.environ['CHAIN_CHECKPOINT_DIR'] = os.path.join(scratch, 'checkpoints')
+    os.environ['SESSION_SPILL_DIR'] = os.path.join(scratch, 'sessions')
+    os.environ['CASSETTE_DIR'] = os.path.join(scratch, 'cassettes')
+    os.environ['HISTORY_DIR'] = os.path.join(scratch, 'history')
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            room_data = f.read()
+    else:
+        room_data = make_room_photo(4000, 3000)
+
+    results = run_benchmark(os.path.abspath(args.app), room_data, args.reruns)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("⏱️ Furniture Visualizer Rerun Benchmark")
+    print("=" * 40)
+    print(f"📄 App: {results['app']}")
+    for phase in ('first_run', 'upload', 'generate'):
+        print(f"{phase:>10}: {results[phase]['ms']:8.1f} ms  {results[phase]['bytes'] / 1024:8.1f} KB")
+    rerun = results['rerun']
+    print(f"🔁 {rerun['count']} sidebar reruns: median {rerun['median_ms']:.1f} ms, "
+          f"max {rerun['max_ms']:.1f} ms, {rerun['mean_bytes'] / 1024:.1f} KB sent per rerun")
+
+
+if __name__ == "__main__":
+    main()
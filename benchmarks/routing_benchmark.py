@@ -0,0 +1,118 @@
+"""
+Model routing benchmark
+Runs renders against two simulated models, a slower high-quality one and a faster
+draft one, in phases: final and draft renders with both healthy, final renders
+while the high-quality model fails every call, and after it has recovered. Each phase is rendered once with the model fixed
+to the high-quality one and once through the router, and reports successes,
+latency percentiles and the calls each model received.
+
+Example:
+    python benchmarks/routing_benchmark.py --requests 40 --cooldown 2
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_backend import FakeBackend, make_response_image, make_room_photo
+from metrics import Metrics
+from model_router import DRAFT, FINAL, ModelRouter
+from preprocessing import preprocess_room_image
+from retry import RetryPolicy
+from visualizer import FurnitureVisualizer
+
+QUALITY_MODEL = 'quality-model'
+FAST_MODEL = 'fast-model'
+
+
+class ModelBackends:
+    """Dispatch generation calls to one fake backend per model id"""
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    def generate(self, model_id, contents):
+        return self.backends[model_id].generate(model_id, contents)
+
+    async def agenerate(self, model_id, contents):
+        return await self.backends[model_id].agenerate(model_id, contents)
+
+    def calls(self):
+        return {model: backend.stats()['calls'] for model, backend in self.backends.items()}
+
+
+def run_phase(visualizer, backends, room_image, phase, tier, args):
+    """Render distinct requests for one phase and return its results"""
+    visualizer.metrics = Metrics()
+    calls_before = backends.calls()
+    requests = [(f"{phase} #{index}", "a gray sofa", f"{phase} placement {index}") for index in range(args.requests)]
+    results = list(visualizer.render_many(room_image, requests, max_concurrency=args.concurrency, tier=tier))
+    latency = visualizer.metrics.histogram('render_total').snapshot()
+    calls = {model: count - calls_before[model] for model, count in backends.calls().items()}
+    return {
+        'succeeded': sum(1 for _, image_data, _ in results if image_data is not None),
+        'p50_ms': latency['p50'] * 1000,
+        'p95_ms': latency['p95'] * 1000,
+        'calls': calls,
+    }
+
+
+def run_mode(routed, room_image, response_image, args):
+    backends = ModelBackends({
+        QUALITY_MODEL: FakeBackend(latency=args.quality_latency_ms / 1000, jitter=0.02, image_data=response_image, seed=1),
+        FAST_MODEL: FakeBackend(latency=args.fast_latency_ms / 1000, jitter=0.02, image_data=response_image, seed=2),
+    })
+    router = ModelRouter([QUALITY_MODEL, FAST_MODEL], window=10, min_calls=4, cooldown=args.cooldown) if routed else None
+    visualizer = FurnitureVisualizer(
+        backend=backends,
+        retry=RetryPolicy(max_attempts=3, base_delay=0.05, max_delay=0.2, deadline=30),
+        metrics=Metrics(),
+        router=router
+    )
+    visualizer.model_id = QUALITY_MODEL
+
+    phases = []
+    phases.append(('healthy', run_phase(visualizer, backends, room_image, 'healthy', FINAL, args)))
+    phases.append(('draft', run_phase(visualizer, backends, room_image, 'draft', DRAFT, args)))
+    backends.backends[QUALITY_MODEL].failure_rate = 1.0
+    phases.append(('outage', run_phase(visualizer, backends, room_image, 'outage', FINAL, args)))
+    backends.backends[QUALITY_MODEL].failure_rate = 0.0
+    # Give the breaker time to let a trial call through
+    time.sleep(args.cooldown)
+    phases.append(('recovered', run_phase(visualizer, backends, room_image, 'recovered', FINAL, args)))
+    return phases
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark model routing through an outage of the best model")
+    parser.add_argument('--requests', type=int, default=30, help="Renders per phase")
+    parser.add_argument('--concurrency', type=int, default=4, help="Renders in flight at once")
+    parser.add_argument('--quality-latency-ms', type=float, default=300, help="Latency of the high-quality model")
+    parser.add_argument('--fast-latency-ms', type=float, default=100, help="Latency of the draft model")
+    parser.add_argument('--cooldown', type=float, default=1.0, help="Seconds a breaker stays open")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    room_image = preprocess_room_image(make_room_photo(1280, 960))
+    response_image = make_response_image(256, 256)
+
+    print("🧭 Furniture Visualizer Routing Benchmark")
+    print("=" * 40)
+    print(f"🧪 {QUALITY_MODEL} {args.quality_latency_ms:.0f} ms, {FAST_MODEL} {args.fast_latency_ms:.0f} ms, "
+          f"{args.requests} renders per phase")
+    for label, routed in (("fixed model", False), ("routed", True)):
+        print(f"\n{label}:")
+        for phase, result in run_mode(routed, room_image, response_image, args):
+            calls = ", ".join(f"{model} {count}" for model, count in result['calls'].items())
+            print(f"  {phase:>9}: {result['succeeded']:3}/{args.requests} ok  "
+                  f"p50 {result['p50_ms']:6.0f} ms  p95 {result['p95_ms']:6.0f} ms  calls: {calls}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Streaming and cancellation benchmark
+Renders against a simulated model that sends a few text parts before its image,
+and reports how soon the first text is shown compared with the finished image.
+It then queues a long render on a single job worker, cancels it partway through
+and measures how long the worker stays busy before the next job starts, with
+streamed (cancellable) renders and with blocking ones.
+
+Example:
+    python benchmarks/streaming_benchmark.py --latency-ms 3000 --cancel-after-ms 500
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from async_runner import submit
+from fake_backend import FakeBackend, make_response_image, make_room_photo
+from jobs import CANCELLED, DONE, JobQueue, JobStore
+from preprocessing import preprocess_room_image
+from visualizer import FurnitureVisualizer
+
+TEXT_CHUNKS = ("Placing the sofa ", "against the back wall, ", "matching the window light.")
+
+
+def time_to_text(visualizer, room_image, index):
+    """Seconds until the first streamed text and until the image of one render"""
+    first_text = []
+    started = time.perf_counter()
+
+    def on_text(text):
+        if not first_text:
+            first_text.append(time.perf_counter() - started)
+
+    submit(visualizer.agenerate_image_bytes(
+        room_image, "a gray sofa", f"streamed placement {index}", on_text=on_text
+    )).result()
+    return first_text[0], time.perf_counter() - started
+
+
+def run_cancel(streaming, room_image, response_image, args):
+    """Cancel a running job and time how long its worker stays busy"""
+    backend = FakeBackend(latency=args.latency_ms / 1000, image_data=response_image, text_chunks=TEXT_CHUNKS)
+    visualizer = FurnitureVisualizer(backend=backend)
+
+    def render(room_image, params, on_wait, on_text, session):
+        if streaming:
+            return visualizer.agenerate_image_bytes(
+                room_image, params['description'], params['placement'], on_wait=on_wait, on_text=on_text
+            )
+        return visualizer.render_image_bytes(room_image, params['description'], params['placement'], on_wait=on_wait)
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(JobStore(os.path.join(directory, 'jobs.sqlite')), render, workers=1)
+        slow = queue.submit('bench', room_image, description="a gray sofa", placement="cancelled placement")
+        time.sleep(args.cancel_after_ms / 1000)
+        cancelled_at = time.perf_counter()
+        queue.cancel(slow)
+        following = queue.submit('bench', room_image, description="a gray sofa", placement="next placement")
+        while queue.get(following)['started'] is None:
+            time.sleep(0.005)
+        freed_after = time.perf_counter() - cancelled_at
+        while queue.get(following)['status'] not in (DONE, CANCELLED):
+            time.sleep(0.01)
+        # Blocking calls run to the end even though nobody wants the result
+        time.sleep(0.05)
+        return {
+            'freed_ms': freed_after * 1000,
+            'status': queue.get(slow)['status'],
+            'text': queue.get(slow)['text'],
+            'backend': backend.stats(),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark streamed renders and cancelling running jobs")
+    parser.add_argument('--latency-ms', type=float, default=2000, help="Simulated model latency per render")
+    parser.add_argument('--renders', type=int, default=5, help="Streamed renders timed for their first text")
+    parser.add_argument('--cancel-after-ms', type=float, default=400, help="How long the job runs before it is cancelled")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    room_image = preprocess_room_image(make_room_photo(1600, 1200))
+    response_image = make_response_image()
+
+    print("📡 Furniture Visualizer Streaming Benchmark")
+    print("=" * 40)
+    backend = FakeBackend(latency=args.latency_ms / 1000, image_data=response_image, text_chunks=TEXT_CHUNKS)
+    visualizer = FurnitureVisualizer(backend=backend)
+    timings = [time_to_text(visualizer, room_image, index) for index in range(args.renders)]
+    first_text = statistics.median(text for text, _ in timings) * 1000
+    image = statistics.median(image for _, image in timings) * 1000
+    print(f"💬 First text after {first_text:.0f} ms, image after {image:.0f} ms (median of {args.renders} renders)")
+
+    print(f"\n✖️ Job cancelled {args.cancel_after_ms:.0f} ms into a {args.latency_ms:.0f} ms render")
+    for label, streaming in (("streamed", True), ("blocking", False)):
+        result = run_cancel(streaming, room_image, response_image, args)
+        stats = result['backend']
+        print(f"  {label:>8}: worker free after {result['freed_ms']:6.0f} ms  job {result['status']}  "
+              f"torn-down calls {stats['cancelled']}  calls open {stats['in_flight']}  "
+              f"text seen {result['text']!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Furniture catalog for the Furniture Visualizer
+Items live in a SQLite store that can be imported from a JSON file; the built-in
+FURNITURE_CATALOG below seeds an empty store. Search goes through an inverted token
+index built on a background thread, so a large catalog never blocks startup.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from catalog_index import CatalogIndex, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Built-in furniture catalog with categories and styles, used to seed an empty store
+FURNITURE_CATALOG = {
+    "Seating": {
+        "Modern Sofa": "a modern minimalist sofa with clean lines and neutral fabric",
+        "Leather Recliner": "a brown leather recliner chair with ottoman",
+        "Accent Chair": "a colorful accent chair with geometric patterns",
+        "Sectional Sofa": "a large L-shaped sectional sofa in gray fabric",
+        "Bean Bag": "a large comfortable bean bag chair",
+        "Dining Chairs": "a set of 4 modern dining chairs with wooden legs"
+    },
+    "Tables": {
+        "Coffee Table": "a glass-top coffee table with metal legs",
+        "Wooden Coffee Table": "a rustic wooden coffee table with storage",
+        "Dining Table": "a modern dining table for 6 people with wooden top",
+        "Side Table": "a small round side table with lamp",
+        "Console Table": "a long console table against the wall",
+        "End Table": "a wooden end table with drawer"
+    },
+    "Storage": {
+        "Bookshelf": "a tall wooden bookshelf filled with books",
+        "TV Unit": "a modern TV entertainment unit with storage",
+        "Wardrobe": "a large wardrobe with sliding doors",
+        "Storage Ottoman": "a fabric storage ottoman that doubles as seating",
+        "Floating Shelves": "modern floating wall shelves",
+        "Cabinet": "a wooden storage cabinet with doors"
+    },
+    "Lighting": {
+        "Floor Lamp": "a modern arc floor lamp with fabric shade",
+        "Table Lamp": "a contemporary table lamp with ceramic base",
+        "Pendant Light": "a hanging pendant light over dining area",
+        "Chandelier": "an elegant crystal chandelier",
+        "LED Strip": "ambient LED strip lighting behind TV",
+        "Standing Light": "a minimalist standing light fixture"
+    },
+    "Bedroom": {
+        "Queen Bed": "a modern queen-size bed with upholstered headboard",
+        "Nightstand": "a matching wooden nightstand with drawer",
+        "Dresser": "a large dresser with mirror",
+        "Bench": "a bedroom bench at the foot of the bed",
+        "Armoire": "a traditional wooden armoire",
+        "Vanity": "a modern vanity table with mirror and lights"
+    },
+    "Decor": {
+        "Area Rug": "a large colorful area rug that defines the seating area",
+        "Plant": "a large indoor plant in a decorative pot",
+        "Wall Art": "modern abstract wall art in frames",
+        "Curtains": "elegant floor-to-ceiling curtains",
+        "Mirror": "a large decorative wall mirror",
+        "Throw Pillows": "decorative throw pillows on the sofa"
+    }
+}
+
+
+def apply_preferences(furniture_description, color_preference, material_preference):
+    """Add the chosen color and material to a furniture description"""
+    modified_description = furniture_description
+
+    if color_preference != "Keep original":
+        modified_description += f" in {color_preference} color"
+
+    if material_preference != "Keep original":
+        modified_description += f" made of {material_preference.lower()}"
+
+    return modified_description
+
+
+ITEM_FIELDS = ('sku', 'name', 'category', 'description', 'style', 'color', 'material', 'dimensions')
+
+
+def slugify(text):
+    return ''.join(c if c.isalnum() else '-' for c in text.lower()).strip('-')
+
+
+def builtin_items():
+    """Return the built-in catalog as item dicts"""
+    return [
+        {'sku': f"{slugify(category)}-{slugify(name)}", 'name': name, 'category': category, 'description': description}
+        for category, items in FURNITURE_CATALOG.items()
+        for name, description in items.items()
+    ]
+
+
+def item_description(item):
+    """Describe a catalog item for the prompt, from its description or its attributes"""
+    if item.get('description'):
+        description = item['description']
+    else:
+        attributes = ' '.join(item.get(key) for key in ('color', 'material', 'style') if item.get(key))
+        description = f"a {attributes} {item['name'].lower()}" if attributes else f"a {item['name'].lower()}"
+    if item.get('dimensions'):
+        description += f" measuring {item['dimensions']}"
+    return description
+
+
+def _source_version(path):
+    return f"{os.path.abspath(path)}:{os.stat(path).st_mtime_ns}"
+
+
+def _normalize_item(raw):
+    """Turn one JSON record into an item dict with every field as text"""
+    item = {field: raw.get(field) or '' for field in ITEM_FIELDS}
+    dimensions = raw.get('dimensions')
+    if isinstance(dimensions, dict):
+        unit = dimensions.get('unit', 'cm')
+        sides = [dimensions.get(key) for key in ('width', 'depth', 'height') if dimensions.get(key) is not None]
+        item['dimensions'] = ' × '.join(str(side) for side in sides) + f" {unit}" if sides else ''
+    if not item['sku']:
+        item['sku'] = f"{slugify(item['category'])}-{slugify(item['name'])}"
+    return item
+
+
+class CatalogStore:
+    """SQLite file holding catalog items; safe to share across threads"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            # WAL lets searches keep reading while an import is being written
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS items ('
+                'sku TEXT PRIMARY KEY, name TEXT NOT NULL, category TEXT NOT NULL, description TEXT, '
+                'style TEXT, color TEXT, material TEXT, dimensions TEXT)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS items_category ON items (category, name)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def get_meta(self, key):
+        rows = self._query('SELECT value FROM meta WHERE key = ?', (key,))
+        return rows[0]['value'] if rows else None
+
+    def replace_items(self, items, source=None):
+        """Replace the whole catalog with the given item dicts"""
+        rows = [tuple(_normalize_item(item)[field] for field in ITEM_FIELDS) for item in items]
+        # A separate connection, so searches on the shared one are not blocked meanwhile
+        with contextlib.closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute('DELETE FROM items')
+            conn.executemany(
+                f"INSERT OR REPLACE INTO items ({', '.join(ITEM_FIELDS)}) VALUES ({', '.join('?' * len(ITEM_FIELDS))})",
+                rows
+            )
+            conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('source', source or ''))
+        return len(rows)
+
+    def import_json(self, path):
+        """Load items from a JSON list of records, or a {category: {name: description}} dict"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = [
+                {'name': name, 'category': category, 'description': description}
+                for category, items in data.items()
+                for name, description in items.items()
+            ]
+        return self.replace_items(data, source=_source_version(path))
+
+    def is_current(self, path):
+        """Return True if the store already holds this version of a JSON catalog"""
+        return self.get_meta('source') == _source_version(path)
+
+    def categories(self):
+        return [row['category'] for row in self._query('SELECT DISTINCT category FROM items ORDER BY category')]
+
+    def get(self, sku):
+        rows = self._query('SELECT * FROM items WHERE sku = ?', (sku,))
+        return rows[0] if rows else None
+
+    def get_many(self, skus):
+        """Return the items for a list of skus, in the same order"""
+        if not skus:
+            return []
+        rows = self._query(f"SELECT * FROM items WHERE sku IN ({', '.join('?' * len(skus))})", tuple(skus))
+        by_sku = {row['sku']: row for row in rows}
+        return [by_sku[sku] for sku in skus if sku in by_sku]
+
+    def iter_items(self, categories=None, names=None):
+        """Return items in display order, optionally filtered by category and name"""
+        items = self._query('SELECT * FROM items ORDER BY category, name, sku')
+        return [
+            item for item in items
+            if (not categories or item['category'] in categories) and (not names or item['name'] in names)
+        ]
+
+    def search_like(self, query, category=None, offset=0, limit=20):
+        """Plain SQL substring search, used while the token index is still building"""
+        clauses, params = [], []
+        for token in tokenize(query):
+            clauses.append("(name || ' ' || category || ' ' || style || ' ' || color || ' ' || material || ' ' || "
+                           "description) LIKE ?")
+            params.append(f"%{token}%")
+        if category is not None:
+            clauses.append('category = ?')
+            params.append(category)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM items {where}", params).fetchone()[0]
+        items = self._query(
+            f"SELECT * FROM items {where} ORDER BY category, name, sku LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        )
+        return total, items
+
+
+class Catalog:
+    """Catalog store with a search index that is built on a background thread
+
+    When source is given, that JSON catalog is imported first, on the same thread.
+    Until the index is ready, searches fall back to plain SQL on the store; if the
+    build fails they stay on it and error holds the exception.
+    """
+
+    def __init__(self, store, source=None, background=True):
+        self.store = store
+        self.source = source
+        self.index = None
+        self.error = None
+        self._finished = threading.Event()
+        if background:
+            threading.Thread(target=self._build_index, name='catalog-index', daemon=True).start()
+        else:
+            self._build_index()
+
+    def _build_index(self):
+        try:
+            if self.source is not None:
+                self.store.import_json(self.source)
+            index = CatalogIndex()
+            for item in self.store.iter_items():
+                index.add(item['sku'], item['category'], item['name'],
+                          (item['category'], item['style'], item['color'], item['material']), item['description'])
+            index.finish()
+            self.index = index
+        except Exception as e:
+            logger.exception("Could not build the catalog search index")
+            self.error = e
+        finally:
+            self._finished.set()
+
+    @property
+    def ready(self):
+        return self.index is not None
+
+    def wait_ready(self, timeout=None):
+        """Wait for the index build to finish or fail; returns whether the index is ready"""
+        self._finished.wait(timeout)
+        return self.ready
+
+    def categories(self):
+        return self.store.categories()
+
+    def get(self, sku):
+        return self.store.get(sku)
+
+    def search(self, query, category=None, offset=0, limit=20):
+        """Return (total matches, items of the requested page)"""
+        if not self.ready:
+            return self.store.search_like(query, category, offset, limit)
+        total, skus = self.index.search(query, category, offset, limit)
+        return total, self.store.get_many(skus)
+
+
+def _open_store():
+    """Open the configured store and return it with the JSON source still to import
+
+    CATALOG_SOURCE points at a JSON catalog that is (re)imported whenever the file
+    changes; without it an empty store is seeded with the built-in catalog.
+    """
+    store = CatalogStore(os.getenv('CATALOG_DB', '.cache/catalog.sqlite'))
+    source = os.getenv('CATALOG_SOURCE')
+    if source and store.is_current(source):
+        source = None
+    elif not source and len(store) == 0:
+        store.replace_items(builtin_items(), source='builtin')
+    return store, source
+
+
+def create_catalog_store():
+    """Catalog store configured from the environment, imported up front"""
+    store, source = _open_store()
+    if source is not None:
+        store.import_json(source)
+    return store
+
+
+def create_catalog():
+    """Catalog configured from the environment, importing and indexing in the background"""
+    store, source = _open_store()
+    return Catalog(store, source=source)
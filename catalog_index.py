@@ -0,0 +1,171 @@
+"""
+Inverted token index for catalog search
+Every token of an item's name, attributes and description maps to the items
+containing it, weighted by the field it came from, so an item named after the query
+ranks above one that only mentions it. The last query token also matches as a
+prefix (search as you type), and tokens of four or more letters match vocabulary
+words one edit away, using a precomputed single-deletion table instead of scanning
+the vocabulary.
+"""
+
+import bisect
+import re
+from array import array
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+# Points per query token by how it matched, multiplied by the weight of the field
+# it matched in; items are ranked by the total
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+FUZZY_SCORE = 1
+NAME_WEIGHT = 3
+ATTRIBUTE_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+MAX_PREFIX_EXPANSION = 200
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def _deletions(token):
+    return {token[:index] + token[index + 1:] for index in range(len(token))}
+
+
+class CatalogIndex:
+    """Token → item postings with prefix and one-edit fuzzy matching
+
+    Items are added in display order; results with the same score keep that order.
+    """
+
+    def __init__(self):
+        self.skus = []
+        # token → {field weight: doc ids}
+        self._postings = {}
+        self._categories = {}
+        self._vocabulary = []
+        self._deletes = {}
+
+    def __len__(self):
+        return len(self.skus)
+
+    def add(self, sku, category, name, attributes=(), description=None):
+        """Index one item under its category and the tokens of its name, attributes and description"""
+        doc_id = len(self.skus)
+        self.skus.append(sku)
+        self._categories.setdefault(category, array('I')).append(doc_id)
+        # A token found in several fields counts with its heaviest one
+        tokens = dict.fromkeys(tokenize(description), DESCRIPTION_WEIGHT)
+        for attribute in attributes:
+            tokens.update(dict.fromkeys(tokenize(attribute), ATTRIBUTE_WEIGHT))
+        tokens.update(dict.fromkeys(tokenize(name), NAME_WEIGHT))
+        for token, weight in tokens.items():
+            postings = self._postings.setdefault(token, {})
+            if weight not in postings:
+                postings[weight] = array('I')
+            postings[weight].append(doc_id)
+
+    def finish(self):
+        """Build the prefix and fuzzy lookup tables once all items are added"""
+        self._vocabulary = sorted(self._postings)
+        deletes = {}
+        for token in self._vocabulary:
+            if len(token) >= MIN_FUZZY_LENGTH:
+                for variant in _deletions(token):
+                    deletes.setdefault(variant, []).append(token)
+        self._deletes = deletes
+
+    def _prefix_tokens(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        matches = []
+        for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSION + 1]:
+            if not token.startswith(prefix):
+                break
+            if token != prefix:
+                matches.append(token)
+        return matches
+
+    def _fuzzy_tokens(self, token):
+        """Vocabulary tokens within one insertion, deletion or substitution"""
+        matches = set()
+        if token in self._deletes:
+            # The query is missing a letter
+            matches.update(self._deletes[token])
+        for variant in _deletions(token):
+            if variant in self._postings and len(variant) >= MIN_FUZZY_LENGTH - 1:
+                # The query has an extra letter
+                matches.add(variant)
+            # One letter differs
+            matches.update(self._deletes.get(variant, ()))
+        matches.discard(token)
+        return matches
+
+    def _token_scores(self, token, allow_prefix):
+        """Return {doc id: score} for the items matching one query token"""
+        matches = []
+        if len(token) >= MIN_FUZZY_LENGTH:
+            matches.extend((match, FUZZY_SCORE) for match in self._fuzzy_tokens(token))
+        if allow_prefix and len(token) >= MIN_PREFIX_LENGTH:
+            matches.extend((match, PREFIX_SCORE) for match in self._prefix_tokens(token))
+        if token in self._postings:
+            matches.append((token, EXACT_SCORE))
+        postings = [
+            (match_score * weight, doc_ids)
+            for match, match_score in matches
+            for weight, doc_ids in self._postings[match].items()
+        ]
+        # Applied from the lowest score up, so each item keeps its best one
+        postings.sort(key=lambda posting: posting[0])
+        scores = {}
+        for score, doc_ids in postings:
+            scores.update(dict.fromkeys(doc_ids, score))
+        return scores
+
+    def search(self, query, category=None, offset=0, limit=20):
+        """Return (total matches, skus of the requested page) for a query
+
+        Every query token has to match, exactly, by prefix (last token only) or
+        within one edit. An empty query lists the category in display order.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        allowed = None
+        if category is not None:
+            allowed = self._categories.get(category, ())
+
+        if not tokens:
+            doc_ids = allowed if allowed is not None else range(len(self.skus))
+            return len(doc_ids), [self.skus[doc_id] for doc_id in doc_ids[offset:offset + limit]]
+
+        totals = None
+        for index, token in enumerate(tokens):
+            scores = self._token_scores(token, allow_prefix=index == len(tokens) - 1)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {doc_id: score + scores[doc_id] for doc_id, score in totals.items() if doc_id in scores}
+            if not totals:
+                return 0, []
+
+        if allowed is not None:
+            allowed = set(allowed)
+            totals = {doc_id: score for doc_id, score in totals.items() if doc_id in allowed}
+
+        # Scores are small integers, so bucket by score and only sort the buckets needed
+        buckets = {}
+        for doc_id, score in totals.items():
+            buckets.setdefault(score, []).append(doc_id)
+        page = []
+        skip = offset
+        for score in sorted(buckets, reverse=True):
+            bucket = buckets[score]
+            if skip >= len(bucket):
+                skip -= len(bucket)
+                continue
+            bucket.sort()
+            page.extend(bucket[skip:skip + limit - len(page)])
+            skip = 0
+            if len(page) >= limit:
+                break
+        return len(totals), [self.skus[doc_id] for doc_id in page]
@@ -3,11 +3,12 @@ Demo script for Furniture Visualizer
 This script demonstrates the core functionality without the web interface
 """
 
-import os
+import io
 from PIL import Image
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
+from preprocessing import preprocess_room_image
+from model_router import DRAFT, FINAL, create_model_router
+from visualizer import MissingApiKeyError, create_backend
 
 # Load environment variables
 load_dotenv()
@@ -15,18 +16,20 @@ load_dotenv()
 def demo_furniture_visualization():
     """Demo function to test furniture visualization"""
     
-    # Initialize client
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
+    # Initialize backend (live, record or replay, see FURNITURE_BACKEND)
+    try:
+        backend = create_backend()
+    except MissingApiKeyError:
         print("❌ Error: GEMINI_API_KEY not found in .env file")
         print("Please add your API key to the .env file")
         return
     
-    client = genai.Client(api_key=api_key)
-    model_id = "gemini-2.5-flash-image-preview"
+    # Models come from IMAGE_MODELS, shared with the app and the other scripts
+    router = create_model_router()
     
     print("🏠 Furniture Visualizer Demo")
     print("=" * 40)
+    print(f"🧭 Models: {', '.join(router.models)}")
     
     # For demo, we'll create a room description instead of uploading
     # In the real app, this would be an uploaded image
@@ -42,34 +45,16 @@ def demo_furniture_visualization():
     print("🎯 Generating base room...")
     try:
         # First, generate a base room
-        room_response = client.models.generate_content(
-            model=model_id,
-            contents=room_description,
-            config=types.GenerateContentConfig(
-                response_modalities=['Image']
-            )
-        )
+        try:
+            base_room_data = router.call(FINAL, lambda model_id: backend.generate(model_id, room_description))
+        except Exception as e:
+            print(f"❌ No image generated for base room: {e}")
+            return
         
         # Save the base room
-        base_room = None
-        for part in room_response.parts:
-            # Try inline_data first
-            if hasattr(part, 'inline_data') and part.inline_data and hasattr(part.inline_data, 'data'):
-                try:
-                    from PIL import Image
-                    import io
-                    image_data = part.inline_data.data
-                    base_room = Image.open(io.BytesIO(image_data))
-                    base_room.save('demo_room.png')
-                    print("✅ Base room saved as 'demo_room.png'")
-                    break
-                except Exception as e:
-                    print(f"Error with inline_data: {e}")
-                    continue
-        
-        if base_room is None:
-            print("❌ No image generated for base room")
-            return
+        base_room = Image.open(io.BytesIO(base_room_data))
+        base_room.save('demo_room.png')
+        print("✅ Base room saved as 'demo_room.png'")
         
         # Now add furniture to the room
         furniture_prompt = """
@@ -79,7 +64,7 @@ def demo_furniture_visualization():
         
         Requirements:
         - Make the sofa look realistic and properly scaled for the room
-        - Ensure proper lighting and shadows that match the room's lighting  
+        - Ensure proper lighting and shadows that match the room's lighting
         - The sofa should blend naturally with the existing room decor
         - Maintain the original room's perspective and style
         - Make it look like a professional interior design visualization
@@ -87,55 +72,44 @@ def demo_furniture_visualization():
         Generate a photorealistic image showing how this sofa would look in the room.
         """
         
+        # Shrink and re-encode the room the same way the app does
+        room_input = preprocess_room_image(base_room_data)
+        print(f"📦 Room optimized for upload: {room_input.describe()}")
+        
         print("🛋️ Adding furniture to room...")
         
-        furniture_response = client.models.generate_content(
-            model=model_id,
-            contents=[furniture_prompt, base_room],
-            config=types.GenerateContentConfig(
-                response_modalities=['Image']
+        try:
+            furnished_data = router.call(
+                FINAL, lambda model_id: backend.generate(model_id, [furniture_prompt, room_input.to_part()])
             )
-        )
+        except Exception as e:
+            print(f"❌ No image generated for furnished room: {e}")
+            return
         
         # Save the furnished room
-        for part in furniture_response.parts:
-            if hasattr(part, 'inline_data') and part.inline_data and hasattr(part.inline_data, 'data'):
-                try:
-                    from PIL import Image
-                    import io
-                    image_data = part.inline_data.data
-                    furnished_room = Image.open(io.BytesIO(image_data))
-                    furnished_room.save('demo_furnished_room.png')
-                    print("✅ Furnished room saved as 'demo_furnished_room.png'")
-                    print("🎉 Demo complete! Check the generated images.")
-                    return
-                except Exception as e:
-                    print(f"Error with inline_data: {e}")
-                    continue
-        
-        print("❌ No image generated for furnished room")
-                
+        furnished_room = Image.open(io.BytesIO(furnished_data))
+        furnished_room.save('demo_furnished_room.png')
+        print("✅ Furnished room saved as 'demo_furnished_room.png'")
+        print("🎉 Demo complete! Check the generated images.")
+    
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         print("Make sure your API key is valid and you have internet connection")
 
 def test_api_connection():
     """Test if the API key works"""
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key:
+    try:
+        backend = create_backend()
+    except MissingApiKeyError:
         print("❌ No API key found")
         return False
     
     try:
-        client = genai.Client(api_key=api_key)
-        # Simple test call
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents="Create a simple image of a red apple on a white background",
-            config=types.GenerateContentConfig(
-                response_modalities=['Image']
-            )
-        )
+        # Simple test call on the fastest configured model
+        create_model_router().call(DRAFT, lambda model_id: backend.generate(
+            model_id,
+            "Create a simple image of a red apple on a white background"
+        ))
         print("✅ API connection successful!")
         return True
     except Exception as e:
@@ -0,0 +1,209 @@
+"""
+Uploaded room image handles for the Furniture Visualizer
+A room photo is uploaded once through the Gemini Files API and later requests
+reference it by URI instead of sending the image bytes inline again. Handles are
+keyed by content hash, owned by the sessions that use them, and deleted when the
+last owning session lets go of them or they sit unused past their TTL.
+"""
+
+import hashlib
+import io
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiFileService:
+    """Upload and delete files through the Gemini Files API"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, data, mime_type):
+        """Upload bytes and return (file name, file uri)"""
+        from google.genai import types
+        uploaded = self.client.files.upload(
+            file=io.BytesIO(data),
+            config=types.UploadFileConfig(mime_type=mime_type)
+        )
+        return uploaded.name, uploaded.uri
+
+    def delete(self, name):
+        self.client.files.delete(name=name)
+
+
+class LocalFileService:
+    """In-memory stand-in for the Files API, for tests and benchmarks"""
+
+    def __init__(self):
+        self.files = {}
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def upload(self, data, mime_type):
+        with self._lock:
+            name = f"files/local-{next(self._ids)}"
+            self.files[name] = (bytes(data), mime_type)
+            self.uploads += 1
+            self.bytes_uploaded += len(data)
+        return name, f"local://{name}"
+
+    def delete(self, name):
+        with self._lock:
+            self.files.pop(name, None)
+
+    def exists(self, uri):
+        with self._lock:
+            return uri.removeprefix('local://') in self.files
+
+
+class FileHandle:
+    """One uploaded file and the sessions currently using it"""
+
+    def __init__(self, name, uri, mime_type):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.owners = set()
+        self.last_used = time.monotonic()
+
+    def to_part(self):
+        from google.genai import types
+        return types.Part.from_uri(file_uri=self.uri, mime_type=self.mime_type)
+
+
+class FileHandleCache:
+    """Process-wide table of uploaded room images keyed by content hash
+
+    part_for() returns a file reference part, uploading on first use, or None if the
+    upload failed so the caller can send the image inline instead.
+    """
+
+    def __init__(self, service, ttl_seconds=1800):
+        self.service = service
+        self.ttl_seconds = ttl_seconds
+        self.uploads = 0
+        self.reuses = 0
+        self.failures = 0
+        self._handles = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def for_owner(self, owner):
+        """View of the cache whose uploads are owned by one session"""
+        return OwnedFileHandles(self, owner)
+
+    def part_for(self, data, mime_type, owner=None):
+        """Return a Part referencing the uploaded image, or None to send it inline"""
+        key = hashlib.sha256(data).hexdigest()
+        self.expire()
+
+        while True:
+            with self._lock:
+                handle = self._handles.get(key)
+                if handle is not None:
+                    handle.last_used = time.monotonic()
+                    if owner is not None:
+                        handle.owners.add(owner)
+                    self.reuses += 1
+                    return handle.to_part()
+                pending = self._pending.get(key)
+                if pending is None:
+                    # This caller uploads; concurrent callers wait for it
+                    pending = self._pending[key] = threading.Event()
+                    break
+            pending.wait()
+            with self._lock:
+                if key not in self._handles:
+                    return None
+
+        try:
+            name, uri = self.service.upload(data, mime_type)
+        except Exception as e:
+            logger.warning("Room upload failed, sending the image inline: %s", e)
+            with self._lock:
+                self.failures += 1
+                self._pending.pop(key).set()
+            return None
+
+        handle = FileHandle(name, uri, mime_type)
+        if owner is not None:
+            handle.owners.add(owner)
+        with self._lock:
+            self._handles[key] = handle
+            self.uploads += 1
+            self._pending.pop(key).set()
+        return handle.to_part()
+
+    def _delete(self, handles):
+        for handle in handles:
+            try:
+                self.service.delete(handle.name)
+            except Exception as e:
+                # The Files API deletes uploads on its own after 48 hours
+                logger.warning("Could not delete uploaded file %s: %s", handle.name, e)
+
+    def invalidate_uri(self, uri):
+        """Forget a handle the API rejected, e.g. because the file expired"""
+        with self._lock:
+            stale = [key for key, handle in self._handles.items() if handle.uri == uri]
+            handles = [self._handles.pop(key) for key in stale]
+        self._delete(handles)
+
+    def release_owner(self, owner):
+        """Drop a session's claim on its handles, deleting those no one else uses"""
+        with self._lock:
+            released = []
+            for key, handle in list(self._handles.items()):
+                if owner in handle.owners:
+                    handle.owners.discard(owner)
+                    if not handle.owners:
+                        released.append(self._handles.pop(key))
+        self._delete(released)
+
+    def expire(self):
+        """Delete handles that have not been used within the TTL"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            stale = [key for key, handle in self._handles.items() if handle.last_used < cutoff]
+            handles = [self._handles.pop(key) for key in stale]
+        self._delete(handles)
+
+    def clear(self):
+        """Delete every uploaded file, e.g. when a batch run finishes"""
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        self._delete(handles)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'handles': len(self._handles),
+                'uploads': self.uploads,
+                'reuses': self.reuses,
+                'failures': self.failures,
+            }
+
+
+class OwnedFileHandles:
+    """FileHandleCache bound to one owning session"""
+
+    def __init__(self, cache, owner):
+        self.cache = cache
+        self.owner = owner
+
+    def part_for(self, data, mime_type, owner=None):
+        """Like FileHandleCache.part_for, owned by this session unless another owner is given"""
+        return self.cache.part_for(data, mime_type, owner=owner if owner is not None else self.owner)
+
+    def invalidate_uri(self, uri):
+        self.cache.invalidate_uri(uri)
+
+    def release(self):
+        self.cache.release_owner(self.owner)
@@ -0,0 +1,83 @@
+"""
+Incremental "furnish the room" chains
+Each item is rendered on top of the previous render, and every intermediate image
+is checkpointed under the prefix of the chain that produced it, so editing step N
+only regenerates steps N and later
+"""
+
+import functools
+import hashlib
+from preprocessing import PreparedImage, preprocess_room_image
+from result_cache import image_cache_bytes
+
+
+def chain_prefix_keys(room_image, steps, model_id):
+    """Return one checkpoint key per step, each covering the chain up to that step"""
+    room_bytes = room_image.data if isinstance(room_image, PreparedImage) else image_cache_bytes(room_image)
+    digest = hashlib.sha256()
+    for chunk in (model_id.encode('utf-8'), room_bytes):
+        digest.update(len(chunk).to_bytes(8, 'big'))
+        digest.update(chunk)
+
+    keys = []
+    for description, placement in steps:
+        for chunk in (description.encode('utf-8'), placement.encode('utf-8')):
+            digest.update(len(chunk).to_bytes(8, 'big'))
+            digest.update(chunk)
+        # Copy so later steps keep extending the same running hash
+        keys.append(digest.copy().hexdigest())
+    return keys
+
+
+class FurnishChain:
+    """Render an ordered list of (description, placement) steps onto one room"""
+
+    def __init__(self, visualizer, checkpoints):
+        self.visualizer = visualizer
+        self.checkpoints = checkpoints
+
+    def resume_point(self, keys):
+        """Return (number of checkpointed steps, image bytes of the last one)"""
+        for index in range(len(keys) - 1, -1, -1):
+            image_data = self.checkpoints.get(keys[index])
+            if image_data is not None:
+                return index + 1, image_data
+        return 0, None
+
+    def render(self, room_image, steps, on_step=None, on_wait=None):
+        """Render the chain and return the image bytes for every completed step
+
+        on_step(index, image_data, from_checkpoint) is called as each step becomes
+        available, and on_wait(index, position, estimated_wait) while a step waits
+        in the admission queue. Rendering stops at the first step that fails.
+        Earlier checkpoints that were evicted from disk come back as None.
+        """
+        keys = chain_prefix_keys(room_image, steps, self.visualizer.model_id)
+        resumed, image_data = self.resume_point(keys)
+
+        results = []
+        if resumed:
+            # Earlier checkpoints are only loaded for display, not re-rendered
+            for index in range(resumed - 1):
+                results.append(self.checkpoints.get(keys[index]))
+            results.append(image_data)
+            if on_step is not None:
+                for index, checkpoint in enumerate(results):
+                    if checkpoint is not None:
+                        on_step(index, checkpoint, True)
+
+        current = preprocess_room_image(image_data) if image_data is not None else room_image
+        for index in range(resumed, len(steps)):
+            description, placement = steps[index]
+            step_wait = functools.partial(on_wait, index) if on_wait is not None else None
+            image_data = self.visualizer.generate_image_bytes(current, description, placement, on_wait=step_wait)
+            if image_data is None:
+                break
+
+            self.checkpoints.put(keys[index], image_data)
+            results.append(image_data)
+            if on_step is not None:
+                on_step(index, image_data, False)
+            current = preprocess_room_image(image_data)
+
+        return results
@@ -0,0 +1,62 @@
+"""
+Shared Gemini client for the Furniture Visualizer
+One thread-safe client with a keep-alive connection pool is created per process
+and reused by every session, instead of one client per Streamlit session
+"""
+
+import logging
+import os
+import threading
+from async_runner import submit
+
+DEFAULT_MODEL_ID = "gemini-2.5-flash-image-preview"
+
+logger = logging.getLogger(__name__)
+
+
+def build_http_options():
+    """Build HTTP options with pool limits and timeouts from the environment"""
+    import httpx
+    from google.genai import types
+    
+    pool_size = int(os.getenv('GENAI_POOL_SIZE', '32'))
+    keepalive_seconds = float(os.getenv('GENAI_KEEPALIVE_SECONDS', '120'))
+    timeout_seconds = float(os.getenv('GENAI_TIMEOUT_SECONDS', '120'))
+
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=keepalive_seconds
+    )
+    return types.HttpOptions(
+        # HttpOptions.timeout is in milliseconds
+        timeout=int(timeout_seconds * 1000),
+        client_args={'limits': limits},
+        async_client_args={'limits': limits}
+    )
+
+
+def create_client(api_key):
+    """Create a Gemini client with a pooled HTTP transport
+    
+    google.genai takes about half a second to import, so it is loaded here rather
+    than when the app starts rendering.
+    """
+    from google import genai
+    return genai.Client(api_key=api_key, http_options=build_http_options())
+
+
+def _warm_up(client, model_id):
+    try:
+        client.models.get(model=model_id)
+        submit(client.aio.models.get(model=model_id)).result()
+        logger.info("Gemini client warmed up for %s", model_id)
+    except Exception as e:
+        logger.warning("Gemini client warm-up failed: %s", e)
+
+
+def warm_up(client, model_id=DEFAULT_MODEL_ID):
+    """Open pooled connections in the background so the first request skips the handshake"""
+    thread = threading.Thread(target=_warm_up, args=(client, model_id), name='genai-warm-up', daemon=True)
+    thread.start()
+    return thread
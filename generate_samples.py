@@ -3,10 +3,12 @@ Sample room generator for testing the furniture visualizer
 This creates sample room images you can use to test the app
 """
 
+import io
 import os
-from google import genai
-from google.genai import types
+from PIL import Image
 from dotenv import load_dotenv
+from model_router import FINAL, create_model_router
+from visualizer import create_backend
 
 load_dotenv()
 
@@ -14,12 +16,13 @@ def generate_sample_rooms():
     """Generate sample room images for testing"""
     
     api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key or api_key == 'your_actual_api_key_here':
+    replaying = os.getenv('FURNITURE_BACKEND', 'live').lower() == 'replay'
+    if not replaying and (not api_key or api_key == 'your_actual_api_key_here'):
         print("❌ Please set your actual GEMINI_API_KEY in the .env file first")
         return
     
-    client = genai.Client(api_key=api_key)
-    model_id = "gemini-2.5-flash-image-preview"
+    backend = create_backend()
+    router = create_model_router()
     
     sample_rooms = {
         "living_room": """
@@ -60,23 +63,15 @@ def generate_sample_rooms():
         print(f"\n🎯 Generating {room_name}...")
         
         try:
-            response = client.models.generate_content(
-                model=model_id,
-                contents=description,
-                config=types.GenerateContentConfig(
-                    response_modalities=['Image']
-                )
-            )
+            image_data = router.call(FINAL, lambda model_id: backend.generate(model_id, description))
+            
+            # Save the room image under the extension of the format it came in
+            image_format = (Image.open(io.BytesIO(image_data)).format or 'PNG').lower()
+            filename = f"sample_{room_name}.{image_format}"
+            with open(filename, 'wb') as f:
+                f.write(image_data)
+            print(f"✅ Saved {filename}")
             
-            # Save the room image
-            for part in response.parts:
-                if hasattr(part, 'as_image'):
-                    room_image = part.as_image()
-                    filename = f"sample_{room_name}.png"
-                    room_image.save(filename)
-                    print(f"✅ Saved {filename}")
-                    break
-                    
         except Exception as e:
             print(f"❌ Error generating {room_name}: {str(e)}")
     
@@ -0,0 +1,242 @@
+"""
+Generation history for the Furniture Visualizer
+Every generated image is appended to a pack file, followed by its thumbnail, and
+described by one fixed-size record in an index file (offsets, room hash, item,
+color, material, timestamp). Nothing is rewritten, so an interrupted write at most
+leaves an unused tail. Both files are read through memory maps, and the gallery
+unpacks only the records and thumbnails of the page being shown.
+"""
+
+import hashlib
+import hmac
+import logging
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# offset, image length, thumbnail length, timestamp, owner digest, room digest,
+# then item, color and material as NUL-padded UTF-8
+RECORD = struct.Struct('<QIId16s16s64s24s16s')
+DIGEST_SIZE = 16
+
+
+def owner_digest(owner):
+    return hashlib.sha256(owner.encode('utf-8')).digest()[:DIGEST_SIZE]
+
+
+def _text_field(text, size):
+    """Encode text into a fixed-width field, cutting only at character boundaries"""
+    return (text or '').encode('utf-8')[:size].decode('utf-8', 'ignore').encode('utf-8')
+
+
+def _text(field):
+    return field.rstrip(b'\0').decode('utf-8', 'ignore')
+
+
+class HistoryEntry:
+    """One generation as described by its index record"""
+
+    def __init__(self, number, record):
+        offset, length, thumbnail_length, timestamp, _owner, room, item, color, material = record
+        self.number = number
+        self.offset = offset
+        self.length = length
+        self.thumbnail_length = thumbnail_length
+        self.timestamp = timestamp
+        self.room = room.hex() if room.strip(b'\0') else ''
+        self.item = _text(item)
+        self.color = _text(color)
+        self.material = _text(material)
+
+
+class _MappedFile:
+    """Read-only memory map of an append-only file, remapped when it has grown"""
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._lock = threading.Lock()
+
+    def read(self, offset, length):
+        mapped = self._map
+        if mapped is None or offset + length > len(mapped):
+            with self._lock:
+                if self._map is None or offset + length > len(self._map):
+                    with open(self.path, 'rb') as f:
+                        # Readers may still hold the old map; it closes when released
+                        self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                mapped = self._map
+        return mapped[offset:offset + length]
+
+
+class GenerationHistory:
+    """Append-only store of generated images with a per-owner paginated index
+
+    thumbnails(image_data) returns the bytes of a small rendition stored next to
+    each image; without it the gallery shows the images themselves.
+    """
+
+    def __init__(self, directory, thumbnails=None):
+        self.directory = directory
+        self.thumbnails = thumbnails
+        os.makedirs(directory, exist_ok=True)
+        self.pack_path = os.path.join(directory, 'history.pack')
+        self.index_path = os.path.join(directory, 'history.idx')
+        self._lock = threading.Lock()
+        self._owners = {}
+        self._count = 0
+        self._load()
+        self._pack = open(self.pack_path, 'ab')
+        self._index = open(self.index_path, 'ab')
+        self._pack_size = self._pack.seek(0, os.SEEK_END)
+        self._pack_map = _MappedFile(self.pack_path)
+        self._index_map = _MappedFile(self.index_path)
+
+    def _load(self):
+        """Group existing records by owner, dropping a torn record left by a crash"""
+        for path in (self.pack_path, self.index_path):
+            if not os.path.exists(path):
+                open(path, 'ab').close()
+        pack_size = os.path.getsize(self.pack_path)
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % RECORD.size
+        for number, record in enumerate(RECORD.iter_unpack(data[:usable])):
+            offset, length, thumbnail_length = record[:3]
+            if offset + length + thumbnail_length > pack_size:
+                usable = number * RECORD.size
+                break
+            self._owners.setdefault(record[4], []).append(number)
+        if usable != len(data):
+            logger.warning("Truncating %d bytes of incomplete history records", len(data) - usable)
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(usable)
+        self._count = usable // RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def add(self, owner, image_data, room='', item='', color='', material='', timestamp=None):
+        """Append a generated image to an owner's history and return its entry number"""
+        thumbnail = b''
+        if self.thumbnails is not None:
+            try:
+                thumbnail = self.thumbnails(image_data)
+            except Exception as e:
+                logger.warning("Could not encode a history thumbnail: %s", e)
+        digest = owner_digest(owner)
+        with self._lock:
+            offset = self._pack_size
+            # The image and its thumbnail are on disk before the record that points to them
+            self._pack.write(image_data)
+            self._pack.write(thumbnail)
+            self._pack.flush()
+            self._pack_size += len(image_data) + len(thumbnail)
+            self._index.write(RECORD.pack(
+                offset,
+                len(image_data),
+                len(thumbnail),
+                timestamp if timestamp is not None else time.time(),
+                digest,
+                bytes.fromhex(room)[:DIGEST_SIZE] if room else b'',
+                _text_field(item, 64),
+                _text_field(color, 24),
+                _text_field(material, 16),
+            ))
+            self._index.flush()
+            number = self._count
+            self._count += 1
+            self._owners.setdefault(digest, []).append(number)
+        return number
+
+    def count(self, owner):
+        return len(self._owners.get(owner_digest(owner), ()))
+
+    def page(self, owner, page=0, page_size=12):
+        """Entries of one page of an owner's history, newest first"""
+        with self._lock:
+            numbers = self._owners.get(owner_digest(owner), [])
+            end = len(numbers) - page * page_size
+            selected = numbers[max(0, end - page_size):max(0, end)]
+        return [
+            HistoryEntry(number, RECORD.unpack(self._index_map.read(number * RECORD.size, RECORD.size)))
+            for number in reversed(selected)
+        ]
+
+    def image(self, entry):
+        return self._pack_map.read(entry.offset, entry.length)
+
+    def thumbnail(self, entry):
+        """Thumbnail bytes of an entry, or the image itself when none was stored"""
+        if not entry.thumbnail_length:
+            return self.image(entry)
+        return self._pack_map.read(entry.offset + entry.length, entry.thumbnail_length)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': self._count, 'owners': len(self._owners), 'bytes': self._pack_size}
+
+
+class UserTokens:
+    """Server-signed user ids for the page URL
+
+    A history is opened with the token the server issued for it, so nobody can
+    read another user's renders by putting a chosen id in the URL.
+    """
+
+    def __init__(self, secret):
+        self.secret = secret
+
+    def _sign(self, user_id):
+        return hmac.new(self.secret, user_id.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+    def issue(self):
+        """Return (user id, token) for a new user"""
+        user_id = secrets.token_hex(16)
+        return user_id, f"{user_id}.{self._sign(user_id)}"
+
+    def verify(self, token):
+        """User id of a token issued with this secret, or None"""
+        user_id, _, signature = (token or '').partition('.')
+        if user_id and hmac.compare_digest(signature, self._sign(user_id)):
+            return user_id
+        return None
+
+
+def create_user_tokens():
+    """User tokens signed with USER_TOKEN_SECRET, or a key generated once next to the history"""
+    secret = os.getenv('USER_TOKEN_SECRET')
+    if secret:
+        return UserTokens(secret.encode('utf-8'))
+    directory = os.getenv('HISTORY_DIR', '.cache/history')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'user_token.key')
+    try:
+        # Exclusive create, so concurrent first starts agree on one key
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return UserTokens(f.read())
+    secret = secrets.token_bytes(32)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secret)
+    return UserTokens(secret)
+
+
+def create_history(encoder=None):
+    """Generation history configured from the environment, or None when disabled
+
+    With an OutputEncoder, each entry stores its 'thumbnail' rendition.
+    """
+    if os.getenv('HISTORY_ENABLED', 'true').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    thumbnails = None
+    if encoder is not None:
+        def thumbnails(image_data):
+            return encoder.encode(image_data, ['thumbnail'])['thumbnail'].data
+    return GenerationHistory(os.getenv('HISTORY_DIR', '.cache/history'), thumbnails)
@@ -0,0 +1,23 @@
+"""
+Image factories shared by the tests
+"""
+
+import io
+
+from PIL import Image
+
+from preprocessing import preprocess_room_image
+
+
+def make_room():
+    """A prepared room photo with enough structure to pass the pre-flight checks"""
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').resize((640, 480)).convert('RGB').save(buffer, format='JPEG')
+    return preprocess_room_image(buffer.getvalue())
+
+
+def make_image():
+    """PNG bytes standing in for a generated image"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 10, 10)).save(buffer, format='PNG')
+    return buffer.getvalue()
@@ -0,0 +1,362 @@
+"""
+Background render jobs for the Furniture Visualizer
+Submitting a render returns a job id straight away and a fixed pool of worker
+threads runs the model calls, however many web sessions are open. Job state, room
+inputs and results live in a local SQLite file, so a result survives reruns,
+reconnects and restarts of the server. Renders streamed on the shared event loop
+record the model's text as it arrives and can be cancelled mid-request.
+"""
+
+import concurrent.futures
+import hashlib
+import inspect
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from PIL import Image
+from async_runner import submit
+from model_router import FINAL
+from preprocessing import PreparedImage
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Pause before a worker tries the job store again after it failed to claim a job
+CLAIM_RETRY_SECONDS = 1.0
+
+JOB_FIELDS = ('id', 'owner', 'session', 'status', 'params', 'room', 'message', 'text', 'error', 'error_type',
+              'result_format', 'created', 'started', 'finished')
+# Columns added after the first release, created in older job stores on open
+ADDED_COLUMNS = ('session', 'text')
+
+
+class JobStore:
+    """SQLite file holding jobs, their room inputs and results; safe to share across threads"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, owner TEXT, session TEXT, status TEXT NOT NULL, params TEXT NOT NULL, room TEXT NOT NULL, '
+                'message TEXT, text TEXT, error TEXT, error_type TEXT, result BLOB, result_format TEXT, '
+                'created REAL NOT NULL, started REAL, finished REAL)'
+            )
+            columns = {column[1] for column in self._conn.execute('PRAGMA table_info(jobs)')}
+            for column in ADDED_COLUMNS:
+                if column not in columns:
+                    self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} TEXT')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)')
+            # Room images are stored once however many jobs use them
+            self._conn.execute('CREATE TABLE IF NOT EXISTS rooms (key TEXT PRIMARY KEY, data BLOB NOT NULL, metadata TEXT)')
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def _row(self, row):
+        job = {field: row[field] for field in JOB_FIELDS}
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def add(self, owner, params, room_data, room_metadata, session=None):
+        """Queue a job for a room image and return its id"""
+        job_id = uuid.uuid4().hex
+        room = hashlib.sha256(room_data).hexdigest()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO rooms VALUES (?, ?, ?)',
+                (room, room_data, json.dumps(room_metadata))
+            )
+            self._conn.execute(
+                'INSERT INTO jobs (id, owner, session, status, params, room, created) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, owner, session, QUEUED, json.dumps(params), room, time.time())
+            )
+        return job_id
+
+    def claim(self):
+        """Mark the oldest queued job as running and return it, or None"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1', (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            started = time.time()
+            self._conn.execute('UPDATE jobs SET status = ?, started = ? WHERE id = ?', (RUNNING, started, row['id']))
+        job = self._row(row)
+        job['status'], job['started'] = RUNNING, started
+        return job
+
+    def get(self, job_id):
+        """Return a job without its result bytes, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row(row) if row is not None else None
+
+    def result(self, job_id):
+        """Return (image bytes, format) of a finished job, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result, result_format FROM jobs WHERE id = ? AND status = ?', (job_id, DONE)
+            ).fetchone()
+        return (row['result'], row['result_format']) if row is not None else None
+
+    def room(self, key):
+        """Return (room bytes, metadata) for a job's room"""
+        with self._lock:
+            row = self._conn.execute('SELECT data, metadata FROM rooms WHERE key = ?', (key,)).fetchone()
+        return (row['data'], json.loads(row['metadata'])) if row is not None else None
+
+    def position(self, job):
+        """Number of queued jobs ahead of a queued job"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ? AND created < ?', (QUEUED, job['created'])
+            ).fetchone()[0]
+
+    def set_message(self, job_id, message):
+        self._execute('UPDATE jobs SET message = ? WHERE id = ?', (message, job_id))
+
+    def set_text(self, job_id, text):
+        self._execute('UPDATE jobs SET text = ? WHERE id = ?', (text, job_id))
+
+    def finish(self, job_id, result, result_format):
+        """Store the result of a running job; returns False if it was cancelled meanwhile"""
+        return self._execute(
+            'UPDATE jobs SET status = ?, result = ?, result_format = ?, message = NULL, finished = ? '
+            'WHERE id = ? AND status = ?',
+            (DONE, result, result_format, time.time(), job_id, RUNNING)
+        ) > 0
+
+    def fail(self, job_id, error):
+        self._execute(
+            'UPDATE jobs SET status = ?, error = ?, error_type = ?, message = NULL, finished = ? '
+            'WHERE id = ? AND status IN (?, ?)',
+            (FAILED, str(error), type(error).__name__, time.time(), job_id, QUEUED, RUNNING)
+        )
+
+    def cancel(self, job_id):
+        """Mark a queued or running job cancelled; returns False if it had already finished"""
+        return self._execute(
+            'UPDATE jobs SET status = ?, message = NULL, finished = ? WHERE id = ? AND status IN (?, ?)',
+            (CANCELLED, time.time(), job_id, QUEUED, RUNNING)
+        ) > 0
+
+    def requeue_running(self):
+        """Put jobs interrupted by a restart back in the queue"""
+        return self._execute('UPDATE jobs SET status = ?, started = NULL WHERE status = ?', (QUEUED, RUNNING))
+
+    def purge(self, older_than):
+        """Delete finished jobs older than a timestamp, and rooms no job uses any more"""
+        with self._lock, self._conn:
+            removed = self._conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished < ?', (*FINISHED, older_than)
+            ).rowcount
+            self._conn.execute('DELETE FROM rooms WHERE key NOT IN (SELECT room FROM jobs)')
+        return removed
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        counts = dict.fromkeys((QUEUED, RUNNING, *FINISHED), 0)
+        counts.update({status: count for status, count in rows})
+        return counts
+
+
+class JobQueue:
+    """Fixed pool of worker threads running render jobs from a JobStore
+
+    render(room_image, params, on_wait, on_text, session) produces the image bytes
+    for one job, or a coroutine producing them; a coroutine runs on the shared event loop,
+    where cancel() can tear it down mid-request. The pool size is independent of
+    the number of sessions submitting work. With a GenerationHistory, finished
+    renders are added to their owner's history.
+    """
+
+    def __init__(self, store, render, workers=4, metrics=None, history=None):
+        self.store = store
+        self.render = render
+        self.metrics = metrics
+        self.history = history
+        self._running = {}
+        self._lock = threading.Lock()
+        self._wakeups = threading.Semaphore(0)
+        recovered = store.requeue_running()
+        if recovered:
+            logger.info("Requeued %d render jobs interrupted by a restart", recovered)
+        for _ in range(store.counts()[QUEUED]):
+            self._wakeups.release()
+        self._workers = [
+            threading.Thread(target=self._work, name=f'render-worker-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, owner, room_image, session=None, **params):
+        """Queue a render of a prepared room image and return the job id
+
+        session is the browser session that submitted it, which owns the
+        room upload the render makes.
+        """
+        job_id = self.store.add(owner, params, room_image.data, {
+            'mime_type': room_image.mime_type,
+            'size': room_image.size,
+            'original_bytes': room_image.original_bytes,
+            'original_size': room_image.original_size,
+        }, session=session)
+        self._wakeups.release()
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def result(self, job_id):
+        return self.store.result(job_id)
+
+    def position(self, job):
+        return self.store.position(job)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it had already finished
+
+        A streamed render is torn down at once, which frees its worker, its
+        admission slot and its connection to the model.
+        """
+        if not self.store.cancel(job_id):
+            return False
+        with self._lock:
+            future = self._running.get(job_id)
+        if future is not None:
+            future.cancel()
+        return True
+
+    def _work(self):
+        while True:
+            self._wakeups.acquire()
+            try:
+                job = self.store.claim()
+            except Exception:
+                logger.exception("Could not claim a render job")
+                # Leave the job for another attempt rather than spinning on a broken store
+                time.sleep(CLAIM_RETRY_SECONDS)
+                self._wakeups.release()
+                continue
+            if job is None:
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                # A worker outlives any one job, so the pool never shrinks
+                logger.exception("Render job %s failed unexpectedly", job['id'])
+                try:
+                    self.store.fail(job['id'], e)
+                except Exception:
+                    logger.exception("Could not mark render job %s failed", job['id'])
+
+    def _run(self, job):
+        if self.metrics is not None:
+            self.metrics.observe('job_wait', job['started'] - job['created'])
+        stored = self.store.room(job['room'])
+        if stored is None:
+            self.store.fail(job['id'], LookupError("The room image for this job is missing"))
+            return
+        data, metadata = stored
+        room_image = PreparedImage(data, **metadata)
+
+        def on_wait(position, estimated_wait):
+            self.store.set_message(job['id'], f"#{position} in the queue for the model (about {estimated_wait:.0f}s wait)")
+
+        def on_text(text):
+            self.store.set_text(job['id'], text)
+
+        try:
+            result = self.render(room_image, job['params'], on_wait, on_text, job['session'])
+            if inspect.isawaitable(result):
+                result = self._await(job['id'], result)
+            if not result:
+                raise ValueError("No image was returned")
+        except concurrent.futures.CancelledError:
+            logger.info("Render job %s was cancelled", job['id'])
+            return
+        except Exception as e:
+            logger.warning("Render job %s failed: %s", job['id'], e)
+            self.store.fail(job['id'], e)
+            return
+        if not self.store.finish(job['id'], result, Image.open(io.BytesIO(result)).format or 'PNG'):
+            # Cancelled while a blocking render could not be interrupted
+            return
+        if self.history is not None:
+            params = job['params']
+            try:
+                self.history.add(
+                    job['owner'],
+                    result,
+                    room=job['room'],
+                    item=params.get('item'),
+                    color=params.get('color'),
+                    material=params.get('material')
+                )
+            except OSError as e:
+                logger.warning("Could not add job %s to the history: %s", job['id'], e)
+
+    def _await(self, job_id, coro):
+        """Run a render coroutine on the shared event loop, where cancel() can stop it"""
+        future = submit(coro)
+        with self._lock:
+            self._running[job_id] = future
+        try:
+            # The job may have been cancelled before its future was registered
+            if self.store.get(job_id)['status'] == CANCELLED:
+                future.cancel()
+            return future.result()
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+
+    def stats(self):
+        counts = self.store.counts()
+        counts['workers'] = len(self._workers)
+        return counts
+
+
+def create_job_queue(visualizer, metrics=None, history=None):
+    """Job queue running renders through a shared visualizer, configured from the environment"""
+    store = JobStore(os.getenv('JOB_DB', '.cache/jobs.sqlite'))
+    retention = float(os.getenv('JOB_RETENTION_HOURS', '24')) * 3600
+    store.purge(time.time() - retention)
+
+    streaming = os.getenv('GENERATION_STREAMING', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+    def render(room_image, params, on_wait, on_text, session):
+        if streaming:
+            return visualizer.agenerate_image_bytes(
+                room_image, params['description'], params['placement'], on_wait=on_wait,
+                tier=params.get('tier', FINAL), on_text=on_text, owner=session
+            )
+        return visualizer.render_image_bytes(
+            room_image, params['description'], params['placement'], on_wait=on_wait, tier=params.get('tier', FINAL),
+            owner=session
+        )
+
+    return JobQueue(store, render, workers=int(os.getenv('JOB_WORKERS', '4')), metrics=metrics, history=history)
@@ -0,0 +1,243 @@
+"""
+Per-stage latency metrics for the Furniture Visualizer
+Each stage of a render (preprocessing, request preparation, cache lookup, queueing,
+model call, response parsing, download preparation) is timed into a histogram with
+rolling p50/p95/p99. Metrics are served in the Prometheus text format, and every
+request can also be written to a JSONL trace log.
+
+Code that does not hold a Metrics object can still time a stage with timed(name)
+and add fields with annotate(); both apply to the trace of the request currently
+running in this context.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import http.server
+import json
+import threading
+import time
+import uuid
+from retry import LatencyTracker
+
+# Upper bounds in seconds; model calls take several seconds, local stages milliseconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current_trace = contextvars.ContextVar('furniture_trace', default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts plus a rolling window for quantiles"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1000):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = LatencyTracker(window=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[index] += 1
+        self.recent.record(seconds)
+
+    def snapshot(self):
+        """Return count, sum, cumulative buckets and recent quantiles"""
+        with self._lock:
+            snapshot = {'count': self.count, 'sum': self.sum, 'buckets': list(zip(self.buckets, self.counts))}
+        for quantile in QUANTILES:
+            snapshot[f"p{int(quantile * 100)}"] = self.recent.percentile(quantile)
+        return snapshot
+
+
+class Trace:
+    """Stage timings and sizes for one request"""
+
+    def __init__(self, metrics, name, **fields):
+        self.metrics = metrics
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.fields = fields
+        self.stages = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        # Retries and hedges run a stage more than once; report the total
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def set(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.id,
+            'name': self.name,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'total_seconds': round(time.monotonic() - self.started, 4),
+            'stages': {stage: round(seconds, 4) for stage, seconds in dict(self.stages).items()},
+            **dict(self.fields),
+        }
+
+
+class Metrics:
+    """Registry of stage histograms and counters shared by the process"""
+
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._trace_lock = threading.Lock()
+
+    def histogram(self, stage):
+        with self._lock:
+            if stage not in self._histograms:
+                self._histograms[stage] = Histogram()
+            return self._histograms[stage]
+
+    def observe(self, stage, seconds):
+        """Record one stage duration, also adding it to the current trace"""
+        self.histogram(stage).observe(seconds)
+        trace = _current_trace.get()
+        if trace is not None and trace.metrics is self:
+            trace.add_stage(stage, seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """Time the enclosed block as one stage"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - started)
+
+    @contextlib.contextmanager
+    def trace(self, name, **fields):
+        """Collect the stages timed inside the block into one trace
+
+        request_bytes, response_bytes and cache set on the trace (directly or with
+        annotate) are counted when the block exits and written to the trace log.
+        """
+        trace = Trace(self, name, **fields)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        except Exception as e:
+            trace.set(error=type(e).__name__)
+            raise
+        except asyncio.CancelledError:
+            trace.set(error='cancelled')
+            raise
+        finally:
+            _current_trace.reset(token)
+            self._finish(trace)
+
+    def _finish(self, trace):
+        self.observe(f"{trace.name}_total", time.monotonic() - trace.started)
+        self.increment('requests', trace=trace.name, cache=trace.fields.get('cache', 'none'),
+                       status=_status(trace))
+        self.increment('request_bytes', trace.fields.get('request_bytes', 0), trace=trace.name)
+        self.increment('response_bytes', trace.fields.get('response_bytes', 0), trace=trace.name)
+        if self.trace_path:
+            line = json.dumps(trace.to_dict())
+            with self._trace_lock:
+                with open(self.trace_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+
+    def snapshot(self):
+        """Return stage histogram snapshots keyed by stage name"""
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {stage: histogram.snapshot() for stage, histogram in sorted(histograms.items())}
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            '# HELP furniture_stage_seconds Duration of each render stage',
+            '# TYPE furniture_stage_seconds histogram',
+        ]
+        snapshots = self.snapshot()
+        for stage, snapshot in snapshots.items():
+            for bound, count in snapshot['buckets']:
+                lines.append(f'furniture_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'furniture_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {snapshot["count"]}')
+            lines.append(f'furniture_stage_seconds_sum{{stage="{stage}"}} {snapshot["sum"]:.6f}')
+            lines.append(f'furniture_stage_seconds_count{{stage="{stage}"}} {snapshot["count"]}')
+
+        lines.append('# HELP furniture_stage_quantile_seconds Recent stage duration quantiles')
+        lines.append('# TYPE furniture_stage_quantile_seconds gauge')
+        for stage, snapshot in snapshots.items():
+            for quantile in QUANTILES:
+                value = snapshot[f"p{int(quantile * 100)}"]
+                if value is not None:
+                    lines.append(f'furniture_stage_quantile_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for name in sorted({key[0] for key, _ in counters}):
+            lines.append(f'# TYPE furniture_{name}_total counter')
+            for (counter_name, labels), value in counters:
+                if counter_name != name:
+                    continue
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f'furniture_{name}_total{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _status(trace):
+    if 'error' not in trace.fields:
+        return 'ok'
+    return 'cancelled' if trace.fields['error'] == 'cancelled' else 'error'
+
+
+def timed(stage):
+    """Time a stage into the current request trace, or do nothing outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        return contextlib.nullcontext()
+    return trace.metrics.stage(stage)
+
+
+def annotate(**fields):
+    """Set fields such as sizes or cache status on the current request trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.set(**fields)
+
+
+def start_metrics_server(metrics, port, host='0.0.0.0'):
+    """Serve metrics.render_prometheus() at /metrics on a background thread"""
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
@@ -0,0 +1,238 @@
+"""
+Model routing for image generation
+The configured models are listed best quality first. Each one has a circuit breaker
+fed by the outcomes of its recent calls and a rolling window of their latencies.
+"final" requests go to the highest-quality model whose breaker is closed, "draft"
+requests to the healthy model with the lowest median latency. A model whose error
+rate crosses the threshold is skipped until a cool-down has passed, and then one
+trial call decides whether it is routed to again.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from gemini_client import DEFAULT_MODEL_ID
+from retry import LatencyTracker, is_retryable
+
+logger = logging.getLogger(__name__)
+
+DRAFT = 'draft'
+FINAL = 'final'
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class ModelUnavailableError(Exception):
+    """Raised when the circuit breaker of every configured model is open"""
+
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"The image models are failing right now. Please try again in {retry_in:.0f}s.")
+
+
+class CircuitBreaker:
+    """Error rate of a model's recent calls, opening when it crosses a threshold"""
+
+    def __init__(self, window=20, min_calls=5, error_rate=0.5, cooldown=30.0):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _cooled_down(self):
+        return time.monotonic() - self._opened_at >= self.cooldown
+
+    def available(self):
+        """Whether a call could be routed here now, without reserving it"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            return not self._trial_in_flight and self._cooled_down()
+
+    def try_acquire(self):
+        """Reserve a call; after the cool-down only one trial call is let through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self._trial_in_flight or not self._cooled_down():
+                return False
+            self.state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record(self, ok):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_in_flight = False
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(ok)
+            if self.state == OPEN:
+                # A call that started before the breaker opened
+                return
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._open()
+
+    def release(self):
+        """Give back a reservation whose call was cancelled, without recording an outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._trial_in_flight:
+                # Still cooled down, so the next call becomes the trial
+                self.state = OPEN
+                self._trial_in_flight = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+
+    def retry_in(self):
+        """Seconds until the breaker lets a trial call through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def current_error_rate(self):
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+
+class ModelRouter:
+    """Pick a model per request tier and track the health of every model
+
+    models are listed best quality first; the first one is also the model whose
+    id keys cached results.
+    """
+
+    def __init__(self, models, window=20, min_calls=5, error_rate=0.5, cooldown=30.0):
+        if not models:
+            raise ValueError("At least one model is required")
+        self.models = list(models)
+        self.failovers = 0
+        self._breakers = {model: CircuitBreaker(window, min_calls, error_rate, cooldown) for model in self.models}
+        self._latency = {model: LatencyTracker(window) for model in self.models}
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self):
+        return self.models[0]
+
+    def candidates(self, tier=FINAL):
+        """Models in the order they are tried for a tier"""
+        if tier == DRAFT:
+            # Unmeasured models sort first, so every model gets timed early on
+            return sorted(self.models, key=lambda model: self._latency[model].percentile(0.5) or 0.0)
+        return list(self.models)
+
+    def planned(self, tier=FINAL):
+        """Model a request of this tier would be sent to right now"""
+        for model in self.candidates(tier):
+            if self._breakers[model].available():
+                return model
+        return self.candidates(tier)[0]
+
+    def route(self, tier=FINAL):
+        """Reserve the model for one call, raising ModelUnavailableError if every breaker is open"""
+        candidates = self.candidates(tier)
+        for model in candidates:
+            if self._breakers[model].try_acquire():
+                if model != candidates[0]:
+                    with self._lock:
+                        self.failovers += 1
+                return model
+        raise ModelUnavailableError(min(breaker.retry_in() for breaker in self._breakers.values()))
+
+    def record(self, model, seconds=None, error=None):
+        """Feed the outcome of a call into the model's breaker and latency window
+
+        Only transient errors count against a model; a rejected or refused prompt
+        means the model itself answered.
+        """
+        breaker = self._breakers[model]
+        was_open = breaker.state != CLOSED
+        breaker.record(error is None or not is_retryable(error))
+        if error is None and seconds is not None:
+            self._latency[model].record(seconds)
+        if breaker.state == OPEN and not was_open:
+            logger.warning("Circuit breaker opened for %s after %s", model, error)
+        elif breaker.state == CLOSED and was_open:
+            logger.info("Circuit breaker closed for %s", model)
+
+    def call(self, tier, fn):
+        """Call fn(model_id) on the routed model and record how it went"""
+        model = self.route(tier)
+        started = time.monotonic()
+        try:
+            result = fn(model)
+        except Exception as e:
+            self.record(model, error=e)
+            raise
+        except BaseException:
+            # An interrupted call, e.g. a worker shutting down, says nothing about the model's health
+            self._breakers[model].release()
+            raise
+        self.record(model, time.monotonic() - started)
+        return result
+
+    async def call_async(self, tier, coro_fn):
+        """Async variant of call"""
+        model = self.route(tier)
+        started = time.monotonic()
+        try:
+            result = await coro_fn(model)
+        except Exception as e:
+            self.record(model, error=e)
+            raise
+        except BaseException:
+            # A cancelled call says nothing about the model's health
+            self._breakers[model].release()
+            raise
+        self.record(model, time.monotonic() - started)
+        return result
+
+    def stats(self):
+        models = {}
+        for model in self.models:
+            breaker = self._breakers[model]
+            models[model] = {
+                'state': breaker.state,
+                'p50': self._latency[model].percentile(0.5),
+                'error_rate': breaker.current_error_rate(),
+                'opened': breaker.opened,
+            }
+        with self._lock:
+            return {'models': models, 'failovers': self.failovers}
+
+
+def configured_models():
+    """Image models from IMAGE_MODELS, best quality first"""
+    models = [model.strip() for model in os.getenv('IMAGE_MODELS', '').split(',') if model.strip()]
+    return models or [DEFAULT_MODEL_ID]
+
+
+def create_model_router():
+    """Model router configured from the environment"""
+    return ModelRouter(
+        configured_models(),
+        window=int(os.getenv('MODEL_BREAKER_WINDOW', '20')),
+        min_calls=int(os.getenv('MODEL_BREAKER_MIN_CALLS', '5')),
+        error_rate=float(os.getenv('MODEL_BREAKER_ERROR_RATE', '0.5')),
+        cooldown=float(os.getenv('MODEL_BREAKER_COOLDOWN_SECONDS', '30'))
+    )
@@ -0,0 +1,104 @@
+"""
+Output renditions for generated images
+The model's image is kept byte for byte for downloads. For the page, a display-size
+copy and a thumbnail are encoded from it once, in parallel on a small thread pool,
+using size, format and quality presets from the environment.
+"""
+
+import concurrent.futures
+import io
+import os
+from PIL import Image
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+
+class Preset:
+    """Longest side, format and quality of one rendition"""
+
+    def __init__(self, name, max_side, image_format='JPEG', quality=82):
+        image_format = image_format.upper()
+        if image_format not in MIME_TYPES:
+            raise ValueError(f"Unsupported output format: {image_format}")
+        self.name = name
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+
+
+class Rendition:
+    """Encoded bytes of one preset"""
+
+    def __init__(self, data, image_format, size):
+        self.data = data
+        self.image_format = image_format
+        self.mime_type = MIME_TYPES[image_format]
+        self.size = tuple(size)
+
+
+def _target_size(size, max_side):
+    width, height = size
+    scale = min(1.0, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def encode_rendition(image, preset):
+    """Downsize a decoded image to a preset and encode it"""
+    target = _target_size(image.size, preset.max_side)
+    if target != image.size:
+        image = image.resize(target, Image.LANCZOS, reducing_gap=3.0)
+    if preset.image_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten onto white like the page background
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    if preset.image_format == 'PNG':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        image.save(buffer, format=preset.image_format, quality=preset.quality)
+    return Rendition(buffer.getvalue(), preset.image_format, image.size)
+
+
+class OutputEncoder:
+    """Encode display and thumbnail renditions of generated images on a thread pool"""
+
+    def __init__(self, presets, workers=2):
+        self.presets = {preset.name: preset for preset in presets}
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='output-encoder')
+
+    def encode(self, data, names=None):
+        """Return {preset name: Rendition} for the given presets (default: all)"""
+        presets = [self.presets[name] for name in names] if names else list(self.presets.values())
+        image = Image.open(io.BytesIO(data))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+        image.load()
+        # Pillow releases the GIL while resizing and encoding, so presets run in parallel
+        futures = {preset.name: self._pool.submit(encode_rendition, image, preset) for preset in presets}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def create_output_encoder():
+    """Display and thumbnail presets configured from the environment"""
+    return OutputEncoder(
+        [
+            Preset(
+                'display',
+                int(os.getenv('OUTPUT_DISPLAY_MAX_SIDE', '1024')),
+                os.getenv('OUTPUT_DISPLAY_FORMAT', 'JPEG'),
+                int(os.getenv('OUTPUT_DISPLAY_QUALITY', '82'))
+            ),
+            Preset(
+                'thumbnail',
+                int(os.getenv('OUTPUT_THUMBNAIL_MAX_SIDE', '320')),
+                os.getenv('OUTPUT_THUMBNAIL_FORMAT', 'JPEG'),
+                int(os.getenv('OUTPUT_THUMBNAIL_QUALITY', '75'))
+            ),
+        ],
+        workers=int(os.getenv('OUTPUT_ENCODER_WORKERS', '2'))
+    )
@@ -0,0 +1,196 @@
+"""
+Perceptual room matching for the Furniture Visualizer
+Room photos are fingerprinted with a 64-bit DCT hash (pHash) and a 64-bit gradient
+hash (dHash). Both survive re-encoding, rescaling and small crops, so a room uploaded
+again as a screenshot or a re-saved JPEG lands within a few bits of the original.
+SimilarRoomIndex keeps the fingerprints of past uploads with the renders made for
+them, and finds earlier renders of the same request for a near-duplicate room that
+the same user uploaded.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+# pHash keeps the low frequencies of a DCT over this downscaled image
+PHASH_SAMPLE = 32
+# Combined pHash + dHash bits; a re-saved JPEG, a rescaled screenshot or a 2% crop
+# of a room stays below, while unrelated photos can come as close as 13
+DEFAULT_MAX_DISTANCE = 8
+
+
+def _dct_matrix(size):
+    """Orthonormal DCT-II basis, so a 2D transform is two matrix products"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    basis = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    basis[0] /= np.sqrt(2)
+    return basis
+
+
+DCT = _dct_matrix(PHASH_SAMPLE)
+
+
+def _pack(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def _grayscale(image, size):
+    return np.asarray(image.convert('L').resize(size, Image.BOX), dtype=np.float32)
+
+
+def dhash(image):
+    """Gradient hash: whether each pixel is brighter than its right neighbour"""
+    pixels = _grayscale(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image):
+    """DCT hash: whether each low-frequency coefficient is above their median"""
+    pixels = _grayscale(image, (PHASH_SAMPLE, PHASH_SAMPLE))
+    coefficients = (DCT @ pixels @ DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only tracks overall brightness, so it does not set the threshold
+    return _pack(coefficients > np.median(coefficients.ravel()[1:]))
+
+
+def hamming_distances(hashes, value):
+    """Bit differences between every hash in a uint64 array and one hash"""
+    differences = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(differences.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def room_key(room_bytes):
+    return hashlib.sha256(room_bytes).hexdigest()
+
+
+def request_key(prompt, model_id):
+    """Identify a render request independently of the room it was made for"""
+    return hashlib.sha256(f"{model_id}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+class SimilarRoomIndex:
+    """Fingerprints of past room uploads and the result cache keys of their renders
+
+    Each owner's uploads are kept in their own fingerprint matrix, so a lookup only
+    computes vectorized Hamming distances against the rooms that owner uploaded,
+    and one user is never offered renders of another user's room. A room matches
+    when its pHash and dHash differ by at most max_distance bits in total. With a
+    path, records are appended to a JSON lines file and reloaded on restart.
+    """
+
+    def __init__(self, path=None, max_distance=DEFAULT_MAX_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self._fingerprints = {}
+        # owner -> room keys in upload order (a dict used as an ordered set)
+        self._owned = {}
+        # owner -> (room keys, fingerprint matrix), rebuilt after the owner adds a room
+        self._matrices = {}
+        self._renders = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._load()
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if 'phash' in record:
+                        self._fingerprints[record['room']] = (int(record['phash'], 16), int(record['dhash'], 16))
+                    elif 'owner' in record:
+                        self._owned.setdefault(record['owner'], {})[record['room']] = None
+                    else:
+                        self._renders.setdefault(record['room'], {})[record['request']] = record['result']
+                except (ValueError, KeyError) as e:
+                    logger.warning("Skipping unreadable room index record: %s", e)
+
+    def _append(self, record):
+        if self.path is None:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def add_room(self, key, load_image, owner=None):
+        """Fingerprint a room the first time its bytes are seen, and note who uploaded it
+
+        load_image() returns the room's pixels; it is only called for a room the
+        index does not know yet, so a room seen before is never decoded again.
+        """
+        with self._lock:
+            known = key in self._fingerprints
+        if not known:
+            # Hashing decodes and downsizes the image, so keep it outside the lock
+            image = load_image()
+            phash_value, dhash_value = phash(image), dhash(image)
+            with self._lock:
+                if key not in self._fingerprints:
+                    self._fingerprints[key] = (phash_value, dhash_value)
+                    self._append({'room': key, 'phash': f"{phash_value:016x}", 'dhash': f"{dhash_value:016x}"})
+        if owner is not None:
+            with self._lock:
+                rooms = self._owned.setdefault(owner, {})
+                if key not in rooms:
+                    rooms[key] = None
+                    self._matrices.pop(owner, None)
+                    self._append({'room': key, 'owner': owner})
+
+    def _owner_matrix(self, owner):
+        """Room keys and fingerprint matrix of an owner's uploads; call with the lock held"""
+        cached = self._matrices.get(owner)
+        if cached is None:
+            keys = [room for room in self._owned.get(owner, ()) if room in self._fingerprints]
+            matrix = np.array([self._fingerprints[room] for room in keys], dtype=np.uint64).reshape(-1, 2)
+            cached = self._matrices[owner] = (keys, matrix)
+        return cached
+
+    def similar_rooms(self, key, owner):
+        """Return the keys of other rooms an owner uploaded that match a room, closest first"""
+        with self._lock:
+            fingerprint = self._fingerprints.get(key)
+            if fingerprint is None or owner not in self._owned:
+                return []
+            keys, matrix = self._owner_matrix(owner)
+        distances = hamming_distances(matrix[:, 0], fingerprint[0]) + hamming_distances(matrix[:, 1], fingerprint[1])
+        order = np.argsort(distances, kind='stable')
+        return [keys[index] for index in order if distances[index] <= self.max_distance and keys[index] != key]
+
+    def record_render(self, key, request, result_key):
+        """Remember that a request was rendered for a room and cached under result_key"""
+        with self._lock:
+            renders = self._renders.setdefault(key, {})
+            if renders.get(request) == result_key:
+                return
+            renders[request] = result_key
+            self._append({'room': key, 'request': request, 'result': result_key})
+
+    def similar_renders(self, key, request, owner):
+        """Result cache keys of the same request rendered for an owner's near-duplicate rooms"""
+        results = []
+        for similar in self.similar_rooms(key, owner):
+            with self._lock:
+                result_key = self._renders.get(similar, {}).get(request)
+            if result_key is not None:
+                results.append(result_key)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._fingerprints),
+                'renders': sum(len(renders) for renders in self._renders.values()),
+            }
@@ -0,0 +1,220 @@
+"""
+Pre-flight checks for room images
+Runs before any model call so unusable uploads are turned away locally. The
+header is read first: the file format, a pixel cap against decompression bombs
+and a minimum resolution are checked without decoding any pixels. A downsampled
+grayscale copy is then scored for blur (variance of its Laplacian) and exposure
+(brightness, contrast and clipped shadows or highlights).
+"""
+
+import io
+import os
+import warnings
+from PIL import Image
+from preprocessing import PreparedImage
+
+ALLOWED_FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP')
+DEFAULT_MAX_PIXELS = 50_000_000
+DEFAULT_MIN_SIDE = 256
+# Side of the copy the quality metrics are computed on
+SAMPLE_SIDE = 512
+
+# Laplacian variance of the contrast-stretched sample; sharp room photos score in the hundreds
+DEFAULT_BLUR_REJECT = 10.0
+DEFAULT_BLUR_WARN = 50.0
+
+# Mean brightness outside these bounds means a (nearly) black or white frame
+DARK_FRAME = 12
+BRIGHT_FRAME = 245
+# Standard deviation below which the frame is practically one flat color
+FLAT_FRAME = 4
+UNDEREXPOSED = 45
+OVEREXPOSED = 225
+# Share of pixels at the very ends of the histogram before it is called clipped
+CLIPPED_SHARE = 0.35
+SHADOW_LEVEL = 16
+HIGHLIGHT_LEVEL = 240
+
+UNREADABLE = "The file is not an image that can be read. Please upload a JPEG, PNG or WebP photo."
+
+
+class PreflightReport:
+    """Problems that rule an image out, warnings worth showing, and the measured metrics"""
+
+    def __init__(self):
+        self.problems = []
+        self.warnings = []
+        self.metrics = {}
+
+    @property
+    def ok(self):
+        return not self.problems
+
+
+class PreflightError(Exception):
+    """Raised when a room image fails a pre-flight check"""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(" ".join(report.problems))
+
+
+class Preflight:
+    """Cheap local checks of a room image, run before it is sent to the model"""
+
+    def __init__(self, max_pixels=DEFAULT_MAX_PIXELS, min_side=DEFAULT_MIN_SIDE,
+                 blur_reject=DEFAULT_BLUR_REJECT, blur_warn=DEFAULT_BLUR_WARN, formats=ALLOWED_FORMATS):
+        self.max_pixels = max_pixels
+        self.min_side = min_side
+        self.blur_reject = blur_reject
+        self.blur_warn = blur_warn
+        self.formats = tuple(formats)
+
+    def check(self, source, pixels=True):
+        """Check a path, file object, bytes, PIL image or PreparedImage
+
+        With pixels=False only the header is read, so nothing is decoded.
+        """
+        report = PreflightReport()
+        try:
+            with warnings.catch_warnings():
+                # Oversized images are reported below rather than warned about
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                image, image_format, size = _open(source)
+        except Image.DecompressionBombError:
+            report.problems.append("The image has far too many pixels to process.")
+            return report
+        except (OSError, SyntaxError, ValueError):
+            report.problems.append(UNREADABLE)
+            return report
+
+        self._check_header(report, image_format, size)
+        if pixels and report.ok:
+            try:
+                self._check_pixels(report, image, owned=not isinstance(source, Image.Image))
+            except (OSError, SyntaxError, ValueError):
+                # e.g. a truncated file whose header was intact
+                report.problems.append(UNREADABLE)
+        return report
+
+    def enforce(self, source, pixels=True):
+        """Return the report of a passing image, raising PreflightError otherwise"""
+        report = self.check(source, pixels)
+        if not report.ok:
+            raise PreflightError(report)
+        return report
+
+    def _check_header(self, report, image_format, size):
+        width, height = size
+        report.metrics.update(format=image_format, width=width, height=height)
+        if image_format is not None and image_format not in self.formats:
+            report.problems.append(
+                f"{image_format} images are not supported. Please upload a JPEG, PNG or WebP photo."
+            )
+        if width * height > self.max_pixels:
+            report.problems.append(
+                f"The image is {width}×{height}, more than the {self.max_pixels / 1_000_000:.0f} megapixels "
+                f"that can be processed."
+            )
+        if min(width, height) < self.min_side:
+            report.problems.append(
+                f"The image is only {width}×{height}. Please upload a photo at least "
+                f"{self.min_side} pixels on each side."
+            )
+        elif min(width, height) < 2 * self.min_side:
+            report.warnings.append(f"The image is only {width}×{height}, so the result may lack detail.")
+
+    def _check_pixels(self, report, image, owned):
+        blur, brightness, contrast, shadows, highlights = _sample_metrics(image, owned)
+        report.metrics.update(blur=blur, brightness=brightness, contrast=contrast,
+                              shadows=shadows, highlights=highlights)
+        if brightness < DARK_FRAME:
+            report.problems.append("The image is almost completely black.")
+        elif brightness > BRIGHT_FRAME:
+            report.problems.append("The image is almost completely white.")
+        elif contrast < FLAT_FRAME:
+            report.problems.append("The image is a single flat color, with no room to place furniture in.")
+        elif blur < self.blur_reject:
+            report.problems.append("The image is too blurry to place furniture in. Please upload a sharper photo.")
+        if not report.ok:
+            return
+
+        if blur < self.blur_warn:
+            report.warnings.append("The image looks blurry, so the result may be soft.")
+        if brightness < UNDEREXPOSED or shadows > CLIPPED_SHARE:
+            report.warnings.append("The image is very dark, so furniture may be hard to match to the lighting.")
+        elif brightness > OVEREXPOSED or highlights > CLIPPED_SHARE:
+            report.warnings.append("The image is overexposed, so furniture may be hard to match to the lighting.")
+
+
+def _open(source):
+    """Return (lazily decoded PIL image, format, size) of any supported source"""
+    if isinstance(source, PreparedImage):
+        # Judge the resolution the photo was taken at, not the upload budget it was fitted to
+        return Image.open(io.BytesIO(source.data)), None, source.original_size
+    if isinstance(source, Image.Image):
+        return source, source.format, source.size
+
+    if isinstance(source, (bytes, bytearray)):
+        raw = bytes(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            raw = f.read()
+    else:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        raw = source.read()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+    # Opening reads only the header; pixels are decoded on first access
+    image = Image.open(io.BytesIO(raw))
+    return image, image.format, image.size
+
+
+def _sample_metrics(image, owned):
+    """Blur, brightness, contrast and clipped shadow and highlight shares of a small grayscale copy"""
+    # Imported here so the page does not pay for numpy before the first upload
+    import numpy as np
+
+    # Let the JPEG decoder produce a scaled-down grayscale image directly; only
+    # images opened here may be changed in place
+    if owned and image.format in ('JPEG', 'MPO'):
+        image.draft('L', (SAMPLE_SIDE, SAMPLE_SIDE))
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    # Blur scores depend on scale, so every image is measured at the same size
+    width, height = image.size
+    scale = SAMPLE_SIDE / max(width, height)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(image.convert('L'))
+
+    sample = pixels.astype(np.float32)
+    histogram = np.bincount(pixels.ravel(), minlength=256) / pixels.size
+    # Edges are measured after stretching the 1st to 99th percentile over the full
+    # range, so a dark or low-contrast photo is not mistaken for a blurred one
+    cumulative = np.cumsum(histogram)
+    low, high = np.searchsorted(cumulative, 0.01), np.searchsorted(cumulative, 0.99)
+    stretched = (sample - low) * (255 / (high - low)) if high > low else np.zeros_like(sample)
+    laplacian = (stretched[1:-1, :-2] + stretched[1:-1, 2:] + stretched[:-2, 1:-1] + stretched[2:, 1:-1]
+                 - 4 * stretched[1:-1, 1:-1])
+    return (
+        float(laplacian.var()) if laplacian.size else 0.0,
+        float(sample.mean()),
+        float(sample.std()),
+        float(histogram[:SHADOW_LEVEL].sum()),
+        float(histogram[HIGHLIGHT_LEVEL:].sum()),
+    )
+
+
+def create_preflight():
+    """Pre-flight checks configured from the environment, or None when disabled"""
+    if os.getenv('PREFLIGHT_ENABLED', 'true').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    return Preflight(
+        max_pixels=int(os.getenv('PREFLIGHT_MAX_PIXELS', DEFAULT_MAX_PIXELS)),
+        min_side=int(os.getenv('PREFLIGHT_MIN_SIDE', DEFAULT_MIN_SIDE)),
+        blur_reject=float(os.getenv('PREFLIGHT_BLUR_REJECT', DEFAULT_BLUR_REJECT)),
+        blur_warn=float(os.getenv('PREFLIGHT_BLUR_WARN', DEFAULT_BLUR_WARN))
+    )
@@ -0,0 +1,133 @@
+"""
+Room image preprocessing for the Furniture Visualizer
+Uploaded photos are oriented, downsized to a pixel budget, stripped of metadata
+and re-encoded before they are sent to the model
+"""
+
+import io
+import math
+import os
+from PIL import Image, ImageOps
+
+DEFAULT_MAX_PIXELS = 1_600_000
+DEFAULT_FORMAT = 'JPEG'
+DEFAULT_QUALITY = 85
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+
+def format_bytes(num_bytes):
+    """Format a byte count for display"""
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):.1f} MB"
+    if num_bytes >= 1024:
+        return f"{num_bytes / 1024:.0f} KB"
+    return f"{num_bytes} B"
+
+
+class PreparedImage:
+    """A room image re-encoded and ready to upload to the model"""
+
+    def __init__(self, data, mime_type, size, original_bytes, original_size):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = tuple(size)
+        self.original_bytes = original_bytes
+        self.original_size = tuple(original_size)
+        self._image = None
+
+    @property
+    def image(self):
+        """Decoded copy of the encoded bytes, created on first access"""
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self.data))
+            self._image.load()
+        return self._image
+
+    @property
+    def bytes_saved(self):
+        return max(self.original_bytes - len(self.data), 0)
+
+    def to_part(self):
+        """Return the image as a content part for the model request"""
+        from google.genai import types
+        return types.Part.from_bytes(data=self.data, mime_type=self.mime_type)
+
+    def describe(self):
+        """Summarize the size reduction for display"""
+        width, height = self.original_size
+        new_width, new_height = self.size
+        return (
+            f"{width}×{height} → {new_width}×{new_height}, "
+            f"{format_bytes(self.original_bytes)} → {format_bytes(len(self.data))} "
+            f"(saved {format_bytes(self.bytes_saved)})"
+        )
+
+
+def _read_source(source):
+    """Return (raw bytes, PIL image) for a path, file object, bytes or PIL image"""
+    if isinstance(source, Image.Image):
+        buffer = io.BytesIO()
+        source.save(buffer, format=source.format or 'PNG')
+        return buffer.getvalue(), source
+
+    if isinstance(source, (bytes, bytearray)):
+        raw = bytes(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            raw = f.read()
+    else:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        raw = source.read()
+
+    return raw, Image.open(io.BytesIO(raw))
+
+
+def _target_size(size, max_pixels):
+    """Scale a size down uniformly so it fits within the pixel budget"""
+    width, height = size
+    if width * height <= max_pixels:
+        return size
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def preprocess_room_image(source, max_pixels=None, image_format=None, quality=None):
+    """Orient, downsize, strip and re-encode a room image for upload"""
+    max_pixels = max_pixels or int(os.getenv('ROOM_MAX_PIXELS', DEFAULT_MAX_PIXELS))
+    image_format = (image_format or os.getenv('ROOM_IMAGE_FORMAT', DEFAULT_FORMAT)).upper()
+    quality = quality or int(os.getenv('ROOM_IMAGE_QUALITY', DEFAULT_QUALITY))
+    if image_format not in MIME_TYPES:
+        raise ValueError(f"Unsupported room image format: {image_format}")
+
+    raw, image = _read_source(source)
+    orientation = image.getexif().get(0x0112, 1)
+    original_size = image.size[::-1] if orientation in (5, 6, 7, 8) else image.size
+    target = _target_size(image.size, max_pixels)
+
+    # Let the JPEG decoder skip detail we are about to throw away
+    if image.format == 'JPEG' and target != image.size:
+        image.draft('RGB', target)
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    # exif_transpose may have swapped the axes, so recompute the target
+    target = _target_size(image.size, max_pixels)
+    if image.size != target:
+        image = image.resize(target, Image.LANCZOS)
+
+    # Drop EXIF, ICC and any other metadata before encoding
+    image.info = {}
+    buffer = io.BytesIO()
+    if image_format == 'PNG':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        image.save(buffer, format=image_format, quality=quality, optimize=True)
+    return PreparedImage(buffer.getvalue(), MIME_TYPES[image_format], image.size, len(raw), original_size)
@@ -0,0 +1,262 @@
+"""
+Instant local placement preview for the Furniture Visualizer
+Each catalog item has an RGBA cutout sprite, loaded from SPRITE_DIR/<sku>.png or
+drawn procedurally from its category when no cutout exists. The sprite is scaled,
+given a soft drop shadow and alpha blended onto the room with NumPy, so users can
+try positions and sizes in milliseconds and only send the final render to the model.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFilter
+
+DEFAULT_SPRITE_DIR = 'sprites'
+SHADOW_OPACITY = 0.45
+# Procedural sprites are drawn at this width and supersampled for smooth edges
+SPRITE_WIDTH = 512
+SUPERSAMPLE = 2
+
+CATEGORY_COLORS = {
+    "Seating": "#8a8f99",
+    "Tables": "#8b5a2b",
+    "Storage": "#a0764f",
+    "Lighting": "#e0c890",
+    "Bedroom": "#b9a48f",
+    "Decor": "#4f7f52",
+}
+DEFAULT_COLOR = "#9a8c7c"
+
+
+def _parse_color(*candidates):
+    """Return the first candidate PIL understands as an RGB color"""
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return ImageColor.getrgb(candidate.strip().lower().replace(' ', ''))[:3]
+        except ValueError:
+            continue
+    return ImageColor.getrgb(DEFAULT_COLOR)
+
+
+def _shade(color, factor):
+    return tuple(max(0, min(255, int(channel * factor))) for channel in color)
+
+
+def _draw_seating(draw, w, h, color):
+    dark = _shade(color, 0.8)
+    draw.rounded_rectangle((0.04 * w, 0.05 * h, 0.96 * w, 0.6 * h), radius=0.06 * w, fill=dark)
+    draw.rounded_rectangle((0.1 * w, 0.45 * h, 0.9 * w, 0.85 * h), radius=0.04 * w, fill=color)
+    for left in (0, 0.84):
+        draw.rounded_rectangle((left * w, 0.3 * h, (left + 0.16) * w, 0.88 * h), radius=0.05 * w, fill=dark)
+    for left in (0.06, 0.9):
+        draw.rectangle((left * w, 0.88 * h, (left + 0.04) * w, h), fill=_shade(color, 0.4))
+
+
+def _draw_table(draw, w, h, color):
+    draw.rectangle((0, 0, w, 0.12 * h), fill=color)
+    for left in (0.05, 0.88):
+        draw.rectangle((left * w, 0.12 * h, (left + 0.07) * w, h), fill=_shade(color, 0.7))
+
+
+def _draw_storage(draw, w, h, color):
+    draw.rectangle((0, 0, w, h), fill=color)
+    for index in range(1, 4):
+        top = index * h / 4
+        draw.rectangle((0.05 * w, top - 0.015 * h, 0.95 * w, top + 0.015 * h), fill=_shade(color, 0.65))
+    draw.rectangle((0, 0, w, h), outline=_shade(color, 0.55), width=max(2, int(0.03 * w)))
+
+
+def _draw_lighting(draw, w, h, color):
+    draw.polygon([(0.3 * w, 0), (0.7 * w, 0), (0.95 * w, 0.28 * h), (0.05 * w, 0.28 * h)], fill=color)
+    draw.rectangle((0.47 * w, 0.28 * h, 0.53 * w, 0.95 * h), fill=(70, 70, 70))
+    draw.ellipse((0.2 * w, 0.92 * h, 0.8 * w, h), fill=(70, 70, 70))
+
+
+def _draw_bedroom(draw, w, h, color):
+    draw.rounded_rectangle((0.02 * w, 0, 0.98 * w, 0.75 * h), radius=0.04 * w, fill=_shade(color, 0.75))
+    draw.rounded_rectangle((0, 0.45 * h, w, 0.9 * h), radius=0.03 * w, fill=color)
+    draw.rectangle((0.02 * w, 0.9 * h, 0.98 * w, h), fill=_shade(color, 0.5))
+
+
+def _draw_decor(draw, w, h, color):
+    draw.ellipse((0.05 * w, 0, 0.95 * w, 0.7 * h), fill=color)
+    draw.polygon([(0.25 * w, 0.6 * h), (0.75 * w, 0.6 * h), (0.68 * w, h), (0.32 * w, h)], fill=(150, 95, 70))
+
+
+# Category → (drawing function, height / width of the sprite)
+SHAPES = {
+    "Seating": (_draw_seating, 0.5),
+    "Tables": (_draw_table, 0.45),
+    "Storage": (_draw_storage, 1.4),
+    "Lighting": (_draw_lighting, 2.6),
+    "Bedroom": (_draw_bedroom, 0.7),
+    "Decor": (_draw_decor, 1.3),
+}
+
+
+def draw_sprite(category, color):
+    """Draw a simple RGBA silhouette for a category in the given color"""
+    draw_shape, aspect = SHAPES.get(category, (_draw_table, 0.6))
+    width = SPRITE_WIDTH * SUPERSAMPLE
+    height = max(1, int(width * aspect))
+    sprite = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw_shape(ImageDraw.Draw(sprite), width - 1, height - 1, color)
+    sprite = sprite.resize((SPRITE_WIDTH, max(1, height // SUPERSAMPLE)), Image.LANCZOS)
+
+    # Darken towards the floor so flat shapes read as solid objects
+    pixels = np.asarray(sprite).astype(np.float32)
+    pixels[..., :3] *= np.linspace(1.0, 0.75, sprite.height, dtype=np.float32)[:, None, None]
+    return Image.fromarray(pixels.astype(np.uint8), 'RGBA')
+
+
+class SpriteLayer:
+    """A sprite scaled to one width, premultiplied and padded with its drop shadow"""
+
+    def __init__(self, sprite, width):
+        height = max(1, round(sprite.height * width / sprite.width))
+        sprite = sprite.resize((width, height), Image.LANCZOS)
+        margin = max(2, width // 10)
+        offset = (max(1, width // 40), max(1, width // 50))
+        canvas = (width + 2 * margin, height + 2 * margin)
+
+        shadow = Image.new('L', canvas, 0)
+        shadow.paste(sprite.getchannel('A'), (margin + offset[0], margin + offset[1]))
+        shadow = shadow.filter(ImageFilter.GaussianBlur(margin / 3))
+        self.shadow = np.asarray(shadow, dtype=np.float32) * (SHADOW_OPACITY / 255)
+
+        pixels = np.zeros((canvas[1], canvas[0], 4), dtype=np.float32)
+        pixels[margin:margin + height, margin:margin + width] = np.asarray(sprite, dtype=np.float32)
+        self.alpha = pixels[..., 3] / 255
+        self.premultiplied = pixels[..., :3] * self.alpha[..., None]
+        # The sprite is positioned by the middle of its bottom edge, where it meets the floor
+        self.anchor = (margin + width // 2, margin + height)
+
+
+class SpriteLibrary:
+    """Cutout sprites for catalog items, loaded from disk or drawn on first use"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._sprites = {}
+        self._lock = threading.Lock()
+
+    def _path(self, item):
+        if not self.directory or not item.get('sku'):
+            return None
+        path = os.path.join(self.directory, f"{item['sku']}.png")
+        return path if os.path.exists(path) else None
+
+    def sprite(self, item, color=None):
+        """Return (cache key, RGBA sprite) for an item, tinting drawn sprites with color"""
+        path = self._path(item)
+        if path is not None:
+            key = (path,)
+        else:
+            fill = _parse_color(color, item.get('color'), CATEGORY_COLORS.get(item.get('category')))
+            key = (item.get('category'), fill)
+        with self._lock:
+            sprite = self._sprites.get(key)
+        if sprite is None:
+            if path is not None:
+                sprite = Image.open(path).convert('RGBA')
+                # Crop transparent padding so the bottom edge is the floor contact
+                sprite = sprite.crop(sprite.getchannel('A').getbbox() or (0, 0, *sprite.size))
+            else:
+                sprite = draw_sprite(item.get('category'), fill)
+            with self._lock:
+                self._sprites[key] = sprite
+        return key, sprite
+
+
+class QuickPreview:
+    """Composite furniture sprites onto room photos without calling the model
+
+    Decoded rooms and scaled sprite layers are kept in small LRU tables, so moving a
+    piece around only repeats the blend over the sprite's own pixels.
+    """
+
+    def __init__(self, sprites, max_rooms=8, max_layers=64):
+        self.sprites = sprites
+        self.max_rooms = max_rooms
+        self.max_layers = max_layers
+        self._rooms = OrderedDict()
+        self._layers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, table, key, value, limit):
+        with self._lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > limit:
+                table.popitem(last=False)
+
+    def _recall(self, table, key):
+        with self._lock:
+            value = table.get(key)
+            if value is not None:
+                table.move_to_end(key)
+            return value
+
+    def _room_pixels(self, room_data):
+        key = hashlib.sha256(room_data).digest()
+        pixels = self._recall(self._rooms, key)
+        if pixels is None:
+            pixels = np.asarray(Image.open(io.BytesIO(room_data)).convert('RGB'))
+            self._remember(self._rooms, key, pixels, self.max_rooms)
+        return pixels
+
+    def _layer(self, item, color, width):
+        sprite_key, sprite = self.sprites.sprite(item, color)
+        key = (sprite_key, width)
+        layer = self._recall(self._layers, key)
+        if layer is None:
+            layer = SpriteLayer(sprite, width)
+            self._remember(self._layers, key, layer, self.max_layers)
+        return layer
+
+    def compose(self, room_data, item, x=0.5, y=0.85, scale=0.35, color=None):
+        """Return the room with the item placed as an RGB array
+
+        x and y locate the middle of the item's base as fractions of the room width
+        and height; scale is the item's width as a fraction of the room width.
+        """
+        room = self._room_pixels(room_data)
+        room_height, room_width = room.shape[:2]
+        layer = self._layer(item, color, max(4, int(room_width * scale)))
+
+        left = int(x * room_width) - layer.anchor[0]
+        top = int(y * room_height) - layer.anchor[1]
+        # Clip the layer to the room so pieces can hang off the edge
+        x0, y0 = max(left, 0), max(top, 0)
+        x1 = min(left + layer.alpha.shape[1], room_width)
+        y1 = min(top + layer.alpha.shape[0], room_height)
+        output = room.copy()
+        if x0 >= x1 or y0 >= y1:
+            return output
+
+        window = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+        region = output[y0:y1, x0:x1].astype(np.float32)
+        region *= (1 - layer.shadow[window])[..., None]
+        region *= (1 - layer.alpha[window])[..., None]
+        region += layer.premultiplied[window]
+        output[y0:y1, x0:x1] = (region + 0.5).astype(np.uint8)
+        return output
+
+
+def describe_position(x, y, scale):
+    """Put a preview position into words for the placement instructions"""
+    side = "on the left side" if x < 0.35 else "on the right side" if x > 0.65 else "in the center"
+    depth = "near the camera" if y > 0.8 else "towards the back wall" if y < 0.55 else "in the middle of the floor"
+    size = "large" if scale > 0.5 else "small" if scale < 0.2 else "medium-sized"
+    return f"{side} of the room, {depth}, {size} relative to the room"
+
+
+def create_quick_preview():
+    """Build the preview engine, reading cutouts from SPRITE_DIR when it exists"""
+    directory = os.getenv('SPRITE_DIR', DEFAULT_SPRITE_DIR)
+    return QuickPreview(SpriteLibrary(directory if os.path.isdir(directory) else None))
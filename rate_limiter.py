@@ -0,0 +1,149 @@
+"""
+Process-wide rate limiting for model calls
+A token bucket paces calls to stay under the API quota, and a bounded FIFO
+admission queue holds the overflow or rejects it quickly when it is full
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class QueueFullError(Exception):
+    """Raised when new work is rejected because the admission queue is full"""
+
+    def __init__(self, queued, estimated_wait):
+        self.queued = queued
+        self.estimated_wait = estimated_wait
+        super().__init__(
+            f"The visualizer is busy ({queued} requests queued, about {estimated_wait:.0f}s wait). "
+            "Please try again in a moment."
+        )
+
+
+class AdmissionController:
+    """Token-bucket limiter with a bounded first-in, first-out admission queue"""
+
+    def __init__(self, rate_per_minute=60, burst=10, max_queue=50, max_wait_seconds=120):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.admitted = 0
+        self.rejected = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiting = deque()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _estimated_wait(self, position):
+        """Seconds until the request at a queue position gets a token"""
+        return max(0.0, (position + 1 - self._tokens) / self.rate)
+
+    def _enqueue(self):
+        """Take a token immediately or join the queue; returns a ticket or None"""
+        with self._cond:
+            self._refill()
+            if not self._waiting and self._tokens >= 1:
+                self._tokens -= 1
+                self.admitted += 1
+                return None
+
+            position = len(self._waiting)
+            estimated_wait = self._estimated_wait(position)
+            if position >= self.max_queue or estimated_wait > self.max_wait_seconds:
+                self.rejected += 1
+                raise QueueFullError(position, estimated_wait)
+
+            ticket = object()
+            self._waiting.append(ticket)
+            return ticket
+
+    def try_acquire(self):
+        """Take a token only if one is free right now and nobody is queued"""
+        with self._cond:
+            self._refill()
+            if self._waiting or self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.admitted += 1
+            return True
+
+    def _poll(self, ticket):
+        """Return (admitted, position, estimated wait) for a queued ticket"""
+        with self._cond:
+            self._refill()
+            position = self._waiting.index(ticket)
+            if position == 0 and self._tokens >= 1:
+                self._waiting.popleft()
+                self._tokens -= 1
+                self.admitted += 1
+                self._cond.notify_all()
+                return True, 0, 0.0
+            return False, position, self._estimated_wait(position)
+
+    def _abandon(self, ticket):
+        with self._cond:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def acquire(self, on_wait=None):
+        """Block until a model call may proceed
+
+        on_wait(position, estimated_wait) is called while the request is queued,
+        with a 1-based queue position.
+        """
+        ticket = self._enqueue()
+        if ticket is None:
+            return
+
+        admitted = False
+        try:
+            while True:
+                admitted, position, estimated_wait = self._poll(ticket)
+                if admitted:
+                    return
+                if on_wait is not None:
+                    on_wait(position + 1, estimated_wait)
+                with self._cond:
+                    self._cond.wait(timeout=min(max(estimated_wait, 0.05), 0.5))
+        finally:
+            if not admitted:
+                self._abandon(ticket)
+
+    async def acquire_async(self, on_wait=None):
+        """Async variant of acquire that sleeps on the event loop while queued"""
+        ticket = self._enqueue()
+        if ticket is None:
+            return
+
+        admitted = False
+        try:
+            while True:
+                admitted, position, estimated_wait = self._poll(ticket)
+                if admitted:
+                    return
+                if on_wait is not None:
+                    on_wait(position + 1, estimated_wait)
+                await asyncio.sleep(min(max(estimated_wait, 0.05), 0.5))
+        finally:
+            if not admitted:
+                self._abandon(ticket)
+
+    def stats(self):
+        """Return queue depth, available tokens and admission counters"""
+        with self._cond:
+            self._refill()
+            return {
+                'queued': len(self._waiting),
+                'tokens': self._tokens,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
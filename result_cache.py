@@ -0,0 +1,136 @@
+"""
+On-disk result cache for the Furniture Visualizer
+Rendered images are stored by a hash of the room image, the prompt and the model id,
+so repeated generations are served from disk instead of calling the model again
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def image_cache_bytes(image):
+    """Return the bytes that identify a room image for caching"""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    header = f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode('utf-8')
+    return header + image.tobytes()
+
+
+def make_cache_key(room_bytes, prompt, model_id):
+    """Build a content-addressed key for a generation request"""
+    digest = hashlib.sha256()
+    for chunk in (model_id.encode('utf-8'), prompt.encode('utf-8'), room_bytes):
+        # Length-prefix every field so different splits never collide
+        digest.update(len(chunk).to_bytes(8, 'big'))
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of generated images stored on local disk"""
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_existing()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.bin")
+
+    def _load_existing(self):
+        """Rebuild the LRU index from files left by a previous process"""
+        found = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.bin'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        # Oldest first, so the most recently used entries end up at the back
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, key, counted=True):
+        """Return cached image bytes for a key, or None on a miss
+
+        counted=False leaves the hit and miss counters alone, for lookups that
+        are not render requests.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += counted
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Touch the file so LRU order survives a restart
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(key, 0)
+                self._total_bytes -= size
+                self.misses += counted
+            return None
+
+        with self._lock:
+            self.hits += counted
+        return data
+
+    def put(self, key, data):
+        """Store image bytes under a key and evict old entries if needed"""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return hit/miss counters and current disk usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
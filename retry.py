@@ -0,0 +1,276 @@
+"""
+Retry and hedging policies for model calls
+Transient failures are retried with jittered exponential backoff under an overall
+deadline, and slow calls can be hedged with a second request past the p95 latency
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+# Finish and block reasons of a request the model declined rather than failed
+REFUSAL_REASONS = {
+    'SAFETY', 'RECITATION', 'BLOCKLIST', 'PROHIBITED_CONTENT', 'SPII', 'IMAGE_SAFETY',
+    'IMAGE_PROHIBITED_CONTENT', 'IMAGE_RECITATION', 'MODEL_ARMOR', 'JAILBREAK',
+}
+
+
+class NoImageError(Exception):
+    """Raised when the model response does not contain an image part
+
+    reason is the response's finish or block reason and text any text the model
+    sent instead of the image.
+    """
+
+    def __init__(self, reason=None, text=''):
+        self.reason = reason
+        self.text = text
+        super().__init__("The model response did not contain an image")
+
+    @property
+    def refused(self):
+        """Whether the model declined this request, answering with text only or a safety stop"""
+        return bool(self.text.strip()) or self.reason in REFUSAL_REASONS
+
+
+def is_retryable(error):
+    """Return True for transient errors that are worth another attempt"""
+    # Imported here: a failed call has already loaded both, and the page does not need them
+    import httpx
+    from google.genai import errors
+    
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    if isinstance(error, NoImageError):
+        # A refusal is decided per request, so it is neither retried nor held against the model
+        return not error.refused
+    return isinstance(error, (NoImageError, httpx.TimeoutException, httpx.TransportError))
+
+
+class RetryPolicy:
+    """Retry transient failures with full-jitter exponential backoff"""
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=16.0, deadline=90.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retries = 0
+        self.give_ups = 0
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt):
+        """Delay before retry number `attempt` (starting at 0)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _next_delay(self, attempt, error, started):
+        """Return the delay before the next attempt, or None to give up"""
+        if not is_retryable(error) or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if time.monotonic() - started + delay > self.deadline:
+            return None
+        return delay
+
+    def _count(self, delay):
+        with self._lock:
+            if delay is None:
+                self.give_ups += 1
+            else:
+                self.retries += 1
+
+    def call(self, fn):
+        """Call fn() until it succeeds, fails permanently or runs out of time"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._next_delay(attempt, e, started)
+                self._count(delay)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, coro_fn):
+        """Async variant of call"""
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await coro_fn()
+            except Exception as e:
+                delay = self._next_delay(attempt, e, started)
+                self._count(delay)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {'retries': self.retries, 'give_ups': self.give_ups}
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, quantile):
+        """Return the latency at a quantile (0-1), or None with no samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(quantile * len(samples)))
+        return samples[index]
+
+
+class HedgePolicy:
+    """Send a backup request when the first one runs past a latency quantile
+
+    Only calls slower than the threshold are hedged, and hedges are capped at
+    max_ratio of all calls, so the average cost stays close to one request.
+    """
+
+    def __init__(self, quantile=0.95, min_samples=20, max_ratio=0.1, max_workers=64):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='hedge'
+        )
+
+    def threshold(self):
+        """Latency after which a hedge is sent, or None until enough samples exist"""
+        if len(self.latency) < self.min_samples:
+            return None
+        return self.latency.percentile(self.quantile)
+
+    def _timed(self, fn):
+        started = time.monotonic()
+        result = fn()
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    def _may_hedge(self, can_hedge):
+        """Check the hedge budget and reserve a hedge if allowed"""
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * self.calls:
+                return False
+        if can_hedge is not None and not can_hedge():
+            return False
+        with self._lock:
+            self.hedged += 1
+        return True
+
+    def call(self, fn, can_hedge=None):
+        """Call fn(), racing a second fn() if the first is slower than the threshold
+
+        can_hedge() is consulted before sending the backup, e.g. to take a
+        rate-limiter token without waiting.
+        """
+        with self._lock:
+            self.calls += 1
+        threshold = self.threshold()
+        if threshold is None:
+            return self._timed(fn)
+
+        # Run in a copy of the caller's context so per-request state such as traces follows
+        primary = self._executor.submit(contextvars.copy_context().run, self._timed, fn)
+        try:
+            return primary.result(timeout=threshold)
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self._may_hedge(can_hedge):
+            return primary.result()
+
+        backup = self._executor.submit(contextvars.copy_context().run, self._timed, fn)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def call_async(self, coro_fn, can_hedge=None):
+        """Async variant of call; the losing request is cancelled"""
+        with self._lock:
+            self.calls += 1
+        threshold = self.threshold()
+
+        async def timed():
+            started = time.monotonic()
+            result = await coro_fn()
+            self.latency.record(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(timed())
+        if threshold is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=threshold)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or not self._may_hedge(can_hedge):
+            return await primary
+
+        backup = asyncio.ensure_future(timed())
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'threshold': self.threshold(),
+            }
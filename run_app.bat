@@ -21,4 +21,4 @@ echo The app will open in your browser at http://localhost:8501
 echo Press Ctrl+C to stop the app
 echo.
 
-streamlit run app.py
+python serve.py
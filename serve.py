@@ -0,0 +1,38 @@
+"""
+Start the Furniture Visualizer with a warm server
+Runs the warm-up (heavy imports, the shared Gemini client and its first connection
+to the model) before handing over to `streamlit run app.py`, so a freshly scaled
+instance only starts listening once the first session can generate straight away.
+Extra arguments are passed to Streamlit, e.g. python serve.py --server.port 8080
+"""
+
+import os
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    load_dotenv(os.path.join(ROOT, '.env'))
+    from warmup import warm_start
+
+    if os.getenv('WARMUP_WAIT', 'true').lower() in ('1', 'true', 'yes', 'on'):
+        print("🔥 Warming up the Furniture Visualizer...")
+        started = time.perf_counter()
+        timings = warm_start()
+        print(f"✅ Warm in {time.perf_counter() - started:.2f}s "
+              f"(imports {timings['imports']:.2f}s, client {timings['client']:.2f}s, model {timings['model']:.2f}s)")
+    else:
+        # Listen straight away; a session arriving early waits on the shared client lock
+        threading.Thread(target=warm_start, name='warm-start', daemon=True).start()
+
+    from streamlit.web import cli
+    sys.argv = ['streamlit', 'run', os.path.join(ROOT, 'app.py'), *sys.argv[1:]]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Bounded per-session image store
+Sessions keep encoded image bytes here instead of decoded PIL objects in
+st.session_state. A global memory budget is enforced across all sessions with LRU
+eviction, and evicted images spill to local disk until they are needed again.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class SessionImageStore:
+    """Process-wide LRU store of encoded images keyed by (session id, name)"""
+
+    def __init__(self, spill_dir, max_memory_bytes=256 * 1024 * 1024, max_disk_bytes=1024 * 1024 * 1024):
+        self.spill_dir = spill_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        # key -> (bytes, metadata) for resident images, key -> (size, metadata) for spilled ones
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(spill_dir, exist_ok=True)
+        # Sessions do not outlive the process, so spill files from a previous run are stale
+        for name in os.listdir(spill_dir):
+            if name.endswith('.bin'):
+                try:
+                    os.remove(os.path.join(spill_dir, name))
+                except OSError:
+                    pass
+
+    def _spill_path(self, key):
+        name = hashlib.sha1('\0'.join(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.bin")
+
+    def _remove_locked(self, key):
+        if key in self._memory:
+            data, _meta = self._memory.pop(key)
+            self._memory_bytes -= len(data)
+        if key in self._disk:
+            size, _meta = self._disk.pop(key)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._spill_path(key))
+            except OSError:
+                pass
+
+    def _evict_locked(self):
+        """Spill least recently used images to disk until memory fits the budget"""
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            key, (data, meta) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            try:
+                with open(self._spill_path(key), 'wb') as f:
+                    f.write(data)
+            except OSError:
+                continue
+            self._disk[key] = (len(data), meta)
+            self._disk_bytes += len(data)
+
+        # Spilled images past the disk budget are dropped for good
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, (size, _meta) = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._spill_path(key))
+            except OSError:
+                pass
+
+    def put(self, session_id, name, data, **metadata):
+        """Store encoded image bytes for a session under a name"""
+        key = (session_id, name)
+        with self._lock:
+            self._remove_locked(key)
+            self._memory[key] = (bytes(data), metadata)
+            self._memory_bytes += len(data)
+            self._evict_locked()
+
+    def get(self, session_id, name):
+        """Return (encoded bytes, metadata) for a session image, or None"""
+        key = (session_id, name)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if key not in self._disk:
+                return None
+            size, meta = self._disk.pop(key)
+            self._disk_bytes -= size
+
+        # Reload a spilled image and make it resident again
+        path = self._spill_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.remove(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if key not in self._memory:
+                self._memory[key] = (data, meta)
+                self._memory_bytes += len(data)
+                self._evict_locked()
+        return data, meta
+
+    def discard(self, session_id, name):
+        """Remove one session image from memory and disk"""
+        with self._lock:
+            self._remove_locked((session_id, name))
+
+    def stats(self):
+        """Return resident and spilled image counts and sizes"""
+        with self._lock:
+            sessions = {key[0] for key in self._memory} | {key[0] for key in self._disk}
+            return {
+                'sessions': len(sessions),
+                'resident_images': len(self._memory),
+                'resident_bytes': self._memory_bytes,
+                'spilled_images': len(self._disk),
+                'spilled_bytes': self._disk_bytes,
+                'max_memory_bytes': self.max_memory_bytes,
+            }
@@ -0,0 +1,101 @@
+"""
+Single-flight coalescing of identical in-flight requests
+Concurrent callers with the same key share one execution and all receive its result.
+If the caller running the execution is cancelled, the callers waiting on it start
+it again instead of failing with it.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+
+
+class _Abandoned(Exception):
+    """Handed to waiters when the call they joined was cancelled by its leader"""
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its outcome with waiters"""
+
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Return (future, is_leader) for a key, registering a new call if none is in flight"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Call fn() once for all concurrent callers with the same key"""
+        future, is_leader = self._join(key)
+        if not is_leader:
+            try:
+                return future.result()
+            except _Abandoned:
+                return self.do(key, fn)
+
+        try:
+            result = fn()
+        except (asyncio.CancelledError, concurrent.futures.CancelledError):
+            self._finish(key, future, error=_Abandoned())
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key, coro_fn):
+        """Await coro_fn() once for all concurrent callers with the same key
+
+        Sync and async callers share the same in-flight table, so a request from
+        the comparison grid can join a call started by a single-item render.
+        """
+        future, is_leader = self._join(key)
+        if not is_leader:
+            try:
+                # Shielded so a cancelled waiter leaves the shared call to the others
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _Abandoned:
+                return await self.do_async(key, coro_fn)
+
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            self._finish(key, future, error=_Abandoned())
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stats(self):
+        """Return executed/coalesced counters and the number of calls in flight"""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
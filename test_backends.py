@@ -0,0 +1,62 @@
+"""
+Tests for recording and replaying model responses
+"""
+
+import asyncio
+
+import pytest
+from google.genai import types
+
+from backends import CassetteMissError, CassetteStore, RecordingBackend, ReplayBackend, request_fingerprint
+
+ROOM = b'room image bytes'
+
+
+def request(prompt="a gray sofa by the window"):
+    return [prompt, types.Part.from_bytes(data=ROOM, mime_type='image/jpeg')]
+
+
+class CountingBackend:
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, model_id, contents):
+        self.calls += 1
+        return f"image {self.calls}".encode()
+
+    async def agenerate(self, model_id, contents):
+        return self.generate(model_id, contents)
+
+
+def test_fingerprint_is_stable_and_covers_every_field():
+    # Recordings on disk are keyed by this value, so it must not change between releases
+    assert request_fingerprint('gemini-test', ['a gray sofa by the window']) == (
+        'a632d63d1bd994f1de6e409cefeab66ff2cd552f7b843e6b6083a6662039691a'
+    )
+    assert request_fingerprint('model', request()) == request_fingerprint('model', tuple(request()))
+    assert request_fingerprint('model', request()) != request_fingerprint('other-model', request())
+    assert request_fingerprint('model', request()) != request_fingerprint('model', request("a lamp"))
+    # Length prefixes keep different splits of the same text apart
+    assert request_fingerprint('model', ['ab', 'c']) != request_fingerprint('model', ['a', 'bc'])
+
+
+def test_recorded_responses_replay_from_a_new_store(tmp_path):
+    inner = CountingBackend()
+    recorder = RecordingBackend(inner, CassetteStore(str(tmp_path)))
+    first = recorder.generate('model', request())
+    second = asyncio.run(recorder.agenerate('model', request("a lamp")))
+
+    replay = ReplayBackend(CassetteStore(str(tmp_path)))
+
+    assert replay.generate('model', request()) == first
+    assert asyncio.run(replay.agenerate('model', request("a lamp"))) == second
+    assert inner.calls == 2
+
+
+def test_unrecorded_request_raises_a_cassette_miss(tmp_path):
+    RecordingBackend(CountingBackend(), CassetteStore(str(tmp_path))).generate('model', request())
+    replay = ReplayBackend(CassetteStore(str(tmp_path)))
+
+    with pytest.raises(CassetteMissError) as excinfo:
+        replay.generate('model', request("a rug"))
+    assert excinfo.value.fingerprint == request_fingerprint('model', request("a rug"))
@@ -0,0 +1,32 @@
+"""
+Tests for headless batch rendering
+"""
+
+import os
+import shutil
+
+from batch_render import BatchRenderer, MANIFEST_NAME, load_completed, plan_jobs
+from catalog import builtin_items, slugify
+from image_fixtures import make_image
+from visualizer import FurnitureVisualizer
+
+
+class ImageBackend:
+    def generate(self, model_id, contents):
+        return make_image()
+
+
+def test_batch_writes_renders_under_catalog_slugs_and_resumes(tmp_path):
+    rooms = tmp_path / 'rooms'
+    rooms.mkdir()
+    shutil.copy('demo_room.png', rooms / 'Living Room.png')
+    items = [item for item in builtin_items() if item['name'] == 'Modern Sofa']
+    jobs = plan_jobs([str(rooms / 'Living Room.png')], items, ['Gray'], ['Fabric'], "by the window")
+    output = tmp_path / 'renders'
+
+    renderer = BatchRenderer(FurnitureVisualizer(backend=ImageBackend()), str(output), workers=1)
+    assert renderer.run(jobs) == (1, 0)
+
+    path = output / slugify('Living Room') / f"{jobs[0]['id']}_{slugify('Modern Sofa')}.png"
+    assert path.read_bytes() == make_image()
+    assert load_completed(os.path.join(output, MANIFEST_NAME)) == {jobs[0]['id']}
@@ -0,0 +1,39 @@
+"""
+Tests for catalog search ranking and index building
+"""
+
+from catalog import Catalog, CatalogStore, builtin_items
+from catalog_index import CatalogIndex
+
+
+def make_index():
+    index = CatalogIndex()
+    index.add('pillows', 'Decor', 'Throw Pillows', ('Decor', 'Boho', 'Cream', 'Cotton'), 'decorative pillows on the sofa')
+    index.add('bench', 'Seating', 'Storage Bench', ('Seating', 'Sofa', 'Oak', 'Wood'), 'a bench for the hallway')
+    index.add('sofa', 'Seating', 'Modern Sofa', ('Seating', 'Modern', 'Gray', 'Fabric'), 'a comfortable sofa')
+    index.finish()
+    return index
+
+
+def test_name_matches_rank_above_attribute_and_description_matches():
+    assert make_index().search('sofa') == (3, ['sofa', 'bench', 'pillows'])
+
+
+def test_prefix_and_typo_matches_keep_field_order():
+    index = make_index()
+    assert index.search('so') == (3, ['sofa', 'bench', 'pillows'])
+    assert index.search('soaf') == (3, ['sofa', 'bench', 'pillows'])
+
+
+def test_failed_index_build_is_reported_and_search_falls_back(tmp_path):
+    source = tmp_path / 'catalog.json'
+    source.write_text('{not json', encoding='utf-8')
+    store = CatalogStore(str(tmp_path / 'catalog.sqlite'))
+    store.replace_items(builtin_items())
+
+    catalog = Catalog(store, source=str(source))
+
+    assert catalog.wait_ready(timeout=5) is False
+    assert isinstance(catalog.error, ValueError)
+    total, items = catalog.search('sofa')
+    assert total > 0 and all('sofa' in item['name'].lower() + item['description'] for item in items)
@@ -0,0 +1,58 @@
+"""
+Tests for the paginated generation history
+"""
+
+from history import GenerationHistory, create_user_tokens
+
+
+def test_pages_are_newest_first_and_per_owner(tmp_path):
+    history = GenerationHistory(str(tmp_path))
+    for number in range(5):
+        history.add('alice', f'alice {number}'.encode(), item=f'sofa {number}', timestamp=number)
+    history.add('bob', b'bob 0', item='lamp')
+
+    first = history.page('alice', page=0, page_size=2)
+    last = history.page('alice', page=2, page_size=2)
+
+    assert [history.image(entry) for entry in first] == [b'alice 4', b'alice 3']
+    assert [history.image(entry) for entry in last] == [b'alice 0']
+    assert history.page('alice', page=3, page_size=2) == []
+    assert history.count('alice') == 5
+    assert [history.image(entry) for entry in history.page('bob')] == [b'bob 0']
+
+
+def test_thumbnail_is_stored_next_to_the_image(tmp_path):
+    history = GenerationHistory(str(tmp_path), thumbnails=lambda data: data[:3])
+    history.add('alice', b'full image')
+
+    entry = history.page('alice')[0]
+
+    assert history.image(entry) == b'full image'
+    assert history.thumbnail(entry) == b'ful'
+
+
+def test_torn_record_is_dropped_on_reopen(tmp_path):
+    history = GenerationHistory(str(tmp_path))
+    history.add('alice', b'kept')
+    history.add('alice', b'torn')
+    with open(history.pack_path, 'r+b') as f:
+        f.truncate(len(b'kept'))
+
+    reopened = GenerationHistory(str(tmp_path))
+
+    assert len(reopened) == 1
+    assert [reopened.image(entry) for entry in reopened.page('alice')] == [b'kept']
+
+
+def test_user_tokens_only_open_ids_the_server_issued(tmp_path, monkeypatch):
+    monkeypatch.delenv('USER_TOKEN_SECRET', raising=False)
+    monkeypatch.setenv('HISTORY_DIR', str(tmp_path))
+    tokens = create_user_tokens()
+    user_id, token = tokens.issue()
+
+    assert tokens.verify(token) == user_id
+    # The key is kept, so links still work after a restart
+    assert create_user_tokens().verify(token) == user_id
+    assert tokens.verify(user_id) is None
+    assert tokens.verify(f"{user_id}x.{token.partition('.')[2]}") is None
+    assert tokens.verify(None) is None
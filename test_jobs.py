@@ -0,0 +1,132 @@
+"""
+Tests for the background render job queue
+"""
+
+import asyncio
+import threading
+import time
+
+import jobs
+from image_fixtures import make_image, make_room
+from jobs import CANCELLED, DONE, FAILED, JobQueue, JobStore
+
+
+def wait_for(queue, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} is still {queue.get(job_id)['status']}")
+
+
+def test_render_receives_the_submitting_session(tmp_path):
+    sessions = []
+
+    def render(room_image, params, on_wait, on_text, session):
+        sessions.append(session)
+        return make_image()
+
+    queue = JobQueue(JobStore(str(tmp_path / 'jobs.sqlite')), render, workers=1)
+    job_id = queue.submit('user-1', make_room(), session='session-1', description="a sofa", placement="left")
+    wait_for(queue, job_id, (DONE,))
+    assert sessions == ['session-1']
+
+
+def test_failed_render_marks_job_failed_and_worker_keeps_running(tmp_path):
+    def render(room_image, params, on_wait, on_text, session):
+        if params['placement'] == 'broken':
+            raise RuntimeError("model exploded")
+        return make_image()
+
+    queue = JobQueue(JobStore(str(tmp_path / 'jobs.sqlite')), render, workers=1)
+    failed = queue.submit('user-1', make_room(), description="a sofa", placement="broken")
+    job = wait_for(queue, failed, (FAILED,))
+    assert job['error_type'] == 'RuntimeError'
+    following = queue.submit('user-1', make_room(), description="a sofa", placement="left")
+    wait_for(queue, following, (DONE,))
+
+
+class BrokenHistory:
+    def add(self, *args, **kwargs):
+        raise RuntimeError("history is broken")
+
+
+def test_unexpected_error_after_render_does_not_kill_worker(tmp_path):
+    def render(room_image, params, on_wait, on_text, session):
+        return make_image()
+
+    queue = JobQueue(JobStore(str(tmp_path / 'jobs.sqlite')), render, workers=1, history=BrokenHistory())
+    first = queue.submit('user-1', make_room(), description="a sofa", placement="left")
+    second = queue.submit('user-1', make_room(), description="a sofa", placement="right")
+    wait_for(queue, first, (DONE,))
+    wait_for(queue, second, (DONE,))
+
+
+def test_worker_survives_a_failed_claim(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'CLAIM_RETRY_SECONDS', 0.01)
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    claim = store.claim
+    failures = []
+
+    def flaky_claim():
+        if not failures:
+            failures.append(1)
+            raise RuntimeError("database is locked")
+        return claim()
+
+    store.claim = flaky_claim
+    queue = JobQueue(store, lambda room_image, params, on_wait, on_text, session: make_image(), workers=1)
+    job_id = queue.submit('user-1', make_room(), description="a sofa", placement="left")
+    wait_for(queue, job_id, (DONE,))
+    assert failures == [1]
+
+
+def test_cancel_queued_job_never_renders_it(tmp_path):
+    release = threading.Event()
+    rendered = []
+
+    def render(room_image, params, on_wait, on_text, session):
+        rendered.append(params['placement'])
+        release.wait(5)
+        return make_image()
+
+    queue = JobQueue(JobStore(str(tmp_path / 'jobs.sqlite')), render, workers=1)
+    running = queue.submit('user-1', make_room(), description="a sofa", placement="first")
+    queued = queue.submit('user-1', make_room(), description="a sofa", placement="second")
+    assert queue.cancel(queued)
+    release.set()
+    wait_for(queue, running, (DONE,))
+    assert queue.get(queued)['status'] == CANCELLED
+    assert rendered == ['first']
+    assert not queue.cancel(running)
+
+
+def test_cancel_running_streamed_job_frees_worker(tmp_path):
+    started = threading.Event()
+    torn_down = threading.Event()
+
+    async def slow_render():
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            torn_down.set()
+            raise
+        return make_image()
+
+    def render(room_image, params, on_wait, on_text, session):
+        if params['placement'] == 'slow':
+            return slow_render()
+        return make_image()
+
+    queue = JobQueue(JobStore(str(tmp_path / 'jobs.sqlite')), render, workers=1)
+    slow = queue.submit('user-1', make_room(), description="a sofa", placement="slow")
+    assert started.wait(5)
+    assert queue.cancel(slow)
+    following = queue.submit('user-1', make_room(), description="a sofa", placement="left")
+    wait_for(queue, following, (DONE,), timeout=2)
+    assert torn_down.is_set()
+    assert queue.get(slow)['status'] == CANCELLED
+    assert queue.result(slow) is None
@@ -0,0 +1,62 @@
+"""
+Tests for per-stage latency metrics and traces
+"""
+
+import json
+import time
+import urllib.request
+
+import pytest
+
+from metrics import Metrics, annotate, start_metrics_server, timed
+
+
+def test_stages_of_a_request_are_collected_into_its_trace(tmp_path):
+    trace_log = tmp_path / 'traces.jsonl'
+    metrics = Metrics(trace_path=str(trace_log))
+    with metrics.trace('render'):
+        with timed('prepare'):
+            time.sleep(0.01)
+        for _ in range(2):
+            with timed('model'):
+                pass
+        annotate(cache='miss', request_bytes=120, response_bytes=4096)
+    # Outside a trace, timing does nothing
+    with timed('prepare'):
+        pass
+
+    trace = json.loads(trace_log.read_text(encoding='utf-8'))
+    assert set(trace['stages']) == {'prepare', 'model'}
+    assert trace['stages']['prepare'] >= 0.01
+    assert trace['cache'] == 'miss'
+    snapshot = metrics.snapshot()
+    assert snapshot['prepare']['count'] == 1
+    assert snapshot['model']['count'] == 2
+    assert snapshot['render_total']['count'] == 1
+
+
+def test_prometheus_output_counts_failed_requests_and_bytes():
+    metrics = Metrics()
+    with metrics.trace('render'):
+        annotate(request_bytes=100)
+    with pytest.raises(RuntimeError):
+        with metrics.trace('render'):
+            raise RuntimeError('model failed')
+
+    text = metrics.render_prometheus()
+    assert 'furniture_stage_seconds_count{stage="render_total"} 2' in text
+    assert 'furniture_requests_total{cache="none",status="error",trace="render"} 1' in text
+    assert 'furniture_request_bytes_total{trace="render"} 100' in text
+
+
+def test_metrics_endpoint_serves_the_prometheus_text():
+    metrics = Metrics()
+    metrics.observe('model', 1.5)
+    server = start_metrics_server(metrics, 0, host='127.0.0.1')
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+    assert 'furniture_stage_seconds_bucket{stage="model",le="2.5"} 1' in body
@@ -0,0 +1,126 @@
+"""
+Tests for circuit breakers and failover in the model router
+"""
+
+import asyncio
+import time
+
+import pytest
+from google.genai import errors, types
+
+from backends import no_image_error
+from model_router import CLOSED, FINAL, HALF_OPEN, OPEN, CircuitBreaker, ModelRouter, ModelUnavailableError
+from retry import NoImageError
+
+
+def unavailable():
+    return errors.ServerError(503, {'error': {'message': 'overloaded'}})
+
+
+def failing(error):
+    def call(model):
+        raise error
+    return call
+
+
+def test_breaker_opens_and_router_fails_over():
+    router = ModelRouter(['best', 'backup'], min_calls=2, error_rate=0.5, cooldown=60)
+    for _ in range(2):
+        with pytest.raises(errors.ServerError):
+            router.call(FINAL, failing(unavailable()))
+
+    assert router.stats()['models']['best']['state'] == OPEN
+    assert router.call(FINAL, lambda model: model) == 'backup'
+    assert router.stats()['failovers'] == 1
+
+
+def test_rejected_prompt_does_not_count_against_a_model():
+    router = ModelRouter(['best'], min_calls=1, error_rate=0.5, cooldown=60)
+    rejected = errors.ClientError(400, {'error': {'message': 'bad prompt'}})
+    with pytest.raises(errors.ClientError):
+        router.call(FINAL, failing(rejected))
+
+    assert router.stats()['models']['best']['state'] == CLOSED
+
+
+def test_refused_prompts_do_not_open_the_breaker():
+    """A safety stop or a text-only answer is the model answering, not failing"""
+    router = ModelRouter(['best', 'backup'], min_calls=2, error_rate=0.5, cooldown=60)
+    blocked = types.GenerateContentResponse(candidates=[types.Candidate(finish_reason=types.FinishReason.IMAGE_SAFETY)])
+    declined = types.GenerateContentResponse(candidates=[types.Candidate(
+        content=types.Content(role='model', parts=[types.Part(text="I can't add that to this room.")]),
+        finish_reason=types.FinishReason.STOP,
+    )])
+    for response in (blocked, declined, blocked):
+        router.record('best', error=no_image_error(response))
+    assert router.stats()['models']['best']['state'] == CLOSED
+
+    for _ in range(3):
+        router.record('best', error=NoImageError('STOP'))
+    assert router.stats()['models']['best']['state'] == OPEN
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(min_calls=1, error_rate=0.5, cooldown=0.01)
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.try_acquire()
+
+    time.sleep(0.02)
+    assert breaker.try_acquire()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.try_acquire()
+
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.try_acquire()
+
+
+def test_failed_trial_reopens_the_breaker():
+    router = ModelRouter(['best'], min_calls=1, error_rate=0.5, cooldown=0.01)
+    router.record('best', error=unavailable())
+    time.sleep(0.02)
+    router.route()
+    router.record('best', error=unavailable())
+
+    with pytest.raises(ModelUnavailableError):
+        router.route()
+    assert router.stats()['models']['best']['opened'] == 2
+
+
+def test_cancelled_trial_hands_the_trial_to_the_next_call():
+    """A trial call cancelled by its caller must not leave the breaker stuck half-open"""
+    router = ModelRouter(['best'], min_calls=1, error_rate=0.5, cooldown=0.01)
+    router.record('best', error=unavailable())
+    time.sleep(0.02)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hanging(model):
+            started.set()
+            await asyncio.Event().wait()
+
+        trial = asyncio.create_task(router.call_async(FINAL, hanging))
+        await started.wait()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(scenario())
+
+    assert router.stats()['models']['best']['state'] == OPEN
+    assert router.call(FINAL, lambda model: model) == 'best'
+    assert router.stats()['models']['best']['state'] == CLOSED
+
+
+def test_interrupted_trial_hands_the_trial_to_the_next_call():
+    router = ModelRouter(['best'], min_calls=1, error_rate=0.5, cooldown=0.01)
+    router.record('best', error=unavailable())
+    time.sleep(0.02)
+
+    with pytest.raises(KeyboardInterrupt):
+        router.call(FINAL, failing(KeyboardInterrupt()))
+
+    assert router.call(FINAL, lambda model: model) == 'best'
+    assert router.stats()['models']['best']['state'] == CLOSED
@@ -0,0 +1,49 @@
+"""
+Tests for encoding display and thumbnail renditions
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from output_encoding import OutputEncoder, Preset
+
+
+def png(size, mode='RGB', color=(200, 10, 10)):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_encoder():
+    return OutputEncoder([Preset('display', 1024, 'WEBP', 80), Preset('thumbnail', 320, 'JPEG', 75)])
+
+
+def test_each_preset_is_downsized_and_encoded_in_its_format():
+    renditions = make_encoder().encode(png((2048, 1536)))
+
+    display, thumbnail = renditions['display'], renditions['thumbnail']
+    assert (display.size, display.mime_type) == ((1024, 768), 'image/webp')
+    assert (thumbnail.size, thumbnail.mime_type) == ((320, 240), 'image/jpeg')
+    for rendition in (display, thumbnail):
+        decoded = Image.open(io.BytesIO(rendition.data))
+        assert (decoded.format, decoded.size) == (rendition.image_format, rendition.size)
+
+
+def test_small_images_are_not_upscaled_and_only_requested_presets_run():
+    renditions = make_encoder().encode(png((200, 100)), ['thumbnail'])
+    assert list(renditions) == ['thumbnail']
+    assert renditions['thumbnail'].size == (200, 100)
+
+
+def test_transparent_image_is_flattened_onto_white_for_jpeg():
+    thumbnail = make_encoder().encode(png((100, 100), 'RGBA', (0, 0, 0, 0)), ['thumbnail'])['thumbnail']
+    decoded = Image.open(io.BytesIO(thumbnail.data))
+    assert decoded.mode == 'RGB'
+    assert min(decoded.getpixel((50, 50))) > 245
+
+
+def test_unknown_output_format_is_rejected():
+    with pytest.raises(ValueError):
+        Preset('display', 1024, 'GIF')
@@ -0,0 +1,70 @@
+"""
+Tests for matching near-duplicate room uploads
+"""
+
+import io
+
+from PIL import Image
+
+from perceptual_hash import SimilarRoomIndex, room_key
+
+
+def load(path):
+    return Image.open(path).convert('RGB')
+
+
+def resaved(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def add(index, key, image, owner='user-1'):
+    index.add_room(key, lambda: image, owner)
+
+
+def test_resaved_room_matches_and_different_photos_do_not():
+    index = SimilarRoomIndex()
+    room = load('demo_room.png')
+    add(index, 'room', room)
+    add(index, 'room-resaved', resaved(room))
+    add(index, 'apple', load('test_apple.png'))
+    add(index, 'apple-inline', load('test_apple_inline.png'))
+    assert index.similar_rooms('room', 'user-1') == ['room-resaved']
+    assert index.similar_rooms('apple', 'user-1') == []
+
+
+def test_renders_are_only_offered_for_the_owners_rooms():
+    index = SimilarRoomIndex()
+    room = load('demo_room.png')
+    add(index, 'room', room, owner='user-1')
+    index.record_render('room', 'request', 'result')
+    add(index, 'room-resaved', resaved(room), owner='user-2')
+    assert index.similar_renders('room-resaved', 'request', 'user-2') == []
+    add(index, 'room-resaved', resaved(room), owner='user-1')
+    assert index.similar_renders('room-resaved', 'request', 'user-1') == ['result']
+    assert index.similar_renders('room-resaved', 'request', None) == []
+
+
+def test_known_room_is_not_decoded_again(tmp_path):
+    path = str(tmp_path / 'rooms.jsonl')
+    room = load('demo_room.png')
+    add(SimilarRoomIndex(path), room_key(b'room'), room)
+    loads = []
+    reopened = SimilarRoomIndex(path)
+    reopened.add_room(room_key(b'room'), lambda: loads.append(1) or room, 'user-2')
+    assert loads == []
+    add(reopened, 'room-resaved', resaved(room), owner='user-2')
+    assert SimilarRoomIndex(path).similar_rooms('room-resaved', 'user-2') == [room_key(b'room')]
+
+
+def test_room_added_after_a_lookup_is_matched_next_time():
+    index = SimilarRoomIndex()
+    room = load('demo_room.png')
+    add(index, 'room', room)
+    assert index.similar_rooms('room', 'user-1') == []
+    # Another user's copy neither shows up nor invalidates this user's rooms
+    add(index, 'room-copy', resaved(room), owner='user-2')
+    assert index.similar_rooms('room', 'user-1') == []
+    add(index, 'room-resaved', resaved(room))
+    assert index.similar_rooms('room', 'user-1') == ['room-resaved']
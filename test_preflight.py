@@ -0,0 +1,68 @@
+"""
+Tests for the pre-flight checks of room images
+"""
+
+import io
+import struct
+import zlib
+
+from PIL import Image, ImageFilter
+
+import preflight
+from preflight import Preflight
+
+
+def png_header(width, height):
+    """A PNG that declares its size but carries no usable pixel data"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    return b'\x89PNG\r\n\x1a\n' + header + chunk(b'IDAT', zlib.compress(b'\0' * 64)) + chunk(b'IEND', b'')
+
+
+def encode(image, image_format='JPEG'):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def room_photo():
+    return Image.open('demo_room.png').convert('RGB')
+
+
+def test_pixel_cap_rejects_from_the_header_alone(monkeypatch):
+    def decode(*args):
+        raise AssertionError("pixels were decoded")
+    monkeypatch.setattr(preflight, '_sample_metrics', decode)
+    checks = Preflight()
+
+    # Above the cap, and far above it where Pillow itself refuses the image
+    for width, height in ((9000, 9000), (100000, 100000)):
+        report = checks.check(png_header(width, height))
+        assert not report.ok
+        assert 'pixels' in report.problems[0]
+
+
+def test_blurred_photo_is_rejected_and_sharp_one_passes():
+    checks = Preflight()
+    sharp = checks.check(encode(room_photo()))
+    blurred = checks.check(encode(room_photo().filter(ImageFilter.GaussianBlur(12))))
+
+    assert sharp.ok and sharp.metrics['blur'] > preflight.DEFAULT_BLUR_WARN
+    assert not blurred.ok and blurred.metrics['blur'] < preflight.DEFAULT_BLUR_REJECT
+    assert 'blurry' in blurred.problems[0]
+
+
+def test_header_only_check_skips_the_pixel_metrics():
+    blurred = encode(room_photo().filter(ImageFilter.GaussianBlur(12)))
+    report = Preflight().check(blurred, pixels=False)
+
+    assert report.ok
+    assert 'blur' not in report.metrics
+    assert report.metrics['format'] == 'JPEG'
+
+
+def test_small_and_unreadable_images_are_rejected():
+    checks = Preflight()
+    assert 'at least' in checks.check(encode(room_photo().resize((200, 150)))).problems[0]
+    assert checks.check(b'not an image').problems == [preflight.UNREADABLE]
@@ -0,0 +1,40 @@
+"""
+Tests for preparing room images for upload
+"""
+
+import io
+
+from PIL import Image
+
+from preprocessing import preprocess_room_image
+
+
+def test_photo_is_oriented_downsized_and_stripped():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated: stored landscape, shown portrait
+    exif[0x010F] = 'Camera Maker'
+    buffer = io.BytesIO()
+    Image.new('RGB', (3000, 2000), (120, 90, 60)).save(buffer, format='JPEG', exif=exif, quality=95)
+
+    prepared = preprocess_room_image(buffer.getvalue(), max_pixels=600_000, image_format='JPEG', quality=80)
+
+    width, height = prepared.size
+    assert height > width
+    assert width * height <= 600_000
+    assert prepared.original_size == (2000, 3000)
+    assert prepared.mime_type == 'image/jpeg'
+    encoded = Image.open(io.BytesIO(prepared.data))
+    assert encoded.size == prepared.size
+    assert not encoded.getexif()
+    assert prepared.bytes_saved > 0
+
+
+def test_small_transparent_image_keeps_its_size_and_loses_alpha():
+    buffer = io.BytesIO()
+    Image.new('RGBA', (400, 300), (10, 20, 30, 128)).save(buffer, format='PNG')
+
+    prepared = preprocess_room_image(buffer.getvalue(), max_pixels=1_000_000, image_format='WEBP', quality=80)
+
+    assert prepared.size == (400, 300)
+    assert prepared.mime_type == 'image/webp'
+    assert prepared.image.mode == 'RGB'
@@ -0,0 +1,58 @@
+"""
+Tests for the local quick preview compositor
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from quick_preview import QuickPreview, SpriteLibrary, describe_position
+
+SOFA = {'sku': 'SOFA1', 'category': 'Seating', 'color': 'Gray'}
+
+
+def room_bytes(width=400, height=300):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (230, 230, 230)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_item_is_drawn_standing_on_the_chosen_spot():
+    preview = QuickPreview(SpriteLibrary())
+    room = room_bytes()
+    composed = preview.compose(room, SOFA, x=0.5, y=0.8, scale=0.3)
+
+    assert composed.shape == (300, 400, 3)
+    changed = np.argwhere((composed != 230).any(axis=2))
+    top, left = changed.min(axis=0)
+    bottom, right = changed.max(axis=0)
+    # Roughly centred on x and resting near y, with the room untouched elsewhere
+    assert left < 200 < right
+    assert 0.7 * 300 < bottom < 0.9 * 300
+    assert (composed[:top] == 230).all()
+
+
+def test_item_off_the_edge_leaves_the_room_unchanged():
+    preview = QuickPreview(SpriteLibrary())
+    composed = preview.compose(room_bytes(), SOFA, x=2.0, y=0.8, scale=0.3)
+    assert (composed == 230).all()
+
+
+def test_cutout_from_the_sprite_directory_is_used(tmp_path):
+    cutout = Image.new('RGBA', (40, 20), (0, 0, 0, 0))
+    cutout.paste((255, 0, 0, 255), (10, 5, 30, 20))
+    cutout.save(tmp_path / 'SOFA1.png')
+    library = SpriteLibrary(str(tmp_path))
+
+    _key, sprite = library.sprite(SOFA)
+
+    # Transparent padding is cropped so the base touches the floor
+    assert sprite.size == (20, 15)
+    assert QuickPreview(library).compose(room_bytes(), SOFA, scale=0.2)[..., 0].max() == 255
+
+
+def test_position_is_described_for_the_placement_instructions():
+    assert describe_position(0.2, 0.9, 0.6) == (
+        "on the left side of the room, near the camera, large relative to the room"
+    )
@@ -0,0 +1,60 @@
+"""
+Tests for the token-bucket admission controller
+"""
+
+import threading
+import time
+
+import pytest
+
+from rate_limiter import AdmissionController, QueueFullError
+
+
+def test_burst_is_admitted_then_the_queue_fills():
+    limiter = AdmissionController(rate_per_minute=1, burst=2, max_queue=1, max_wait_seconds=600)
+    limiter.acquire()
+    limiter.acquire()
+    assert not limiter.try_acquire()
+
+    waiter = threading.Thread(target=limiter.acquire, daemon=True)
+    waiter.start()
+    while limiter.stats()['queued'] == 0:
+        time.sleep(0.001)
+
+    with pytest.raises(QueueFullError) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.queued == 1
+    assert limiter.stats()['rejected'] == 1
+
+
+def test_request_is_rejected_when_the_wait_is_too_long():
+    limiter = AdmissionController(rate_per_minute=1, burst=1, max_queue=10, max_wait_seconds=5)
+    limiter.acquire()
+
+    with pytest.raises(QueueFullError):
+        limiter.acquire()
+    assert limiter.stats()['queued'] == 0
+
+
+def test_queued_requests_are_admitted_in_order():
+    limiter = AdmissionController(rate_per_minute=600, burst=1, max_queue=10, max_wait_seconds=60)
+    limiter.acquire()
+    admitted = []
+    positions = {}
+
+    def waiter(name):
+        limiter.acquire(on_wait=lambda position, _wait: positions.setdefault(name, position))
+        admitted.append(name)
+
+    threads = []
+    for name in ('first', 'second', 'third'):
+        thread = threading.Thread(target=waiter, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while limiter.stats()['queued'] < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert admitted == ['first', 'second', 'third']
+    assert positions == {'first': 1, 'second': 2, 'third': 3}
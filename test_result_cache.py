@@ -0,0 +1,38 @@
+"""
+Tests for the on-disk LRU result cache
+"""
+
+from result_cache import ResultCache
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    """A read keeps an entry alive; the oldest untouched one goes when the budget is exceeded"""
+    cache = ResultCache(str(tmp_path), max_bytes=250)
+    cache.put('aa01', b'a' * 100)
+    cache.put('bb02', b'b' * 100)
+    assert cache.get('aa01') == b'a' * 100
+
+    cache.put('cc03', b'c' * 100)
+
+    assert cache.get('bb02') is None
+    assert cache.get('aa01') == b'a' * 100
+    assert cache.get('cc03') == b'c' * 100
+    assert not (tmp_path / 'bb' / 'bb02.bin').exists()
+
+
+def test_entries_survive_a_restart(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=1000)
+    cache.put('aa01', b'image')
+
+    reopened = ResultCache(str(tmp_path), max_bytes=1000)
+
+    assert reopened.get('aa01') == b'image'
+    assert reopened.stats()['hits'] == 1
+
+
+def test_oversized_image_is_not_stored(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10)
+    cache.put('aa01', b'x' * 11)
+
+    assert cache.get('aa01') is None
+    assert cache.stats()['misses'] == 1
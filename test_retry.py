@@ -0,0 +1,183 @@
+"""
+Tests for retrying and hedging model calls
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+
+import httpx
+import pytest
+from google.genai import errors
+
+import retry
+from retry import HedgePolicy, NoImageError, RetryPolicy, is_retryable
+
+
+def api_error(code):
+    error_type = errors.ServerError if code >= 500 else errors.ClientError
+    return error_type(code, {'error': {'code': code, 'message': 'failed'}})
+
+
+def failing(error, then=None, times=None):
+    """fn() that raises error, or only for the first `times` calls and then returns `then`"""
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if times is None or len(calls) <= times:
+            raise error
+        return then
+    return call, calls
+
+
+@pytest.mark.parametrize('error, expected', [
+    (api_error(429), True),
+    (api_error(503), True),
+    (api_error(400), False),
+    (api_error(403), False),
+    (httpx.ConnectTimeout('slow'), True),
+    (NoImageError('STOP'), True),
+    (NoImageError('SAFETY'), False),
+    (NoImageError('STOP', "I can't render that."), False),
+    (ValueError('bug'), False),
+])
+def test_retry_classification(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_backoff_stays_within_the_capped_exponential_range():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    for attempt, ceiling in enumerate([1.0, 2.0, 4.0, 5.0, 5.0]):
+        delays = [policy.backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        # Full jitter spreads retries over the whole range
+        assert max(delays) > ceiling / 2 > min(delays)
+
+
+def test_transient_errors_are_retried_until_the_attempt_cap():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.0)
+    call, calls = failing(api_error(503))
+    with pytest.raises(errors.ServerError):
+        policy.call(call)
+    assert len(calls) == 3
+    assert policy.stats() == {'retries': 2, 'give_ups': 1}
+
+
+def test_success_after_transient_errors_is_returned():
+    policy = RetryPolicy(max_attempts=4, base_delay=0.0)
+    call, calls = failing(api_error(503), then=b'image', times=2)
+    assert policy.call(call) == b'image'
+    assert len(calls) == 3
+
+
+def test_permanent_errors_are_not_retried():
+    policy = RetryPolicy(max_attempts=4, base_delay=0.0)
+    call, calls = failing(api_error(400))
+    with pytest.raises(errors.ClientError):
+        policy.call(call)
+    assert len(calls) == 1
+
+
+def test_a_retry_past_the_deadline_is_not_attempted(monkeypatch):
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: high)
+    policy = RetryPolicy(max_attempts=4, base_delay=10.0, deadline=5.0)
+    call, calls = failing(api_error(503))
+    started = time.monotonic()
+    with pytest.raises(errors.ServerError):
+        policy.call(call)
+    assert len(calls) == 1
+    assert time.monotonic() - started < 1
+
+
+def test_async_retry_follows_the_same_rules():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.0)
+    attempts = itertools.count(1)
+
+    async def call():
+        if next(attempts) < 3:
+            raise httpx.ReadTimeout('slow')
+        return b'image'
+
+    assert asyncio.run(policy.call_async(call)) == b'image'
+    assert policy.stats() == {'retries': 2, 'give_ups': 0}
+
+
+def primed_hedge(max_ratio=1.0):
+    """Hedge policy whose threshold is about 10 ms"""
+    policy = HedgePolicy(quantile=0.5, min_samples=5, max_ratio=max_ratio)
+    for _ in range(5):
+        policy.latency.record(0.01)
+    return policy
+
+
+def test_slow_call_is_hedged_and_the_faster_backup_wins():
+    policy = primed_hedge()
+    release = threading.Event()
+    attempts = itertools.count()
+
+    def call():
+        if next(attempts) == 0:
+            release.wait(5)
+            return 'primary'
+        return 'backup'
+
+    try:
+        assert policy.call(call) == 'backup'
+    finally:
+        release.set()
+    assert policy.stats()['hedge_wins'] == 1
+
+
+def test_hedges_stay_within_their_budget():
+    policy = primed_hedge(max_ratio=0.0)
+    attempts = itertools.count()
+
+    def call():
+        next(attempts)
+        time.sleep(0.05)
+        return 'primary'
+
+    assert policy.call(call) == 'primary'
+    assert next(attempts) == 1
+    assert policy.stats()['hedged'] == 0
+
+
+def test_async_hedge_cancels_the_losing_request():
+    policy = primed_hedge()
+    attempts = itertools.count()
+    cancelled = []
+
+    async def call():
+        if next(attempts) == 0:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append('primary')
+                raise
+            return 'primary'
+        return 'backup'
+
+    async def scenario():
+        result = await policy.call_async(call)
+        # Let the cancelled primary unwind
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == 'backup'
+    assert cancelled == ['primary']
+    assert policy.stats()['hedge_wins'] == 1
+
+
+def test_hedge_is_skipped_when_no_rate_limiter_token_is_free():
+    policy = primed_hedge()
+    attempts = itertools.count()
+
+    def call():
+        next(attempts)
+        time.sleep(0.05)
+        return 'primary'
+
+    assert policy.call(call, can_hedge=lambda: False) == 'primary'
+    assert next(attempts) == 1
@@ -0,0 +1,44 @@
+"""
+Tests for the bounded per-session image store
+"""
+
+import os
+
+from session_store import SessionImageStore
+
+
+def test_least_recent_images_spill_to_disk_and_come_back(tmp_path):
+    store = SessionImageStore(str(tmp_path), max_memory_bytes=250, max_disk_bytes=1000)
+    store.put('a', 'room', b'r' * 100, format='JPEG')
+    store.put('b', 'room', b's' * 100, format='PNG')
+    store.get('a', 'room')
+    store.put('a', 'result', b't' * 100)
+
+    stats = store.stats()
+    assert stats['resident_bytes'] <= 250
+    assert (stats['resident_images'], stats['spilled_images']) == (2, 1)
+    assert len(os.listdir(tmp_path)) == 1
+
+    # The spilled image is read back with its metadata and made resident again
+    assert store.get('b', 'room') == (b's' * 100, {'format': 'PNG'})
+    assert store.stats()['resident_bytes'] <= 250
+
+
+def test_images_past_the_disk_budget_are_dropped(tmp_path):
+    store = SessionImageStore(str(tmp_path), max_memory_bytes=100, max_disk_bytes=100)
+    for session in ('a', 'b', 'c'):
+        store.put(session, 'room', session.encode() * 100)
+
+    assert store.get('a', 'room') is None
+    assert store.get('c', 'room') == (b'c' * 100, {})
+    assert store.stats()['spilled_bytes'] <= 100
+
+
+def test_discard_removes_a_spilled_image(tmp_path):
+    store = SessionImageStore(str(tmp_path), max_memory_bytes=100)
+    store.put('a', 'room', b'r' * 100)
+    store.put('a', 'result', b't' * 100)
+    store.discard('a', 'room')
+
+    assert store.get('a', 'room') is None
+    assert os.listdir(tmp_path) == []
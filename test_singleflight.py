@@ -0,0 +1,66 @@
+"""
+Tests for single-flight coalescing when callers are cancelled
+"""
+
+import asyncio
+import threading
+
+from singleflight import SingleFlight
+
+
+def test_cancelled_waiter_leaves_shared_call_to_others():
+    """Cancelling one of two coalesced waiters must not cancel the call they share"""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    sync_result = []
+
+    async def slow_call():
+        started.set()
+        await asyncio.to_thread(release.wait)
+        return b'image'
+
+    def sync_waiter():
+        sync_result.append(flight.do('key', lambda: b'not called'))
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do_async('key', slow_call))
+        await asyncio.to_thread(started.wait)
+        waiter = asyncio.create_task(flight.do_async('key', slow_call))
+        thread = threading.Thread(target=sync_waiter)
+        thread.start()
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        result = await leader
+        await asyncio.to_thread(thread.join)
+        return waiter, result
+
+    waiter, result = asyncio.run(scenario())
+    assert waiter.cancelled()
+    assert result == b'image'
+    assert sync_result == [b'image']
+    assert flight.stats() == {'executed': 1, 'coalesced': 2, 'in_flight': 0}
+
+
+def test_cancelled_leader_hands_call_to_waiter():
+    """A waiter restarts the call when the leader running it is cancelled"""
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.1 if len(calls) == 1 else 0)
+        return len(calls)
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do_async('key', call))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flight.do_async('key', call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(scenario()) == 2
+    assert flight.stats()['in_flight'] == 0
@@ -0,0 +1,148 @@
+"""
+Tests for sending uploaded room references and falling back to inline images
+"""
+
+import inspect
+import io
+import threading
+
+import pytest
+from google.genai import errors, types
+
+from furnish_chain import FurnishChain
+from file_handles import FileHandleCache, LocalFileService, OwnedFileHandles
+from image_fixtures import make_image, make_room
+from perceptual_hash import SimilarRoomIndex
+from rate_limiter import AdmissionController
+from preprocessing import preprocess_room_image
+from result_cache import ResultCache
+from visualizer import FurnitureVisualizer
+
+
+class ReferenceRejectingBackend:
+    """Fails every request that references an uploaded file with a given status code"""
+
+    def __init__(self, code):
+        self.code = code
+        self.requests = []
+
+    def generate(self, model_id, contents):
+        by_reference = any(isinstance(content, types.Part) and content.file_data is not None for content in contents)
+        self.requests.append('reference' if by_reference else 'inline')
+        if by_reference:
+            raise errors.ClientError(self.code, {'error': {'code': self.code, 'message': 'rejected', 'status': 'REJECTED'}})
+        return make_image()
+
+
+def make_visualizer(code):
+    handles = FileHandleCache(LocalFileService())
+    backend = ReferenceRejectingBackend(code)
+    return FurnitureVisualizer(backend=backend, file_handles=handles), backend, handles
+
+
+def test_rejected_reference_falls_back_inline():
+    visualizer, backend, handles = make_visualizer(404)
+    assert visualizer.render_image_bytes(make_room(), "a gray sofa", "by the window") == make_image()
+    assert backend.requests == ['reference', 'inline']
+    assert handles.stats()['handles'] == 0
+
+
+def test_quota_error_keeps_reference_and_is_not_sent_inline():
+    visualizer, backend, handles = make_visualizer(429)
+    with pytest.raises(errors.ClientError):
+        visualizer.render_image_bytes(make_room(), "a gray sofa", "by the window")
+    assert backend.requests == ['reference']
+    assert handles.stats()['handles'] == 1
+
+
+class InlineOnlyBackend:
+    def generate(self, model_id, contents):
+        return make_image()
+
+
+def test_room_upload_is_owned_by_the_rendering_session():
+    """A session's upload is deleted once that session releases it"""
+    service = LocalFileService()
+    handles = FileHandleCache(service)
+    visualizer = FurnitureVisualizer(backend=InlineOnlyBackend(), file_handles=handles)
+    visualizer.render_image_bytes(make_room(), "a gray sofa", "by the window", owner='session-1')
+    assert len(service.files) == 1
+    handles.release_owner('session-2')
+    assert len(service.files) == 1
+    handles.release_owner('session-1')
+    assert service.files == {}
+
+
+def test_session_handles_accept_an_explicit_owner():
+    """The per-session handles take the same owner argument as the shared cache"""
+    service = LocalFileService()
+    handles = FileHandleCache(service)
+    visualizer = FurnitureVisualizer(backend=InlineOnlyBackend(), file_handles=OwnedFileHandles(handles, 'session-1'))
+    visualizer.render_image_bytes(make_room(), "a gray sofa", "by the window", owner='session-2')
+    visualizer.render_image_bytes(make_room(), "a gray sofa", "in the corner")
+    handles.release_owner('session-2')
+    assert len(service.files) == 1
+    handles.release_owner('session-1')
+    assert service.files == {}
+
+
+def test_similar_render_lookup_stays_out_of_cache_stats(tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'))
+    visualizer = FurnitureVisualizer(backend=InlineOnlyBackend(), cache=cache, rooms=SimilarRoomIndex())
+    with open('demo_room.png', 'rb') as f:
+        room = preprocess_room_image(f.read())
+    visualizer.render_image_bytes(room, "a gray sofa", "by the window")
+    # The same room re-encoded, as a screenshot or re-save would be
+    buffer = io.BytesIO()
+    room.image.save(buffer, format='JPEG', quality=70)
+    resaved = preprocess_room_image(buffer.getvalue())
+    visualizer.find_similar_render(room, "a gray sofa", "by the window", owner='user-1')
+    before = (cache.hits, cache.misses)
+    assert visualizer.find_similar_render(resaved, "a gray sofa", "by the window", owner='user-1') == make_image()
+    assert visualizer.find_similar_render(resaved, "a gray sofa", "by the window", owner='user-2') is None
+    assert (cache.hits, cache.misses) == before
+
+
+class AsyncBackend(InlineOnlyBackend):
+    async def agenerate(self, model_id, contents):
+        return make_image()
+
+
+def test_comparison_reports_queued_items_on_the_calling_thread():
+    limiter = AdmissionController(rate_per_minute=600, burst=1, max_queue=10, max_wait_seconds=60)
+    visualizer = FurnitureVisualizer(backend=AsyncBackend(), limiter=limiter)
+    waits = []
+
+    def on_wait(name, position, estimated_wait):
+        waits.append((name, position, threading.current_thread()))
+
+    items = [(name, f"a {name}", "by the window") for name in ('sofa', 'lamp', 'rug')]
+    results = list(visualizer.render_many(make_room(), items, on_wait=on_wait))
+
+    assert sorted(name for name, image_data, error in results if image_data == make_image()) == ['lamp', 'rug', 'sofa']
+    assert waits and all(position >= 1 for _name, position, _thread in waits)
+    assert {thread for _name, _position, thread in waits} == {threading.current_thread()}
+
+
+def test_room_plan_reports_which_step_is_queued(tmp_path):
+    limiter = AdmissionController(rate_per_minute=600, burst=1, max_queue=10, max_wait_seconds=60)
+    visualizer = FurnitureVisualizer(backend=InlineOnlyBackend(), limiter=limiter)
+    chain = FurnishChain(visualizer, ResultCache(str(tmp_path)))
+    waits = []
+
+    results = chain.render(make_room(), [("a sofa", "left"), ("a lamp", "right")],
+                           on_wait=lambda index, position, estimated_wait: waits.append((index, position)))
+
+    assert len(results) == 2
+    assert waits and {index for index, _position in waits} == {1}
+
+
+def test_render_variants_take_the_same_keyword_only_options():
+    """A callback can never land in the tier parameter of one variant but not the other"""
+    def options(method):
+        parameters = inspect.signature(method).parameters.values()
+        return [parameter.name for parameter in parameters if parameter.kind == parameter.KEYWORD_ONLY]
+
+    assert options(FurnitureVisualizer.generate_image_bytes) == ['on_wait', 'tier']
+    assert options(FurnitureVisualizer.render_image_bytes) == ['on_wait', 'tier', 'owner']
+    assert options(FurnitureVisualizer.agenerate_image_bytes) == ['on_wait', 'tier', 'on_text', 'owner']
@@ -0,0 +1,561 @@
+"""
+Core engine of the Furniture Visualizer
+FurnitureVisualizer wraps the Gemini client with caching, request coalescing,
+rate limiting and retries, and is shared by the Streamlit app and headless scripts
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import logging
+import os
+import queue
+from PIL import Image
+from result_cache import ResultCache, image_cache_bytes, make_cache_key
+from preprocessing import PreparedImage
+from async_runner import submit
+from gemini_client import create_client
+from model_router import FINAL, configured_models
+from rate_limiter import AdmissionController
+from retry import HedgePolicy, RetryPolicy
+from metrics import Metrics, annotate, start_metrics_server, timed
+from backends import CassetteStore, GeminiBackend, RecordingBackend, ReplayBackend
+from file_handles import FileHandleCache, GeminiFileService
+
+logger = logging.getLogger(__name__)
+
+# Status codes of a rejected file reference (bad, inaccessible or expired file);
+# quota errors (429) and the rest go to the retry policy instead
+FILE_REFERENCE_ERRORS = (400, 403, 404)
+
+# How often render_many passes queue updates to the caller while results are pending
+WAIT_POLL_SECONDS = 0.25
+
+
+class MissingApiKeyError(Exception):
+    """Raised when no Gemini API key is configured"""
+
+    def __init__(self):
+        super().__init__("Please set your GEMINI_API_KEY in the .env file")
+
+
+class FurnitureVisualizer:
+    def __init__(self, cache=None, client=None, flight=None, limiter=None, retry=None, hedge=None,
+                 on_error=None, backend=None, metrics=None, file_handles=None, rooms=None, router=None,
+                 preflight=None):
+        self.backend = backend if backend is not None else create_backend(client)
+        # Results are keyed by the best configured model; a router may send requests elsewhere
+        self.router = router
+        self.model_id = router.primary if router is not None else configured_models()[0]
+        self.cache = cache
+        self.flight = flight
+        self.limiter = limiter
+        self.retry = retry
+        self.hedge = hedge
+        self.on_error = on_error or self._log_error
+        self.metrics = metrics
+        self.file_handles = file_handles
+        self.rooms = rooms
+        self.preflight = preflight
+    
+    def build_prompt(self, furniture_description, placement_instruction):
+        """Build the model prompt for a furniture placement"""
+        return f"""
+        Take this room image and add {furniture_description} to it. 
+        
+        Placement instruction: {placement_instruction}
+        
+        Requirements:
+        - Make the furniture look realistic and properly scaled for the room
+        - Ensure proper lighting and shadows that match the room's lighting
+        - The furniture should blend naturally with the existing room decor
+        - Maintain the original room's perspective and style
+        - Make it look like a professional interior design visualization
+        - Keep the original room elements intact, only add the new furniture
+        
+        Generate a photorealistic image showing how this furniture would look in the room.
+        """
+    
+    def generate_furniture_visualization(self, room_image, furniture_description, placement_instruction, *,
+                                         on_wait=None, tier=FINAL):
+        """Generate a visualization of furniture placed in the room"""
+        image_data = self.generate_image_bytes(
+            room_image, furniture_description, placement_instruction, on_wait=on_wait, tier=tier
+        )
+        if image_data is None:
+            return None
+        with self._stage('decode'):
+            image = Image.open(io.BytesIO(image_data))
+            image.load()
+        return image
+    
+    def generate_image_bytes(self, room_image, furniture_description, placement_instruction, *, on_wait=None,
+                             tier=FINAL):
+        """Generate a visualization and return the encoded image bytes
+        
+        Errors are passed to on_error and reported as None.
+        """
+        try:
+            return self.render_image_bytes(
+                room_image, furniture_description, placement_instruction, on_wait=on_wait, tier=tier
+            )
+        except Exception as e:
+            self.on_error(e)
+            return None
+    
+    def render_image_bytes(self, room_image, furniture_description, placement_instruction, *, on_wait=None,
+                           tier=FINAL, owner=None):
+        """Generate a visualization and return the encoded image bytes, raising on failure
+        
+        on_wait(position, estimated_wait) is called while the request waits in
+        the admission queue. tier ('final' or 'draft') selects the model when a
+        router is configured. owner is the session the room upload is kept for.
+        """
+        with self._trace():
+            cache_key, contents, model_id = self._prepare_request(
+                room_image, furniture_description, placement_instruction, tier
+            )
+            
+            # Serve repeated requests from the shared result cache
+            cached = self._cache_lookup(cache_key)
+            if cached is not None:
+                return cached
+            
+            # Turn away unusable rooms before paying for a model call
+            self._check_room(room_image)
+            
+            # Identical requests already in flight share one model call
+            if self.flight is not None:
+                annotate(cache='coalesced')
+                image_data = self.flight.do(
+                    cache_key, lambda: self._call_model(cache_key, contents, model_id, tier, on_wait, owner)
+                )
+            else:
+                image_data = self._call_model(cache_key, contents, model_id, tier, on_wait, owner)
+            annotate(response_bytes=len(image_data))
+            self._remember_render(room_image, contents[0], cache_key, model_id)
+            return image_data
+    
+    async def agenerate_image_bytes(self, room_image, furniture_description, placement_instruction, *,
+                                    on_wait=None, tier=FINAL, on_text=None, owner=None):
+        """Async variant of render_image_bytes built on the client's aio interface
+        
+        With on_text, the request is streamed and on_text(text) receives the
+        model's text so far as it arrives. Cancelling the task running this
+        coroutine tears down the request in flight.
+        """
+        with self._trace():
+            cache_key, contents, model_id = self._prepare_request(
+                room_image, furniture_description, placement_instruction, tier
+            )
+            
+            cached = self._cache_lookup(cache_key)
+            if cached is not None:
+                return cached
+            
+            await asyncio.to_thread(self._check_room, room_image)
+            
+            if self.flight is not None:
+                annotate(cache='coalesced')
+                image_data = await self.flight.do_async(
+                    cache_key, lambda: self._acall_model(cache_key, contents, model_id, tier, on_wait, on_text, owner)
+                )
+            else:
+                image_data = await self._acall_model(cache_key, contents, model_id, tier, on_wait, on_text, owner)
+            annotate(response_bytes=len(image_data))
+            await asyncio.to_thread(self._remember_render, room_image, contents[0], cache_key, model_id)
+            return image_data
+    
+    def find_similar_render(self, room_image, furniture_description, placement_instruction, *, tier=FINAL,
+                            owner=None):
+        """Return an earlier render of the same request for a near-duplicate room, or None
+        
+        Matches come from other uploads by the same owner whose perceptual hash is
+        close to this room's, e.g. the same photo re-saved, cropped slightly or
+        taken as a screenshot.
+        """
+        if self.rooms is None or self.cache is None or owner is None:
+            return None
+        from perceptual_hash import request_key
+        with self._stage('room_match'):
+            key = self._index_room(room_image, owner)
+            prompt = self.build_prompt(furniture_description, placement_instruction)
+            request = request_key(prompt, self._planned_model(tier))
+            for result_key in self.rooms.similar_renders(key, request, owner):
+                # Offering an earlier render is not a request, so it stays out of the hit rate
+                image_data = self.cache.get(result_key, counted=False)
+                if image_data is not None:
+                    return image_data
+        return None
+    
+    def _remember_render(self, room_image, prompt, cache_key, model_id):
+        """Record a cached render under the room's fingerprint for near-duplicate reuse"""
+        if self.rooms is None or self.cache is None:
+            return
+        from perceptual_hash import request_key
+        key = self._index_room(room_image)
+        self.rooms.record_render(key, request_key(prompt, model_id), cache_key)
+    
+    def _index_room(self, room_image, owner=None):
+        """Add a room to the room index and return its key; pixels are only decoded for new rooms"""
+        from perceptual_hash import room_key
+        room_bytes, _ = self._room_payload(room_image)
+        key = room_key(room_bytes)
+        self.rooms.add_room(key, lambda: self._room_pixels(room_image), owner)
+        return key
+    
+    def _check_room(self, room_image):
+        """Raise PreflightError if the room fails the pre-flight checks"""
+        if self.preflight is None:
+            return
+        with timed('preflight'):
+            report = self.preflight.enforce(room_image)
+        for warning in report.warnings:
+            logger.info("Pre-flight warning: %s", warning)
+    
+    def _planned_model(self, tier):
+        """Model a request of this tier is expected to run on, which keys its cached result"""
+        return self.router.planned(tier) if self.router is not None else self.model_id
+    
+    def _room_pixels(self, room_image):
+        return room_image.image if isinstance(room_image, PreparedImage) else room_image
+    
+    def _trace(self):
+        """Collect the stages of one render into a trace when metrics are enabled"""
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.trace('render')
+    
+    def _stage(self, stage):
+        """Time a stage outside of a render trace when metrics are enabled"""
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.stage(stage)
+    
+    def _cache_lookup(self, cache_key):
+        """Return the cached image bytes for a request, or None"""
+        if self.cache is None:
+            return None
+        with timed('cache_lookup'):
+            cached = self.cache.get(cache_key)
+        if cached is not None:
+            annotate(cache='hit', response_bytes=len(cached))
+        return cached
+    
+    def _use_room_handle(self, contents, owner=None):
+        """Swap the inline room image for an uploaded file reference when possible
+        
+        Returns (contents to send, inline contents to fall back to or None). An
+        upload made for an owner is deleted when that session releases it.
+        """
+        if self.file_handles is None:
+            return contents, None
+        from google.genai import types
+        for index, content in enumerate(contents):
+            if isinstance(content, types.Part) and content.inline_data is not None:
+                with timed('upload'):
+                    data, mime_type = content.inline_data.data, content.inline_data.mime_type
+                    handle_part = self.file_handles.part_for(data, mime_type, owner=owner)
+                if handle_part is None:
+                    return contents, None
+                annotate(request_bytes=sum(len(item.encode('utf-8')) for item in contents if isinstance(item, str)))
+                return contents[:index] + [handle_part] + contents[index + 1:], contents
+        return contents, None
+    
+    def _call_model(self, cache_key, contents, model_id, tier=FINAL, on_wait=None, owner=None):
+        """Generate an image with routing, retries and hedging, then cache it"""
+        annotate(cache='miss')
+        contents, inline_contents = self._use_room_handle(contents, owner)
+        served = set()
+        
+        def send(model):
+            served.add(model)
+            return self._send(model, contents, inline_contents)
+        
+        def routed():
+            # Routed per call, so a retry moves on once a failing model's breaker opens
+            if self.router is not None:
+                return self.router.call(tier, send)
+            return send(model_id)
+        
+        def attempt():
+            # Every attempt is a separate API call and needs its own slot
+            if self.limiter is not None:
+                with timed('queue'):
+                    self.limiter.acquire(on_wait)
+            if self.hedge is not None:
+                return self.hedge.call(routed, can_hedge=self._can_hedge)
+            return routed()
+        
+        image_data = self.retry.call(attempt) if self.retry is not None else attempt()
+        self._store_result(cache_key, image_data, model_id, served)
+        return image_data
+    
+    async def _acall_model(self, cache_key, contents, model_id, tier=FINAL, on_wait=None, on_text=None, owner=None):
+        """Async variant of _call_model"""
+        annotate(cache='miss')
+        # Uploading blocks, so keep it off the shared event loop
+        contents, inline_contents = await asyncio.to_thread(self._use_room_handle, contents, owner)
+        served = set()
+        
+        async def send(model):
+            served.add(model)
+            return await self._asend(model, contents, inline_contents, on_text)
+        
+        async def routed():
+            if self.router is not None:
+                return await self.router.call_async(tier, send)
+            return await send(model_id)
+        
+        async def attempt():
+            if self.limiter is not None:
+                with timed('queue'):
+                    await self.limiter.acquire_async(on_wait)
+            if self.hedge is not None:
+                return await self.hedge.call_async(routed, can_hedge=self._can_hedge)
+            return await routed()
+        
+        image_data = await self.retry.call_async(attempt) if self.retry is not None else await attempt()
+        self._store_result(cache_key, image_data, model_id, served)
+        return image_data
+    
+    def _store_result(self, cache_key, image_data, model_id, served):
+        """Cache a render unless a fallback model produced it instead of the keyed one"""
+        annotate(model=', '.join(sorted(served)))
+        if self.cache is None or served != {model_id}:
+            return
+        with timed('cache_store'):
+            self.cache.put(cache_key, image_data)
+    
+    def _send(self, model_id, contents, inline_contents=None):
+        """Send one generation request through the backend
+        
+        A request referencing an uploaded room is sent again with the image inline
+        if the API rejects the reference, e.g. because the file has expired.
+        """
+        if inline_contents is None:
+            return self.backend.generate(model_id, contents)
+        from google.genai import errors
+        try:
+            return self.backend.generate(model_id, contents)
+        except errors.ClientError as e:
+            if e.code not in FILE_REFERENCE_ERRORS:
+                raise
+            self._drop_room_handle(contents, e)
+        return self.backend.generate(model_id, inline_contents)
+    
+    async def _asend(self, model_id, contents, inline_contents=None, on_text=None):
+        """Async variant of _send"""
+        if inline_contents is None:
+            return await self._agenerate(model_id, contents, on_text)
+        from google.genai import errors
+        try:
+            return await self._agenerate(model_id, contents, on_text)
+        except errors.ClientError as e:
+            if e.code not in FILE_REFERENCE_ERRORS:
+                raise
+            self._drop_room_handle(contents, e)
+        return await self._agenerate(model_id, inline_contents, on_text)
+    
+    async def _agenerate(self, model_id, contents, on_text=None):
+        """Stream the request when text is wanted and the backend can stream"""
+        if on_text is not None and hasattr(self.backend, 'astream'):
+            return await self.backend.astream(model_id, contents, on_text)
+        return await self.backend.agenerate(model_id, contents)
+    
+    def _drop_room_handle(self, contents, error):
+        from google.genai import types
+        logger.warning("Uploaded room was rejected, sending it inline: %s", error)
+        for content in contents:
+            if isinstance(content, types.Part) and content.file_data is not None:
+                self.file_handles.invalidate_uri(content.file_data.file_uri)
+    
+    def _can_hedge(self):
+        """A hedge is only sent when a rate-limiter token is free right now"""
+        return self.limiter is None or self.limiter.try_acquire()
+    
+    def render_many(self, room_image, items, max_concurrency=4, tier=FINAL, on_wait=None):
+        """Render several (name, description, placement) items concurrently
+        
+        Yields (name, image bytes, error) tuples in completion order, so callers
+        can show each result as soon as it is ready. on_wait(name, position,
+        estimated_wait) reports items waiting in the admission queue, and is
+        called on the caller's thread between results.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Filled on the event loop, drained on the caller's thread
+        waits = queue.SimpleQueue()
+        
+        async def render(name, furniture_description, placement_instruction):
+            def report_wait(position, estimated_wait):
+                waits.put((name, position, estimated_wait))
+            
+            async with semaphore:
+                return await self.agenerate_image_bytes(
+                    room_image, furniture_description, placement_instruction, tier=tier,
+                    on_wait=report_wait if on_wait is not None else None
+                )
+        
+        futures = {
+            submit(render(name, furniture_description, placement_instruction)): name
+            for name, furniture_description, placement_instruction in items
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=WAIT_POLL_SECONDS, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                while on_wait is not None and not waits.empty():
+                    on_wait(*waits.get())
+                for future in done:
+                    try:
+                        yield futures[future], future.result(), None
+                    except Exception as e:
+                        yield futures[future], None, e
+        finally:
+            # A caller that stops early, e.g. an interrupted page, frees the calls still in flight
+            for future in futures:
+                future.cancel()
+    
+    def _prepare_request(self, room_image, furniture_description, placement_instruction, tier=FINAL):
+        """Return the cache key, request contents and planned model for a generation"""
+        with timed('prepare'):
+            prompt = self.build_prompt(furniture_description, placement_instruction)
+            room_bytes, room_content = self._room_payload(room_image)
+            model_id = self._planned_model(tier)
+            cache_key = make_cache_key(room_bytes, prompt, model_id)
+        annotate(request_bytes=len(prompt.encode('utf-8')) + len(room_bytes))
+        return cache_key, [prompt, room_content], model_id
+    
+    def _room_payload(self, room_image):
+        """Return the cache key bytes and request content for a room image"""
+        if isinstance(room_image, PreparedImage):
+            return room_image.data, room_image.to_part()
+        return image_cache_bytes(room_image), room_image
+    
+    def _log_error(self, error):
+        logger.error("Error generating visualization: %s", error)
+
+
+def create_backend(client=None):
+    """Build the generation backend selected by FURNITURE_BACKEND
+    
+    live (default) calls the Gemini API, record calls it and saves every response
+    to the cassette store, and replay serves saved responses without network.
+    """
+    mode = os.getenv('FURNITURE_BACKEND', 'live').lower()
+    cassette_dir = os.getenv('CASSETTE_DIR', '.cache/cassettes')
+    
+    if mode == 'replay':
+        latency = os.getenv('REPLAY_LATENCY_MS', '0')
+        return ReplayBackend(
+            CassetteStore(cassette_dir),
+            latency=None if latency == 'recorded' else float(latency) / 1000,
+            jitter=float(os.getenv('REPLAY_JITTER_MS', '0')) / 1000
+        )
+    if mode not in ('live', 'record'):
+        raise ValueError(f"Unknown FURNITURE_BACKEND: {mode}")
+    
+    if client is None:
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            raise MissingApiKeyError()
+        client = create_client(api_key)
+    
+    backend = GeminiBackend(client)
+    if mode == 'record':
+        return RecordingBackend(backend, CassetteStore(cassette_dir))
+    return backend
+
+
+def create_file_handles(backend):
+    """Shared room upload handles for a backend, or None when rooms are sent inline
+    
+    Only the live backend uses handles: recorded requests have to carry the image
+    so replays match them by content.
+    """
+    if os.getenv('ROOM_FILE_HANDLES', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    if not isinstance(backend, GeminiBackend):
+        return None
+    return FileHandleCache(
+        GeminiFileService(backend.client),
+        ttl_seconds=float(os.getenv('ROOM_HANDLE_TTL_SECONDS', '1800'))
+    )
+
+
+def create_room_index():
+    """Perceptual index of uploaded rooms, or None when ROOM_MATCHING is off"""
+    if os.getenv('ROOM_MATCHING', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    # NumPy is only loaded once room matching is actually used
+    from perceptual_hash import SimilarRoomIndex
+    return SimilarRoomIndex(
+        os.getenv('ROOM_INDEX_PATH', '.cache/rooms.jsonl'),
+        max_distance=int(os.getenv('ROOM_MATCH_MAX_DISTANCE', '8'))
+    )
+
+
+def create_result_cache():
+    """Result cache configured from the environment"""
+    return ResultCache(
+        os.getenv('RESULT_CACHE_DIR', '.cache/results'),
+        max_bytes=int(os.getenv('RESULT_CACHE_MAX_MB', '512')) * 1024 * 1024
+    )
+
+
+def create_chain_checkpoints():
+    """Checkpoint store for room plans, keyed by chain prefix"""
+    return ResultCache(
+        os.getenv('CHAIN_CHECKPOINT_DIR', '.cache/checkpoints'),
+        max_bytes=int(os.getenv('CHAIN_CHECKPOINT_MAX_MB', '256')) * 1024 * 1024
+    )
+
+
+def create_admission_controller():
+    """Rate limiter and admission queue configured from the environment"""
+    return AdmissionController(
+        rate_per_minute=float(os.getenv('MODEL_RATE_PER_MINUTE', '60')),
+        burst=int(os.getenv('MODEL_BURST', '10')),
+        max_queue=int(os.getenv('ADMISSION_QUEUE_SIZE', '50')),
+        max_wait_seconds=float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '120'))
+    )
+
+
+def create_retry_policy():
+    """Retry policy for transient model errors"""
+    return RetryPolicy(
+        max_attempts=int(os.getenv('RETRY_MAX_ATTEMPTS', '4')),
+        base_delay=float(os.getenv('RETRY_BASE_DELAY_SECONDS', '1')),
+        max_delay=float(os.getenv('RETRY_MAX_DELAY_SECONDS', '16')),
+        deadline=float(os.getenv('RETRY_DEADLINE_SECONDS', '90'))
+    )
+
+
+def create_hedge_policy():
+    """Hedging policy for slow calls, or None when hedging is disabled"""
+    if os.getenv('HEDGE_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    return HedgePolicy(
+        quantile=float(os.getenv('HEDGE_QUANTILE', '0.95')),
+        min_samples=int(os.getenv('HEDGE_MIN_SAMPLES', '20')),
+        max_ratio=float(os.getenv('HEDGE_MAX_RATIO', '0.1'))
+    )
+
+
+def create_metrics():
+    """Stage metrics configured from the environment
+    
+    METRICS_PORT serves the Prometheus endpoint at /metrics, and METRICS_TRACE_LOG
+    appends one JSON line per render. Both are off by default.
+    """
+    metrics = Metrics(trace_path=os.getenv('METRICS_TRACE_LOG') or None)
+    port = os.getenv('METRICS_PORT')
+    if port:
+        try:
+            start_metrics_server(metrics, int(port))
+        except OSError as e:
+            logger.warning("Metrics endpoint not started on port %s: %s", port, e)
+    return metrics
@@ -0,0 +1,76 @@
+"""
+Server-start warm-up for the Furniture Visualizer
+The shared Gemini client lives here as a process-wide singleton. serve.py calls
+warm_start() before the Streamlit server accepts sessions, so module imports,
+client construction and the first connection to the model are paid once at
+startup instead of by the first visitor.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+from gemini_client import create_client, warm_up
+from model_router import configured_models
+
+logger = logging.getLogger(__name__)
+
+# Modules a generation needs that are otherwise imported on first use
+WARM_MODULES = (
+    'google.genai',
+    'google.genai.types',
+    'google.genai.errors',
+    'httpx',
+    'numpy',
+    'PIL.PngImagePlugin',
+    'PIL.JpegImagePlugin',
+    'perceptual_hash',
+    'output_encoding',
+)
+
+_client = None
+_client_built = False
+_warm_thread = None
+_lock = threading.Lock()
+
+
+def shared_client():
+    """Pooled Gemini client shared by the whole process, or None without an API key or in replay mode"""
+    global _client, _client_built, _warm_thread
+    with _lock:
+        if not _client_built:
+            api_key = os.getenv('GEMINI_API_KEY')
+            if api_key and os.getenv('FURNITURE_BACKEND', 'live').lower() != 'replay':
+                _client = create_client(api_key)
+                _warm_thread = warm_up(_client, configured_models()[0])
+            _client_built = True
+        return _client
+
+
+def warm_start(timeout=None):
+    """Import heavy modules, build the shared client and wait for it to reach the model
+
+    Returns the seconds spent on each step.
+    """
+    timeout = timeout if timeout is not None else float(os.getenv('WARMUP_TIMEOUT_SECONDS', '30'))
+    timings = {}
+
+    started = time.perf_counter()
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Warm-up could not import %s: %s", name, e)
+    timings['imports'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client = shared_client()
+    timings['client'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if client is not None and _warm_thread is not None:
+        # The first request then reuses open connections instead of a fresh TLS handshake
+        _warm_thread.join(timeout)
+    timings['model'] = time.perf_counter() - started
+    return timings